@@ -0,0 +1,222 @@
+"""
+Online aggregation of the utilization of the nodes and of the statistics of the jobs during a simulation
+"""
+
+import json
+import math
+
+import numpy as np
+
+# GPU type of the statistics aggregated over all the nodes (or jobs)
+ALL = "all"
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative accuracy guarantees (Masson et al., "DDSketch: A Fast and Fully-Mergeable
+    Quantile Sketch with Relative-Error Guarantees", VLDB 2019). The values are counted in buckets of
+    logarithmically increasing size, so any quantile is estimated within `relative_accuracy` of its value
+    with a memory that depends on the range of the values rather than on their number.
+
+    Args:
+        relative_accuracy (float, optional): The relative accuracy of the quantiles.
+        min_value (float, optional): The values whose magnitude is below it are counted as 0.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        # bucket -> count, for the positive values and for the magnitude of the negative ones
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _add_buckets(self, buckets, magnitudes):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64), return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            buckets[k] = buckets.get(k, 0) + c
+
+    def add(self, values):
+        """
+        Adds a value or an array of values to the sketch.
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        positive = values > self.min_value
+        negative = values < -self.min_value
+        self._add_buckets(self.positive, values[positive])
+        self._add_buckets(self.negative, -values[negative])
+        self.zero_count += int(len(values) - positive.sum() - negative.sum())
+        self.count += len(values)
+
+    def merge(self, other):
+        """
+        Adds the values of another sketch with the same accuracy.
+        """
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for k, c in other_buckets.items():
+                buckets[k] = buckets.get(k, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Returns the estimate of the q-quantile of the values (None if the sketch is empty).
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = 0
+        # from the lowest value: the negative ones by decreasing magnitude, then 0 and the positive ones
+        for k in sorted(self.negative, reverse=True):
+            seen += self.negative[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.positive):
+            seen += self.positive[k]
+            if seen > rank:
+                return self._value(k)
+        return self._value(max(self.positive))
+
+
+class Statistic:
+    """
+    Running count, mean, minimum and maximum of a metric, and a sketch of its quantiles.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = DDSketch(relative_accuracy)
+
+    def add(self, values):
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sketch.add(values)
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0}
+        summary = {"count": self.count, "mean": self.sum / self.count, "min": self.min, "max": self.max}
+        for q in QUANTILES:
+            # the estimates are kept within the exact range of the values
+            summary["p" + str(round(q * 100))] = min(self.max, max(self.min, self.sketch.quantile(q)))
+        return summary
+
+
+class OnlineAggregator:
+    """
+    Aggregates, while the simulation runs, the metrics of the nodes at each time instant (GPU and CPU
+    utilization and GPU fragmentation of each GPU type) and the ones of the jobs (queueing delay and job
+    completion time for each requested GPU type), so the usual figures are available at the end of the
+    simulation as a compact summary, without parsing the timeline of the nodes.
+
+    The GPU fragmentation of a GPU type is the fraction of its free GPUs that are on partially used nodes.
+
+    Args:
+        gpu_types (list): The GPU type (`GPUType`) of each node.
+        relative_accuracy (float, optional): The relative accuracy of the quantiles.
+    """
+
+    def __init__(self, gpu_types, relative_accuracy=0.01):
+        self.names = sorted(set(t.name for t in gpu_types))
+        # GPU type of each node, as the position of its name
+        self.node_types = np.array([self.names.index(t.name) for t in gpu_types], dtype=np.int64)
+        self.relative_accuracy = relative_accuracy
+        self.time_instants = 0
+        self.nodes = {}
+        self.jobs = {}
+
+    def _statistic(self, group, gpu_type, metric):
+        statistics = group.setdefault(gpu_type, {})
+        if metric not in statistics:
+            statistics[metric] = Statistic(self.relative_accuracy)
+        return statistics[metric]
+
+    def observe_nodes(self, nodes):
+        """
+        Adds the utilization and the fragmentation of the nodes at the current time instant.
+        """
+        values = np.array([(n.initial_gpu, n.updated_gpu, n.initial_cpu, n.updated_cpu) for n in nodes], dtype=np.float64)
+        initial_gpu, free_gpu, initial_cpu, free_cpu = values.T
+        partial = (free_gpu > 0) & (free_gpu < initial_gpu)
+
+        n_types = len(self.names)
+        totals = {
+            "initial_gpu": np.bincount(self.node_types, initial_gpu, n_types),
+            "used_gpu": np.bincount(self.node_types, initial_gpu - free_gpu, n_types),
+            "initial_cpu": np.bincount(self.node_types, initial_cpu, n_types),
+            "used_cpu": np.bincount(self.node_types, initial_cpu - free_cpu, n_types),
+            "free_gpu": np.bincount(self.node_types, free_gpu, n_types),
+            "fragmented_gpu": np.bincount(self.node_types, np.where(partial, free_gpu, 0), n_types),
+        }
+        groups = [(name, {k: v[i] for k, v in totals.items()}) for i, name in enumerate(self.names)]
+        groups.append((ALL, {k: v.sum() for k, v in totals.items()}))
+
+        for name, t in groups:
+            if t["initial_gpu"] > 0:
+                self._statistic(self.nodes, name, "gpu_utilization").add(t["used_gpu"] / t["initial_gpu"])
+            if t["initial_cpu"] > 0:
+                self._statistic(self.nodes, name, "cpu_utilization").add(t["used_cpu"] / t["initial_cpu"])
+            if t["free_gpu"] > 0:
+                self._statistic(self.nodes, name, "gpu_fragmentation").add(t["fragmented_gpu"] / t["free_gpu"])
+        self.time_instants += 1
+
+    def _observe_jobs(self, jobs, metric, values):
+        if len(jobs) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        gpu_types = jobs["gpu_type"].astype(str).to_numpy()
+        for name in np.unique(gpu_types):
+            self._statistic(self.jobs, name, metric).add(values[gpu_types == name])
+        self._statistic(self.jobs, ALL, metric).add(values)
+
+    def observe_started_jobs(self, jobs):
+        """
+        Adds the queueing delay (from the submission to the start) of the jobs just allocated.
+        """
+        if len(jobs) > 0:
+            self._observe_jobs(jobs, "queueing_delay", jobs["exec_time"] - jobs["submit_time"])
+
+    def observe_completed_jobs(self, jobs):
+        """
+        Adds the job completion time (from the submission to the completion) of the jobs just completed.
+        """
+        if len(jobs) > 0:
+            self._observe_jobs(jobs, "jct", jobs["complete_time"] - jobs["submit_time"])
+
+    def summary(self):
+        """
+        Returns the summary of the aggregated metrics, for each GPU type (and for all of them).
+        """
+        return {
+            "time_instants": self.time_instants,
+            "relative_accuracy": self.relative_accuracy,
+            "nodes": {name: {m: s.summary() for m, s in metrics.items()} for name, metrics in self.nodes.items()},
+            "jobs": {name: {m: s.summary() for m, s in metrics.items()} for name, metrics in self.jobs.items()},
+        }
+
+    def write(self, filename):
+        """
+        Writes the summary of the aggregated metrics to a JSON file.
+        """
+        with open(filename, "w") as f:
+            json.dump(self.summary(), f, indent=2)
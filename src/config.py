@@ -22,6 +22,18 @@ class DebugLevel(Enum):
 class SchedulingAlgorithm(Enum):
     FIFO = 1
     SDF = 2 # shortest duration first
+    
+class TransportType(Enum):
+    QUEUE = 1 # multiprocessing.JoinableQueue (pipe + feeder thread)
+    SHARED_MEMORY = 2 # ring buffer over multiprocessing.shared_memory
+    IN_PROCESS = 3 # nodes run as threads of the simulator process
+    TCP = 4 # asyncio server for each node over localhost sockets
+
+class SamplingPolicy(Enum):
+    EVERY_TICK = 1 # the resources of the nodes are saved at every time instant
+    EVERY_K = 2 # every sampling_interval time instants
+    ON_CHANGE = 3 # only at the time instants in which a resource changed
+    ADAPTIVE = 4 # every time instant after a change, then less often (up to every sampling_interval time instants)
 
 # create an enum to represent the possible types of GPUS
 # the idea is to represent the types of GPU in ascending order of performance
@@ -0,0 +1,169 @@
+"""
+Incremental tracking of the consensus of the nodes on the winners of the layers of each job
+"""
+
+from queue import Empty
+
+import numpy as np
+
+
+class ConsensusTracker:
+    """
+    Receives the winner vectors (the `auction_id` of the bids) of the nodes as they change and keeps, for
+    each job, how many alive nodes hold each distinct vector. A job is settled when all the alive nodes
+    hold the same vector, so the agreement is known without comparing the bids of every node.
+
+    Args:
+        n_nodes (int): The number of nodes.
+    """
+
+    def __init__(self, n_nodes):
+        self.n_nodes = n_nodes
+        self.alive = set(range(n_nodes))
+        # number of reports received from each node (the nodes publish how many they sent)
+        self.received = [0] * n_nodes
+        # True for the nodes whose last report says they processed all their messages (see `quiescent`)
+        self.idle = [False] * n_nodes
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets all the jobs (e.g., between two simulations).
+        """
+        # job id -> {node id: winner vector}
+        self.vectors = {}
+        # job id -> {winner vector: number of alive nodes holding it}
+        self.counts = {}
+
+    def update(self, node_id, job_id, winners):
+        """
+        Records the winner vector of a job held by a node (None if the node dropped its bid).
+        """
+        vectors = self.vectors.setdefault(job_id, {})
+        counts = self.counts.setdefault(job_id, {})
+        old = vectors.get(node_id)
+        if old == winners:
+            return
+
+        alive = node_id in self.alive
+        if old is not None:
+            del vectors[node_id]
+            if alive:
+                counts[old] -= 1
+                if counts[old] == 0:
+                    del counts[old]
+        if winners is not None:
+            vectors[node_id] = winners
+            if alive:
+                counts[winners] = counts.get(winners, 0) + 1
+
+        if len(vectors) == 0:
+            del self.vectors[job_id]
+            del self.counts[job_id]
+
+    def detach(self, node_id):
+        """
+        Excludes a node (e.g., a failed one) from the consensus.
+        """
+        if node_id not in self.alive:
+            return
+        self.alive.discard(node_id)
+        for job_id, vectors in self.vectors.items():
+            if node_id in vectors:
+                counts = self.counts[job_id]
+                counts[vectors[node_id]] -= 1
+                if counts[vectors[node_id]] == 0:
+                    del counts[vectors[node_id]]
+
+    def majority(self, job_id):
+        """
+        Returns the winner vector held by most of the alive nodes and the number of nodes holding it.
+        """
+        counts = self.counts.get(job_id)
+        if not counts:
+            return None, 0
+        return max(counts.items(), key=lambda c: c[1])
+
+    def agreeing(self, job_id):
+        """
+        Returns the number of alive nodes agreeing with the majority vector of a job.
+        """
+        return self.majority(job_id)[1]
+
+    def settled(self, job_id):
+        """
+        Returns True if all the alive nodes hold the same winner vector for the job.
+        """
+        return len(self.alive) > 0 and self.agreeing(job_id) == len(self.alive)
+
+    def allocation(self, job_id):
+        """
+        Returns the winner vector of a job if it is settled and every layer has a winner (i.e., the job
+        can be committed), None otherwise.
+        """
+        if not self.settled(job_id):
+            return None
+        winners = self.majority(job_id)[0]
+        return None if float('-inf') in winners else winners
+
+    def quiescent(self):
+        """
+        Returns True if the last report of every alive node says the node is idle, i.e., all the reports
+        sent by the nodes have been applied and the winner vectors no longer change (until new messages
+        reach the nodes).
+        """
+        return all(self.idle[i] for i in self.alive)
+
+    def winner_matrix(self, job_id):
+        """
+        Returns the winner vectors of a job in the format of `utils.winner_matrix` (one row for each node
+        holding a bid, ordered by node id) and the ids of these nodes.
+        """
+        vectors = self.vectors.get(job_id, {})
+        bidders = sorted(vectors)
+        if len(bidders) == 0:
+            return np.empty((0, 0)), bidders
+        return np.array([vectors[i] for i in bidders], dtype=np.float64), bidders
+
+    def __apply(self, report):
+        node_id, job_id, winners = report
+        self.received[node_id] += 1
+        # reports without a job say that the node is idle
+        self.idle[node_id] = job_id is None
+        if job_id is not None:
+            self.update(node_id, job_id, winners)
+
+    def poll(self, reports, timeout):
+        """
+        Applies the reports sent by the nodes, waiting up to `timeout` for the first one.
+
+        Args:
+            reports: The queue receiving the (node id, job id, winner vector) reports (job id None when the node is idle).
+            timeout (float): The maximum time to wait for a report.
+        """
+        try:
+            self.__apply(reports.get(timeout=timeout))
+            while True:
+                self.__apply(reports.get(block=False))
+        except Empty:
+            return
+
+    def drain(self, reports, expected):
+        """
+        Applies the reports sent by the nodes, waiting until the number of reports received from each
+        node reaches the number it published.
+
+        Args:
+            reports: The queue receiving the (node id, job id, winner vector) reports (job id None when the node is idle).
+            expected (dict): For each node id, the number of reports sent by the node.
+        """
+        missing = sum(max(0, n - self.received[i]) for i, n in expected.items())
+        while True:
+            try:
+                # once all the expected reports are in, only the ones already queued are applied
+                report = reports.get(block=missing > 0, timeout=None)
+            except Empty:
+                return
+            if self.received[report[0]] < expected.get(report[0], 0):
+                missing -= 1
+            self.__apply(report)
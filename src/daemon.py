@@ -0,0 +1,429 @@
+"""
+Standalone asyncio runtime hosting the Plebiscito nodes outside of the simulator.
+
+The daemon hosts the `node` instances in a single event loop: every node consumes its
+mailbox in its own task and runs the very same message handling used by the simulator
+(`node.process_messages`). Jobs are submitted over a local socket API (one JSON object
+per line) and every submission runs as an independent auction, so many auctions can be
+in progress at the same time.
+
+Requests:
+    {"op": "submit", "request_id": 1, "job": {"job_id": 0, "user": 0, "num_gpu": 1, "num_cpu": 4, "duration": 10, "bw": 0, "gpu_type": "T4"}}
+    {"op": "release", "request_id": 2, "job_id": 0}
+    {"op": "stats", "request_id": 3}
+
+Usage:
+    python -m Plebiscito.src.daemon serve --nodes 50 --port 8765
+    python -m Plebiscito.src.daemon loadgen --port 8765 --jobs 1000 --rate 100 --hold 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+from queue import Empty
+import threading
+import time
+import numpy as np
+
+from Plebiscito.src.config import Utility, ApplicationGraphType
+from Plebiscito.src.jobs_handler import message_data, unallocate_data
+from Plebiscito.src.node import NodeSpec
+from Plebiscito.src.topology import topo as LogicalTopology
+from Plebiscito.src.transport import Transport
+from Plebiscito.src.utils import generate_gpu_types
+
+
+class AsyncioTransport(Transport):
+    """
+    Mailboxes of the nodes hosted in the same event loop.
+
+    The transport keeps track of the messages of each job that have been sent but not processed
+    yet: when the counter of a job drops to zero no node can change its bids anymore, i.e., the
+    auction of the job is over.
+    """
+
+    def __init__(self, n_nodes):
+        super().__init__(n_nodes)
+        self.mailboxes = [asyncio.Queue() for _ in range(n_nodes)]
+        self.in_flight = {}
+        self.waiters = {}
+
+    def send(self, dst, msg):
+        self.in_flight[msg["job_id"]] = self.in_flight.get(msg["job_id"], 0) + 1
+        self.mailboxes[dst].put_nowait(msg)
+
+    def receive(self, node_id, timeout=None):
+        """
+        Returns the oldest message in the mailbox of `node_id` without waiting: the nodes share the thread
+        of the event loop, so `timeout` is ignored (use `get` to wait for a message from a task).
+
+        Raises:
+            Empty: If the mailbox is empty.
+        """
+        try:
+            return self.mailboxes[node_id].get_nowait()
+        except asyncio.QueueEmpty:
+            raise Empty
+
+    async def get(self, node_id):
+        """
+        Waits for the oldest message in the mailbox of `node_id`.
+        """
+        return await self.mailboxes[node_id].get()
+
+    def qsize(self, node_id):
+        return self.mailboxes[node_id].qsize()
+
+    def watch(self, job_id):
+        """
+        Returns a future resolved when all the messages of `job_id` have been processed.
+        Must be called before sending the first message of the job.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(job_id, []).append(future)
+        return future
+
+    def processed(self, job_id):
+        self.in_flight[job_id] -= 1
+        if self.in_flight[job_id] == 0:
+            del self.in_flight[job_id]
+            for future in self.waiters.pop(job_id, []):
+                if not future.done():
+                    future.set_result(None)
+
+
+class NodeDaemon:
+    """
+    Hosts one or many nodes and allocates the submitted jobs through the Plebiscito auctions.
+
+    Args:
+        n_nodes (int): The number of nodes hosted by the daemon.
+        utility (Utility): The utility function used by the nodes to bid.
+        alpha (float): Weight of the utility function.
+        decrement_factor (float): Decrement factor of the utility when the GPU types do not match.
+        split (bool): Whether the jobs can be split among several nodes.
+        app_type (ApplicationGraphType): The application graph of the jobs.
+        logical_topology (str): The logical topology connecting the nodes.
+        probability (float): Link probability for the "probability_graph" topology.
+    """
+
+    def __init__(self, n_nodes, utility=Utility.LGF, alpha=1, decrement_factor=1, split=True, app_type=ApplicationGraphType.LINEAR, logical_topology="ring_graph", probability=0, enable_logging=False):
+        self.n_nodes = n_nodes
+        self.split = split
+        self.app_type = app_type
+        self.gpu_types = generate_gpu_types(n_nodes)
+        self.logical_topology = LogicalTopology(func_name=logical_topology, max_bandwidth=0, min_bandwidth=0, num_clients=0, num_edges=n_nodes, probability=probability)
+
+        self.transport = None
+        # the topology never changes, so each node gets the static list of its neighbors (see `NodeSpec`)
+        adjacency_matrix = np.asarray(self.logical_topology.to())[:n_nodes]
+        self.nodes = []
+        for i in range(n_nodes):
+            neighbors = [j for j in np.flatnonzero(adjacency_matrix[:, i]).tolist() if j != i]
+            self.nodes.append(NodeSpec(i, self.gpu_types[i], utility, alpha, decrement_factor, n_nodes, neighbors, enable_logging=enable_logging).build())
+
+        self.jobs = {}
+        self.allocations = {}
+        self.submitted = 0
+        self.rejected = 0
+        self.__node_tasks = []
+
+    async def start(self):
+        """
+        Starts the mailbox task of every node. Must be called from the event loop running the daemon.
+        """
+        self.transport = AsyncioTransport(self.n_nodes)
+        idle = [threading.Event() for _ in range(self.n_nodes)]
+
+        for n in self.nodes:
+            n.set_transport(self.transport, idle)
+            self.__node_tasks.append(asyncio.create_task(self.__node_loop(n)))
+
+    async def stop(self):
+        for t in self.__node_tasks:
+            t.cancel()
+        await asyncio.gather(*self.__node_tasks, return_exceptions=True)
+        self.__node_tasks = []
+
+    async def __node_loop(self, n):
+        while True:
+            msg = await self.transport.get(n.id)
+            try:
+                n.process_messages([msg])
+            except Exception:
+                logging.exception(f"Node {n.id} failed to process a message of job {msg['job_id']}")
+            finally:
+                self.transport.processed(msg["job_id"])
+
+            # let the other nodes consume their mailboxes
+            await asyncio.sleep(0)
+
+    def __job_message(self, job):
+        return message_data(
+                    job['job_id'],
+                    job['user'],
+                    job['num_gpu'],
+                    job['num_cpu'],
+                    job['duration'],
+                    job['bw'],
+                    job['gpu_type'],
+                    split=self.split,
+                    app_type=self.app_type
+                )
+
+    def __winners(self, job_id):
+        winners = None
+        for n in self.nodes:
+            if job_id not in n.bids:
+                continue
+            if winners is None:
+                winners = n.bids[job_id]['auction_id']
+            elif winners != n.bids[job_id]['auction_id']:
+                return None
+
+        if winners is None or float('-inf') in winners:
+            return None
+        return [int(w) for w in winners]
+
+    async def __unallocate(self, job_id):
+        done = self.transport.watch(job_id)
+        self.transport.broadcast(unallocate_data(job_id))
+        await done
+
+    async def submit(self, job):
+        """
+        Runs the auction of a job and returns the outcome.
+
+        Args:
+            job (dict): The job to allocate (job_id, user, num_gpu, num_cpu, duration, bw, gpu_type).
+
+        Returns:
+            dict: The outcome of the auction, with the allocation (a node id for each layer) if the job has been allocated.
+        """
+        job_id = job['job_id']
+        if job_id in self.jobs:
+            return {"job_id": job_id, "error": "job already submitted"}
+
+        self.jobs[job_id] = job
+        self.submitted += 1
+        start = time.perf_counter()
+
+        # same entry node chosen by jobs_handler.dispatch_job
+        entry_node = random.Random(job_id).randint(0, self.n_nodes-1)
+
+        done = self.transport.watch(job_id)
+        self.transport.send(entry_node, self.__job_message(job))
+        await done
+
+        allocation = self.__winners(job_id)
+        if allocation is None:
+            # release the partial allocation, the job can be submitted again later
+            self.rejected += 1
+            await self.__unallocate(job_id)
+            del self.jobs[job_id]
+        else:
+            self.allocations[job_id] = allocation
+
+        return {
+            "job_id": job_id,
+            "allocated": allocation is not None,
+            "allocation": allocation,
+            "latency": time.perf_counter() - start
+        }
+
+    async def release(self, job_id):
+        """
+        Releases the resources allocated to a job (e.g., when the job completes).
+        """
+        if job_id not in self.allocations:
+            return {"job_id": job_id, "error": "job not allocated"}
+
+        await self.__unallocate(job_id)
+        del self.allocations[job_id]
+        del self.jobs[job_id]
+        return {"job_id": job_id, "released": True}
+
+    def stats(self):
+        return {
+            "n_nodes": self.n_nodes,
+            "gpu_types": sorted(set(t.name for t in self.gpu_types)),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "running": len(self.allocations),
+            "in_flight": len(self.transport.in_flight),
+            "used_gpu": sum(n.initial_gpu - n.updated_gpu for n in self.nodes),
+            "used_cpu": sum(n.initial_cpu - n.updated_cpu for n in self.nodes)
+        }
+
+    async def __serve_request(self, request, writer, write_lock):
+        op = request.get("op")
+        try:
+            if op == "submit":
+                response = await self.submit(request["job"])
+            elif op == "release":
+                response = await self.release(request["job_id"])
+            elif op == "stats":
+                response = self.stats()
+            else:
+                response = {"error": f"unknown op {op}"}
+        except Exception as e:
+            logging.exception(f"Failed to serve request {request}")
+            response = {"error": str(e)}
+
+        response["request_id"] = request.get("request_id")
+        async with write_lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def __handle_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        requests = set()
+
+        async for line in reader:
+            if not line.strip():
+                continue
+            t = asyncio.create_task(self.__serve_request(json.loads(line), writer, write_lock))
+            requests.add(t)
+            t.add_done_callback(requests.discard)
+
+        await asyncio.gather(*requests, return_exceptions=True)
+        writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        """
+        Starts the nodes and serves the socket API until cancelled.
+        """
+        await self.start()
+        server = await asyncio.start_server(self.__handle_client, host, port)
+        print(f"Plebiscito daemon hosting {self.n_nodes} nodes on {host}:{port}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+
+async def generate_load(host="127.0.0.1", port=8765, n_jobs=100, rate=10, hold=0, seed=0):
+    """
+    Submits synthetic jobs to a running daemon with Poisson arrivals and measures the allocations.
+
+    Args:
+        host (str): The address of the daemon.
+        port (int): The port of the daemon.
+        n_jobs (int): The number of jobs to submit.
+        rate (float): The average number of submissions per second.
+        hold (float): Seconds after which each allocated job is released (0 keeps the jobs allocated).
+        seed (int): Seed of the workload.
+
+    Returns:
+        dict: Throughput and latency percentiles (in milliseconds) of the submissions.
+    """
+    rng = np.random.default_rng(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    pending = {}
+    next_request = 0
+
+    async def read_responses():
+        async for line in reader:
+            response = json.loads(line)
+            pending.pop(response["request_id"]).set_result(response)
+
+    async def request(payload):
+        nonlocal next_request
+        next_request += 1
+        payload["request_id"] = next_request
+        future = asyncio.get_running_loop().create_future()
+        pending[next_request] = future
+        writer.write(json.dumps(payload).encode() + b"\n")
+        await writer.drain()
+        return await future
+
+    async def submit(job):
+        start = time.perf_counter()
+        response = await request({"op": "submit", "job": job})
+        latency = time.perf_counter() - start
+        if response.get("allocated") and hold > 0:
+            await asyncio.sleep(hold)
+            await request({"op": "release", "job_id": job["job_id"]})
+        return response, latency
+
+    reader_task = asyncio.create_task(read_responses())
+    gpu_types = (await request({"op": "stats"}))["gpu_types"]
+
+    submissions = []
+    start = time.perf_counter()
+    for i in range(n_jobs):
+        await asyncio.sleep(rng.exponential(1/rate))
+        job = {
+            "job_id": i,
+            "user": int(rng.integers(0, 100)),
+            "num_gpu": float(rng.choice([0.25, 0.5, 1])),
+            "num_cpu": float(rng.choice([2, 4, 8, 16])),
+            "duration": int(rng.integers(1, 1000)),
+            "bw": 0,
+            "gpu_type": str(rng.choice(gpu_types))
+        }
+        submissions.append(asyncio.create_task(submit(job)))
+
+    results = await asyncio.gather(*submissions)
+    elapsed = time.perf_counter() - start
+
+    reader_task.cancel()
+    writer.close()
+
+    latencies = np.array([l for _, l in results]) * 1000
+    allocated = sum(1 for r, _ in results if r.get("allocated"))
+
+    return {
+        "submitted": n_jobs,
+        "allocated": allocated,
+        "elapsed": elapsed,
+        "throughput": n_jobs / elapsed,
+        "allocation_throughput": allocated / elapsed,
+        "latency_mean": float(latencies.mean()),
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p95": float(np.percentile(latencies, 95)),
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "latency_max": float(latencies.max())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plebiscito asyncio node daemon")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="host the nodes and accept job submissions")
+    serve.add_argument("--nodes", type=int, default=10)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--utility", default=Utility.LGF.name, choices=[u.name for u in Utility])
+    serve.add_argument("--alpha", type=float, default=1)
+    serve.add_argument("--decrement-factor", type=float, default=1)
+    serve.add_argument("--no-split", action="store_true")
+    serve.add_argument("--topology", default="ring_graph")
+
+    loadgen = subparsers.add_parser("loadgen", help="submit synthetic jobs to a running daemon")
+    loadgen.add_argument("--host", default="127.0.0.1")
+    loadgen.add_argument("--port", type=int, default=8765)
+    loadgen.add_argument("--jobs", type=int, default=100)
+    loadgen.add_argument("--rate", type=float, default=10)
+    loadgen.add_argument("--hold", type=float, default=0)
+    loadgen.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        daemon = NodeDaemon(args.nodes, utility=Utility[args.utility], alpha=args.alpha, decrement_factor=args.decrement_factor, split=not args.no_split, logical_topology=args.topology)
+        try:
+            asyncio.run(daemon.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        summary = asyncio.run(generate_load(args.host, args.port, args.jobs, args.rate, args.hold, args.seed))
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import argparse
 import csv
+import json
 import pandas as pd
 import numpy as np
 import os
@@ -124,6 +126,10 @@ def add_job(csv_file, describe_dict, limit=None):
     """
     limit: To avoid reading too many jobs when the sampled number << total number of jobs in trace file.
     """
+    if describe_dict is None:
+        # the trace is read in chunks until `limit` jobs are selected
+        return _materialize_jobs(read_trace(csv_file, limit))
+    
     job_list = []
     with open(csv_file, 'r') as fd:
         reader = csv.DictReader(fd, delimiter=',')
@@ -134,11 +140,236 @@ def add_job(csv_file, describe_dict, limit=None):
             #     break
     return job_list
 
+# bump the version to rebuild the stored traces (e.g., when the preprocessing changes)
+TRACE_STORE_VERSION = 1
+
+# maximum GPUs and CPUs (excluded) of the jobs kept for each GPU type
+GPU_TYPE_LIMITS = {
+    'MISC': (8, 45),
+    'P100': (2, 40),
+    'T4': (2, 45),
+    'V100': (8, 45),
+}
+
+DROPPED_COLUMNS = ['fuxi_job_name','fuxi_task_name','inst_id','running_cluster','model_name','iterations','interval','vc','jobid','status']
+FLOAT_COLUMNS = ['wait_time','user_dur','user_gpu_dur','group_dur','group_gpu_dur']
+
+def _preprocess_frame(df):
+    """
+    Vectorized version of `_add_job`, applied to a chunk of the trace read as strings (without the
+    columns that depend on the random generator, see `_materialize_jobs`).
+    
+    Returns:
+    - dict: The columns of the jobs that pass the filters of `_add_job` (numpy arrays, in the same order of the keys of `_add_job`).
+    """
+    columns = {}
+    for key in df.columns:
+        if key in DROPPED_COLUMNS:
+            continue
+        
+        values = df[key].to_numpy(dtype=object)
+        digit = df[key].str.isdigit().to_numpy(dtype=bool)
+        
+        if key in ['num_cpu', 'num_gpu', 'submit_time', 'num_inst', 'duration']:
+            # converted below
+            columns[key] = values
+        elif key != 'user' and digit.all():
+            columns[key] = pd.to_numeric(df[key]).to_numpy(dtype=np.int64)
+        elif key in FLOAT_COLUMNS:
+            numbers = pd.to_numeric(df[key], errors='coerce').to_numpy(dtype=np.float64)
+            if np.isnan(numbers).any():
+                # the values that can't be converted are kept as they are (and the digits become integers)
+                mixed = np.where(np.isnan(numbers), values, numbers.astype(object))
+                mixed[digit] = numbers[digit].astype(np.int64).astype(object)
+                columns[key] = mixed
+            else:
+                columns[key] = numbers
+        elif key != 'user' and digit.any():
+            columns[key] = np.where(digit, pd.to_numeric(df[key].where(digit, '0')).to_numpy().astype(object), values)
+        else:
+            columns[key] = values.astype(str)
+    
+    n = len(df)
+    for key in ['num_cpu', 'num_gpu', 'submit_time', 'num_inst']:
+        if key not in columns:
+            columns[key] = np.zeros(n) if key in ['num_cpu', 'num_gpu'] else np.ones(n, dtype=np.int64)
+            continue
+        
+        raw = df[key]
+        empty = (raw == '').to_numpy(dtype=bool)
+        numbers = pd.to_numeric(raw.where(~empty, '0')).to_numpy(dtype=np.float64)
+        if key in ['num_cpu', 'num_gpu']:
+            columns[key] = numbers
+            if empty.any():
+                # the missing values are integers
+                columns[key] = numbers.astype(object)
+                columns[key][empty] = 0
+        else:
+            # np.round rounds half to even, like round()
+            columns[key] = np.where(empty, 1, np.round(numbers)).astype(np.int64)
+    columns['num_inst'] = np.ones(n, dtype=np.int64)
+    
+    duration = pd.to_numeric(df['duration']).to_numpy()
+    columns['duration'] = np.minimum(duration, 1000)
+    columns['size'] = np.trunc((columns['num_gpu'] + columns['num_cpu']).astype(np.float64) * columns['duration']).astype(np.int64)
+    columns['bw'] = pd.to_numeric(df['write_count']).to_numpy(dtype=np.float64)
+    
+    keep = np.zeros(n, dtype=bool)
+    gpu_type = columns['gpu_type']
+    for t, (max_gpu, max_cpu) in GPU_TYPE_LIMITS.items():
+        keep |= (gpu_type == t) & (columns['num_gpu'] < max_gpu) & (columns['num_cpu'] < max_cpu)
+    keep &= columns['num_gpu'] != 0
+    keep = keep.astype(bool)
+    
+    return {k: v[keep] for k, v in columns.items()}
+
+# number of rows of the trace parsed at once
+TRACE_CHUNK_SIZE = 100000
+
+def iter_trace(csv_file, chunksize=TRACE_CHUNK_SIZE):
+    """
+    Reads the trace in chunks of `chunksize` rows, yielding the preprocessed columns of the jobs
+    selected in each chunk (see `_preprocess_frame`). Only one chunk at a time is kept in memory.
+    """
+    with pd.read_csv(csv_file, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield _preprocess_frame(chunk)
+
+def _concat_columns(chunks):
+    columns = {}
+    for key in (chunks[0] if len(chunks) > 0 else []):
+        parts = [c[key] for c in chunks]
+        if any(p.dtype != parts[0].dtype for p in parts):
+            # e.g., integers in a chunk and strings in another one: each value keeps its type
+            parts = [p.astype(object) for p in parts]
+        columns[key] = np.concatenate(parts)
+    return columns
+
+def read_trace(csv_file, num_jobs=None, chunksize=TRACE_CHUNK_SIZE):
+    """
+    Returns the preprocessed columns of the first `num_jobs` jobs selected from the trace (all of them
+    if `num_jobs` is None). The rest of the trace is not read once enough jobs have been selected.
+    """
+    chunks = []
+    selected = 0
+    for columns in iter_trace(csv_file, chunksize):
+        chunks.append(columns)
+        selected += len(columns['gpu_type'])
+        if num_jobs is not None and selected >= num_jobs:
+            break
+    
+    columns = _concat_columns(chunks)
+    if num_jobs is not None:
+        columns = {k: v[:num_jobs] for k, v in columns.items()}
+    return columns
+
+def _materialize_jobs(columns, num_jobs=None):
+    """
+    Builds the list of jobs (same format of `_add_job`) from the first `num_jobs` rows of the preprocessed columns.
+    """
+    names = list(columns)
+    n = len(columns[names[0]]) if len(names) > 0 else 0
+    if num_jobs is not None:
+        n = min(n, num_jobs)
+    
+    # tolist() returns python objects, like the ones built by _add_job
+    values = [columns[k][:n].tolist() for k in names]
+    
+    job_list = []
+    for row in zip(*values):
+        job_dict = dict(zip(names, row))
+        bw = job_dict.pop('bw')
+        job_dict['size'] = job_dict.pop('size')
+        job_dict['on_time'] = 0
+        job_dict['wasted'] = 0
+        job_dict['jct'] = -1
+        job_dict['resource'] = [job_dict['num_gpu'], job_dict['num_cpu']] # list of resources
+        job_dict['node'] = None
+        job_dict["exec_time"] = -1
+        job_dict["bw"] = bw
+        job_dict["final_node_allocation"] = []
+        job_dict["final_gpu_allocation"] = []
+        job_dict["deadline"] = job_dict['submit_time'] + job_dict['duration'] * (1 + 0.1 * random.random()) # 10% deadline slack
+        job_list.append(job_dict)
+    
+    return job_list
+
+def _trace_store_path(csv_file):
+    return os.path.splitext(csv_file)[0] + '_store'
+
+def build_trace_store(csv_file):
+    """
+    Preprocesses the trace and saves the columns of the selected jobs in a directory next to the
+    trace (one .npy file for each column), together with the size and modification time of the trace.
+    """
+    store = _trace_store_path(csv_file)
+    stat = os.stat(csv_file)
+    columns = read_trace(csv_file)
+    
+    tmp = store + '.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    meta = {'version': TRACE_STORE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'columns': []}
+    for i, (k, v) in enumerate(columns.items()):
+        # object columns (mixed types) can't be memory-mapped
+        np.save(os.path.join(tmp, str(i) + '.npy'), v, allow_pickle=v.dtype == object)
+        meta['columns'].append({'name': k, 'object': v.dtype == object})
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    
+    if os.path.exists(store):
+        for name in os.listdir(store):
+            os.remove(os.path.join(store, name))
+        os.rmdir(store)
+    os.replace(tmp, store)
+
+def _trace_store_meta(csv_file):
+    """
+    Returns the metadata of the store of the trace, or None if it doesn't exist or if the trace changed
+    since it was built.
+    """
+    store = _trace_store_path(csv_file)
+    stat = os.stat(csv_file)
+    if not os.path.exists(os.path.join(store, 'meta.json')):
+        return None
+    
+    with open(os.path.join(store, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta['version'] != TRACE_STORE_VERSION or meta['size'] != stat.st_size or meta['mtime_ns'] != stat.st_mtime_ns:
+        return None
+    return meta
+
+def load_trace_store(csv_file):
+    """
+    Returns the preprocessed columns of the trace (memory-mapped), building the store if it doesn't
+    exist or if the trace changed since it was built.
+    """
+    store = _trace_store_path(csv_file)
+    meta = _trace_store_meta(csv_file)
+    if meta is None:
+        build_trace_store(csv_file)
+        with open(os.path.join(store, 'meta.json')) as f:
+            meta = json.load(f)
+    
+    columns = {}
+    for i, c in enumerate(meta['columns']):
+        file = os.path.join(store, str(i) + '.npy')
+        if c['object']:
+            columns[c['name']] = np.load(file, allow_pickle=True)
+        else:
+            columns[c['name']] = np.load(file, mmap_mode='r')
+    return columns
+
 # function from Alibaba's trace
 def init_go(num_jobs=100):
         cur_time = 0
         arrivals = 1
-        job_list = add_job(dataset, None, limit=num_jobs)
+        if num_jobs is None or _trace_store_meta(dataset) is not None:
+            # the store is built by the first load of the whole trace (or by running this module, see main)
+            columns = load_trace_store(dataset)
+        else:
+            # building the store requires the whole trace: without it, only the chunks holding the first num_jobs jobs are read
+            columns = read_trace(dataset, num_jobs)
+        job_list = _materialize_jobs(columns, num_jobs)
         if (num_jobs is not None) and num_jobs <= len(job_list):
             #random.shuffle(job_list)
 
@@ -148,4 +379,14 @@ def init_go(num_jobs=100):
         return job_list
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped store of the preprocessed trace, read by init_go instead of the CSV file")
+    parser.add_argument("trace", nargs="?", default=dataset, help="CSV file of the trace (default: %(default)s)")
+    args = parser.parse_args()
+
+    columns = load_trace_store(args.trace)
+    print(f"{len(columns['gpu_type'])} jobs stored in {_trace_store_path(args.trace)}")
+
 
+if __name__ == "__main__":
+    main()
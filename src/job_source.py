@@ -0,0 +1,121 @@
+"""
+Sources of the jobs submitted to the simulator
+"""
+
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+
+class JobSource(ABC):
+    """
+    Provides the jobs to the simulator as the simulated time advances. The jobs are returned in batches
+    ordered by `submit_time`, so the source doesn't need to hold all the jobs in memory (e.g., jobs
+    read from a trace or generated on the fly).
+    """
+
+    @abstractmethod
+    def pop_arrivals(self, time_instant) -> pd.DataFrame:
+        """
+        Returns the jobs submitted up to `time_instant` that have not been returned yet.
+        """
+
+    @abstractmethod
+    def exhausted(self) -> bool:
+        """
+        Returns True when all the jobs have been returned.
+        """
+
+    def size(self):
+        """
+        Returns the total number of jobs, or None if it is not known in advance.
+        """
+        return None
+
+
+class DataFrameJobSource(JobSource):
+    """
+    Job source backed by a dataset already in memory.
+    """
+
+    def __init__(self, dataset: pd.DataFrame):
+        # stable sort: the jobs with the same submit time keep the order of the dataset
+        self.dataset = dataset.sort_values(by=["submit_time"], kind="stable") if len(dataset) > 0 else dataset
+        self.position = 0
+
+    def pop_arrivals(self, time_instant):
+        if len(self.dataset) == 0:
+            return self.dataset
+
+        end = int(self.dataset["submit_time"].searchsorted(time_instant, side="right"))
+        ret = self.dataset.iloc[self.position:max(end, self.position)]
+        self.position = max(end, self.position)
+        return ret
+
+    def exhausted(self):
+        return self.position >= len(self.dataset)
+
+    def size(self):
+        return len(self.dataset)
+
+
+class IteratorJobSource(JobSource):
+    """
+    Job source pulling the jobs from an iterable of DataFrames (e.g., a generator). The batches must be
+    ordered by `submit_time`, each one starting after (or at) the end of the previous one. A batch is
+    requested only when all the jobs of the previous batches have been returned.
+
+    Args:
+        batches (iterable): The batches of jobs.
+        size (int, optional): The total number of jobs, if known.
+    """
+
+    def __init__(self, batches, size=None):
+        self.batches = iter(batches)
+        self.pending = None
+        self.total = size
+        self.done = False
+        self.next_batch()
+
+    def next_batch(self):
+        self.pending = None
+        while not self.done and self.pending is None:
+            try:
+                batch = next(self.batches)
+            except StopIteration:
+                self.done = True
+                break
+            if len(batch) > 0:
+                self.pending = batch
+
+    def pop_arrivals(self, time_instant):
+        arrived = []
+        while self.pending is not None:
+            condition = self.pending["submit_time"] <= time_instant
+            arrived.append(self.pending[condition])
+            if condition.all():
+                self.next_batch()
+            else:
+                self.pending = self.pending[~condition]
+                break
+
+        if len(arrived) == 0:
+            return pd.DataFrame()
+        return pd.concat(arrived)
+
+    def exhausted(self):
+        return self.pending is None
+
+    def size(self):
+        return self.total
+
+
+def as_job_source(dataset) -> JobSource:
+    """
+    Returns a job source for `dataset`, which can be a DataFrame, a JobSource or an iterable of DataFrames.
+    """
+    if isinstance(dataset, JobSource):
+        return dataset
+    if isinstance(dataset, pd.DataFrame):
+        return DataFrameJobSource(dataset)
+    return IteratorJobSource(dataset)
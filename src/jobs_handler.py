@@ -1,9 +1,11 @@
+from functools import lru_cache
 import random
 import sys
 import time
 import numpy as np
 import pandas as pd
 from Plebiscito.src.config import SchedulingAlgorithm, ApplicationGraphType
+from Plebiscito.src.rng import stream
 
 def assign_job_start_time(dataset: pd.DataFrame, time_instant):
     dataset.replace(-1, time_instant, inplace=True)
@@ -68,7 +70,7 @@ def schedule_jobs(jobs: pd.DataFrame, scheduling_algorithm: SchedulingAlgorithm)
     elif scheduling_algorithm == SchedulingAlgorithm.SDF:
         return jobs.sort_values(by=["duration"])
 
-def dispatch_job(dataset: pd.DataFrame, queues, use_net_topology=False, split=True, app_type=ApplicationGraphType.LINEAR, check_speedup=False, low_th=1, high_th=1.2):        
+def dispatch_job(dataset: pd.DataFrame, transport, use_net_topology=False, split=True, app_type=ApplicationGraphType.LINEAR, check_speedup=False, low_th=1, high_th=1.2, seed=None, dispatch_seed=None):        
     # if use_net_topology:
     #     timeout = 1 # don't change it
     # else:
@@ -94,61 +96,113 @@ def dispatch_job(dataset: pd.DataFrame, queues, use_net_topology=False, split=Tr
                     split=split,
                     app_type=app_type,
                     speedup=speedup,
-                    increase=increase
+                    increase=increase,
+                    seed=seed
                 )
         
-        random.seed(job['job_id'])
-        node_to_submit = random.randint(0, len(queues)-1)
+        # the node receiving the job is drawn from the stream of the job, with its own seed if given
+        # (without a seed, a local generator with the same draws of random.seed(job_id))
+        if dispatch_seed is None:
+            dispatch_seed = seed
+        if dispatch_seed is None:
+            node_to_submit = random.Random(job['job_id']).randint(0, transport.n_nodes-1)
+        else:
+            node_to_submit = int(stream(dispatch_seed, "dispatch", job['job_id']).integers(transport.n_nodes))
         
-        # for q in queues:
-        #     q.put(data)
-        queues[node_to_submit].put(data)
+        # transport.broadcast(data)
+        transport.send(node_to_submit, data)
 
         #time.sleep(timeout)
 
 def get_simulation_end_time_instant(dataset):
     return dataset['submit_time'].max() + dataset['duration'].max()
 
-def generate_application_graph(layer_number, app_type, bandwidth):
-    graph = np.zeros((layer_number, layer_number))
-    
-    for i in range(layer_number):
-        for j in range(i):
-            if app_type == ApplicationGraphType.LINEAR:
-                if j == i-1:
-                    #b = random.uniform(0.5, 1.5)*bandwidth
-                    b = bandwidth
-                    graph[i][j] = b
-                    graph[j][i] = b
-            else:
-                prob = 0
-                if app_type == ApplicationGraphType.GRAPH20:
-                    prob = 0.2
-                elif app_type == ApplicationGraphType.GRAPH40:
-                    prob = 0.4
-                elif app_type == ApplicationGraphType.GRAPH60:
-                    prob = 0.6
-                
-                #b = np.random.choice([0, 1], p=[1-prob, prob])*random.uniform(0.5, 1.5)*bandwidth
-                b = np.random.choice([0, 1], p=[1-prob, prob])*bandwidth
-                graph[i][j] = b
-                graph[j][i] = b
-                
-    return graph        
-
-def message_data(job_id, user, num_gpu, num_cpu, duration, bandwidth, gpu_type, deallocate=False, split=True, app_type=ApplicationGraphType.LINEAR, speedup=0, increase=True):
-    
-    random.seed(job_id)
-    np.random.seed(int(job_id))
-    
-    layer_number = random.choice([3, 4, 5, 6])
+# edges of the application graph of a job: layers exchanging data and the data size 
+EDGE_DTYPE = np.dtype([('src', np.int32), ('dst', np.int32), ('bw', np.float64)])
+
+def generate_application_graph(layer_number, app_type, bandwidth, rng=np.random):
+    """
+    Returns the (undirected) graph of the data exchanged between the layers of a job, as a list of
+    edges (src, dst, bw) with src > dst. With the GRAPH* types, each pair of layers is connected with
+    the probability of the type (a single draw for all the pairs, same values of one draw for each pair).
+    """
+    if app_type == ApplicationGraphType.LINEAR:
+        src = np.arange(1, layer_number)
+        dst = src - 1
+    else:
+        prob = 0
+        if app_type == ApplicationGraphType.GRAPH20:
+            prob = 0.2
+        elif app_type == ApplicationGraphType.GRAPH40:
+            prob = 0.4
+        elif app_type == ApplicationGraphType.GRAPH60:
+            prob = 0.6
+            
+        # pairs in the order (1, 0), (2, 0), (2, 1), (3, 0), ...
+        src, dst = np.tril_indices(layer_number, -1)
+        # same computation of rng.choice([0, 1], p=[1-prob, prob]), vectorized
+        cdf = np.cumsum([1-prob, prob])
+        cdf /= cdf[-1]
+        connected = cdf.searchsorted(rng.random(len(src)), side='right') == 1
+        src = src[connected]
+        dst = dst[connected]
+    
+    edges = np.empty(len(src), dtype=EDGE_DTYPE)
+    edges['src'] = src
+    edges['dst'] = dst
+    edges['bw'] = bandwidth
+    return edges
+
+# maximum number of job profiles kept in memory (see get_job_profile)
+PROFILE_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def get_job_profile(job_id, split, app_type, seed=None):
+    """
+    Returns the profile of a job, i.e., how the job is split in layers: the fraction of GPU and CPU of each
+    layer and the data exchanged between the layers. The profile only depends on the job id and on the seed
+    of the simulation (see `rng.stream`), so it is computed once and cached. The returned arrays must not be modified.
+    """
+    if seed is None:
+        # local generators, same draws of random.seed(job_id) and np.random.seed(job_id)
+        py_rng = random.Random(job_id)
+        np_rng = np.random.RandomState(int(job_id))
+    else:
+        py_rng = np_rng = stream(seed, "job_profile", job_id)
+    
+    layer_number = int(py_rng.choice([3, 4, 5, 6]))
     if not split:
         layer_number = 1
 
     # use numpy to create an array of random numbers with length equal to the number of layers. As a constraint, the sum of the array must be equal to the number of GPUs
-    NN_gpu = np.random.dirichlet(np.ones(layer_number), size=1)[0] * num_gpu
-    NN_cpu = np.random.dirichlet(np.ones(layer_number), size=1)[0] * num_cpu
-    NN_data_size = generate_application_graph(layer_number, app_type, 1000000)
+    gpu_fractions = np_rng.dirichlet(np.ones(layer_number), size=1)[0]
+    cpu_fractions = np_rng.dirichlet(np.ones(layer_number), size=1)[0]
+    NN_data_size = generate_application_graph(layer_number, app_type, 1000000, rng=np_rng)
+    
+    return gpu_fractions, cpu_fractions, NN_data_size
+
+def unallocate_data(job_id):
+    """
+    Returns the message asking the nodes to release the resources allocated to a job (the nodes know the
+    resources of each layer from their bids, so the message only carries the job id).
+    """
+    return {
+        "job_id": job_id,
+        "unallocate": True
+        }
+
+def message_data(job_id, user, num_gpu, num_cpu, duration, bandwidth, gpu_type, deallocate=False, split=True, app_type=ApplicationGraphType.LINEAR, speedup=0, increase=True, seed=None):
+    
+    if deallocate:
+        return unallocate_data(job_id)
+    
+    gpu_fractions, cpu_fractions, NN_data_size = get_job_profile(job_id, split, app_type, seed)
+    layer_number = len(gpu_fractions)
+    
+    NN_gpu = gpu_fractions * num_gpu
+    NN_cpu = cpu_fractions * num_cpu
+    # each message gets its own copy of the cached edges
+    NN_data_size = NN_data_size.copy()
 
     if split:
         max_layer_bid = layer_number
@@ -188,8 +242,5 @@ def message_data(job_id, user, num_gpu, num_cpu, duration, bandwidth, gpu_type,
     data['duration']=duration
     data['job_id']=job_id
     data['speedup'] = speedup
-    
-    if deallocate:
-        data["unallocate"] = True
 
     return data
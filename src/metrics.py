@@ -0,0 +1,366 @@
+"""
+Change-only (delta-encoded) timeline of the resources used by the nodes during a simulation
+"""
+
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from Plebiscito.src.config import SamplingPolicy
+
+# resources saved for each node
+RESOURCES = ["gpu", "cpu", "bw"]
+
+# columns of each node, in the order of the CSV file (the events refer to them by position)
+WIDE_COLUMNS = ["initial_gpu", "used_gpu", "initial_cpu", "used_cpu", "initial_bw", "used_bw", "gpu_type"]
+
+# columns of the used resources and their exact statistics over the ticks between two samples
+USED_COLUMNS = [1, 3, 5]
+WINDOW_STATISTICS = ["max", "mean"]
+
+# number of change events kept in memory before writing a block
+DEFAULT_BLOCK_SIZE = 1 << 19
+
+
+def _used(initial, updated):
+    # same values of utils.calculate_utility: usage below 0.1 is reported as 0
+    used = initial - updated
+    return np.where(np.abs(used) <= 1e-1, 0, np.round(used, 2))
+
+
+class MetricsSink:
+    """
+    Records the initial and used resources of every node at each time instant as a timeline of change
+    events (tick, node, column, new value): a value is written only when it differs from the one of the
+    previous tick, so the size of the output and the time to write it depend on the number of allocation
+    events rather than on ticks x nodes. The events are written in blocks to `<prefix>_metrics/events_<k>.npz`
+    and `Timeline` rebuilds the dense values of the nodes on demand. When the sink is closed, the metrics
+    can be exported to the wide CSV file written by `utils.write_data` (`<prefix>.csv`).
+
+    The time instants saved (the samples) are chosen by the sampling policy. The maximum and the mean of the
+    used resources of each node over the time instants since the previous sample are kept exactly and saved
+    with each sample, where they differ from the sampled value (see `Timeline.window`), so the peaks between
+    two samples are not lost.
+
+    Args:
+        prefix (str): The prefix of the output files of the simulation.
+        n_nodes (int): The number of nodes.
+        block_size (int, optional): The number of events of each block.
+        csv (bool, optional): If True, `close` exports the metrics to `<prefix>.csv`.
+        policy (SamplingPolicy, optional): The time instants to save.
+        interval (int, optional): The number of time instants between two samples (EVERY_K), or the maximum
+            one (ADAPTIVE).
+    """
+
+    def __init__(self, prefix, n_nodes, block_size=DEFAULT_BLOCK_SIZE, csv=True, policy=SamplingPolicy.EVERY_TICK, interval=1):
+        if interval < 1:
+            raise ValueError(f"The sampling interval must be at least 1, got {interval}")
+
+        self.prefix = prefix
+        self.directory = metrics_directory(prefix)
+        self.n_nodes = n_nodes
+        self.block_size = block_size
+        self.csv = csv
+        self.policy = policy
+        self.interval = interval
+        # current interval of the adaptive policy
+        self.gap = 1
+        self.n_blocks = 0
+        # number of samples saved
+        self.n_ticks = 0
+        # number of time instants recorded
+        self.n_recorded = 0
+        # time instant, values and statistics of the used resources of the ticks not sampled yet
+        self.pending = None
+        self.window_ticks = 0
+        # GPU types (as written in the CSV file) and their codes
+        self.gpu_types = {}
+        # values of the previous tick (NaN before the first one, so every value is an event)
+        self.last = np.full((n_nodes, len(WIDE_COLUMNS)), np.nan)
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+        self.new_block()
+
+    def new_block(self):
+        self.events = []
+        self.window_events = []
+        self.n_events = 0
+        # time instants of the ticks recorded since the previous block
+        self.time_instants = []
+
+    def record(self, time_instant, nodes):
+        """
+        Records the values of the nodes at a time instant, saving the ones that changed since the previous
+        sample if the time instant is sampled.
+        """
+        # a single pass on the nodes, columns (initial, updated) for each resource
+        values = np.array([(n.initial_gpu, n.updated_gpu, n.initial_cpu, n.updated_cpu, n.initial_bw, n.updated_bw) for n in nodes], dtype=np.float64)
+        current = np.empty_like(self.last)
+        for k in range(len(RESOURCES)):
+            current[:, 2*k] = np.round(values[:, 2*k], 2)
+            current[:, 2*k+1] = _used(values[:, 2*k], values[:, 2*k+1])
+        current[:, -1] = [self.gpu_types.setdefault(str(n.gpu_type), len(self.gpu_types)) for n in nodes]
+
+        used = current[:, USED_COLUMNS]
+        if self.window_ticks == 0:
+            self.window_max, self.window_min, self.window_sum = used.copy(), used.copy(), used.copy()
+        else:
+            np.maximum(self.window_max, used, out=self.window_max)
+            np.minimum(self.window_min, used, out=self.window_min)
+            self.window_sum += used
+        self.window_ticks += 1
+        self.pending = (time_instant, current)
+        self.n_recorded += 1
+
+        if self.sampled(current):
+            self.sample()
+
+    def sampled(self, current):
+        """
+        Returns True if the time instant just recorded is saved, according to the sampling policy.
+        """
+        if self.policy == SamplingPolicy.EVERY_TICK:
+            return True
+        if self.policy == SamplingPolicy.EVERY_K:
+            return (self.n_recorded - 1) % self.interval == 0
+        changed = not np.array_equal(current, self.last)
+        if self.policy == SamplingPolicy.ON_CHANGE:
+            return changed
+        # adaptive: every tick after a change, then the interval is doubled after each quiet sample
+        if self.window_ticks < self.gap:
+            return False
+        self.gap = 1 if changed else min(self.interval, self.gap * 2)
+        return True
+
+    def sample(self):
+        """
+        Saves the values of the pending time instant that changed since the previous sample, and the
+        statistics of the used resources over the ticks since the previous sample.
+        """
+        time_instant, current = self.pending
+        node, column = np.nonzero(current != self.last)
+        if len(node) > 0:
+            self.events.append((np.full(len(node), self.n_ticks, dtype=np.int64), node.astype(np.int32), column.astype(np.int8), current[node, column]))
+            self.n_events += len(node)
+
+        # the statistics are saved only where they differ from the sampled values (i.e., the ones that changed within the window)
+        used = current[:, USED_COLUMNS]
+        mean = np.where(self.window_min == self.window_max, used, self.window_sum / self.window_ticks)
+        for k, values in enumerate([self.window_max, mean]):
+            node, column = np.nonzero(values != used)
+            if len(node) > 0:
+                self.window_events.append((np.full(len(node), self.n_ticks, dtype=np.int64), node.astype(np.int32), (k * len(USED_COLUMNS) + column).astype(np.int8), values[node, column]))
+                self.n_events += len(node)
+
+        self.last = current
+        self.time_instants.append(time_instant)
+        self.n_ticks += 1
+        self.pending = None
+        self.window_ticks = 0
+
+        if self.n_events >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the events in memory as a new block.
+        """
+        if len(self.time_instants) == 0:
+            return
+
+        tick, node, column, value = _concatenate(self.events)
+        window_tick, window_node, window_column, window_value = _concatenate(self.window_events)
+        np.savez(
+            os.path.join(self.directory, "events_%05d.npz" % self.n_blocks),
+            n_nodes=self.n_nodes,
+            time_instant=np.array(self.time_instants, dtype=np.int64),
+            tick=tick, node=node, column=column, value=value,
+            window_tick=window_tick, window_node=window_node, window_column=window_column, window_value=window_value,
+            gpu_type_names=np.array(list(self.gpu_types), dtype=str),
+        )
+        self.n_blocks += 1
+        self.new_block()
+
+    def close(self):
+        """
+        Saves the last time instant (if not sampled yet), writes the remaining events and, if enabled,
+        exports the metrics to the CSV file.
+        """
+        if self.pending is not None:
+            self.sample()
+        self.flush()
+        if self.csv and self.n_ticks > 0:
+            export_csv(self.prefix)
+
+
+def _concatenate(events):
+    if len(events) == 0:
+        return tuple(np.empty(0, dtype=t) for t in (np.int64, np.int32, np.int8, np.float64))
+    return tuple(np.concatenate(c) for c in zip(*events))
+
+
+def metrics_directory(prefix):
+    return prefix + "_metrics"
+
+
+class Timeline:
+    """
+    The change events of a simulation (see `MetricsSink`), from which the values of every node at each
+    time instant are rebuilt on demand.
+
+    Args:
+        prefix (str): The prefix of the output files of the simulation.
+    """
+
+    def __init__(self, prefix):
+        blocks = []
+        for path in sorted(glob.glob(os.path.join(metrics_directory(prefix), "events_*.npz"))):
+            with np.load(path) as block:
+                blocks.append({k: block[k] for k in block.files})
+        if len(blocks) == 0:
+            raise FileNotFoundError(f"No metrics found in {metrics_directory(prefix)}")
+
+        self.n_nodes = int(blocks[0]["n_nodes"])
+        # the names of the GPU types only grow, the last block has all of them
+        self.gpu_type_names = blocks[-1]["gpu_type_names"]
+        self.time_instant = np.concatenate([b["time_instant"] for b in blocks])
+        self.tick, self.node, self.column, self.value = (np.concatenate([b[k] for b in blocks]) for k in ("tick", "node", "column", "value"))
+        self.window_events = tuple(np.concatenate([b["window_" + k] for b in blocks]) for k in ("tick", "node", "column", "value"))
+
+    def __len__(self):
+        return len(self.time_instant)
+
+    def iter_dense(self, ticks_per_chunk=None):
+        """
+        Yields the values of the nodes in consecutive chunks of ticks, as (time instants, values) where
+        values has shape (ticks, nodes, columns) and the columns are the ones of `WIDE_COLUMNS` (the GPU
+        types as codes of `gpu_type_names`).
+        """
+        if ticks_per_chunk is None:
+            ticks_per_chunk = max(1, DEFAULT_BLOCK_SIZE // max(1, self.n_nodes))
+
+        state = np.full((self.n_nodes, len(WIDE_COLUMNS)), np.nan)
+        bounds = np.searchsorted(self.tick, np.arange(0, len(self) + ticks_per_chunk, ticks_per_chunk))
+        for c, start in enumerate(range(0, len(self), ticks_per_chunk)):
+            n = min(ticks_per_chunk, len(self) - start)
+            events = slice(bounds[c], bounds[c + 1])
+
+            # each value is the one of the last event at or before its tick (the state before the chunk otherwise)
+            dense = np.full((n,) + state.shape, np.nan)
+            dense[self.tick[events] - start, self.node[events], self.column[events]] = self.value[events]
+            last = np.where(np.isnan(dense), -1, np.arange(n)[:, None, None])
+            np.maximum.accumulate(last, axis=0, out=last)
+            dense = np.where(last >= 0, np.take_along_axis(dense, np.maximum(last, 0), axis=0), state)
+
+            state = dense[-1]
+            yield self.time_instant[start:start + n], dense
+
+    def dense(self):
+        """
+        Returns the time instants and the values of the nodes at all the ticks (see `iter_dense`).
+        """
+        chunks = list(self.iter_dense(ticks_per_chunk=max(1, len(self))))
+        if len(chunks) == 0:
+            return self.time_instant, np.empty((0, self.n_nodes, len(WIDE_COLUMNS)))
+        return chunks[0]
+
+    def window(self, statistic):
+        """
+        Returns the time instants and, for each sample, the exact maximum or mean (`statistic`) of the used
+        resources of the nodes over the time instants since the previous sample, with shape (ticks, nodes,
+        resources) and the resources in the order of `RESOURCES`.
+        """
+        time_instant, dense = self.dense()
+        values = dense[:, :, USED_COLUMNS]
+        tick, node, column, value = self.window_events
+        k = WINDOW_STATISTICS.index(statistic)
+        selected = (column >= k * len(USED_COLUMNS)) & (column < (k + 1) * len(USED_COLUMNS))
+        values[tick[selected], node[selected], column[selected] - k * len(USED_COLUMNS)] = value[selected]
+        return time_instant, values
+
+    def to_wide(self):
+        """
+        Returns the values of the nodes in the wide format of the CSV file (one row for each time instant).
+        """
+        time_instant, dense = self.dense()
+        data = {"time_instant": time_instant}
+        for i in range(self.n_nodes):
+            for k, c in enumerate(WIDE_COLUMNS):
+                data["node_" + str(i) + "_" + c] = self.gpu_type_names[dense[:, i, k].astype(int)] if c == "gpu_type" else dense[:, i, k]
+        return pd.DataFrame(data)
+
+    def to_long(self):
+        """
+        Returns the values of the nodes in long format (time_instant, node, initial_<resource>,
+        used_<resource>, gpu_type), one row for each time instant and node.
+        """
+        time_instant, dense = self.dense()
+        df = pd.DataFrame({
+            "time_instant": np.repeat(time_instant, self.n_nodes),
+            "node": np.tile(np.arange(self.n_nodes, dtype=np.int32), len(time_instant)),
+        })
+        for k, c in enumerate(WIDE_COLUMNS):
+            values = dense[:, :, k].ravel()
+            df[c] = self.gpu_type_names[values.astype(int)] if c == "gpu_type" else values
+        return df
+
+
+def load_metrics(prefix):
+    """
+    Returns the metrics of a simulation as a DataFrame in long format (see `Timeline.to_long`).
+    """
+    return Timeline(prefix).to_long()
+
+
+def read_node_metrics(prefix):
+    """
+    Returns the metrics of a simulation in the wide format of `<prefix>.csv`, rebuilt from the timeline of
+    changes if available (read from the CSV file otherwise, e.g., for the results of older simulations).
+    """
+    if os.path.isdir(metrics_directory(prefix)):
+        return Timeline(prefix).to_wide()
+    return pd.read_csv(prefix + ".csv")
+
+
+def _format(values, used=False):
+    # few distinct values (the resources of the nodes change rarely): each one is formatted once
+    unique, inverse = np.unique(values, return_inverse=True)
+    if used:
+        # same text of utils.calculate_utility: 0 (int) below the threshold, a rounded float otherwise
+        text = np.array(["0" if v == 0 else repr(float(v)) for v in unique], dtype=object)
+    elif unique.dtype.kind == "f":
+        text = np.array([str(int(v)) if v.is_integer() else repr(float(v)) for v in unique], dtype=object)
+    else:
+        text = np.array([str(v) for v in unique], dtype=object)
+    return text[inverse.reshape(values.shape)]
+
+
+def export_csv(prefix, csv_file=None):
+    """
+    Exports the metrics of a simulation to the wide CSV file read by the plots (`<prefix>.csv` by default),
+    one chunk of ticks at a time.
+    """
+    if csv_file is None:
+        csv_file = prefix + ".csv"
+
+    timeline = Timeline(prefix)
+    n_nodes = timeline.n_nodes
+    gpu_type_names = np.array([str(g) for g in timeline.gpu_type_names], dtype=object)
+    with open(csv_file, "w", newline="") as f:
+        if len(timeline) > 0:
+            f.write(",".join(["time_instant"] + ["node_" + str(i) + "_" + k for i in range(n_nodes) for k in WIDE_COLUMNS]) + "\r\n")
+
+        for time_instant, dense in timeline.iter_dense():
+            rows = np.empty((len(time_instant), 1 + len(WIDE_COLUMNS) * n_nodes), dtype=object)
+            rows[:, 0] = _format(time_instant)
+            for k, c in enumerate(WIDE_COLUMNS):
+                if c == "gpu_type":
+                    rows[:, 1 + k::len(WIDE_COLUMNS)] = gpu_type_names[dense[:, :, k].astype(int)]
+                else:
+                    rows[:, 1 + k::len(WIDE_COLUMNS)] = _format(dense[:, :, k], used=c.startswith("used_"))
+            # same line terminator of csv.DictWriter
+            f.writelines(",".join(r) + "\r\n" for r in rows.tolist())
@@ -95,9 +95,12 @@ class NetworkTopology:
         def __str__(self) -> str:
             return "Edge_" + str(self.__id)
 
-    def __init__(self, n_nodes, min_bw, max_bw, group_number=3, seed=None, topology_type=TopologyType.RING):
-        if seed is not None:
-            random.seed(seed)
+    def __init__(self, n_nodes, min_bw, max_bw, group_number=3, seed=None, topology_type=TopologyType.RING, rng=None):
+        # local generator (same draws of random.seed(seed)), unless a numpy generator is provided
+        if rng is None:
+            self.__uniform = random.Random(seed).uniform
+        else:
+            self.__uniform = lambda a, b: float(rng.uniform(a, b))
 
         self.__group_number = group_number
         self.__n_nodes = n_nodes
@@ -188,7 +191,7 @@ class NetworkTopology:
         self.__direct_edge_id = {}
         for i in range(self.__n_nodes):
             e = NetworkTopology.Edge(
-                index, random.uniform(self.__min_bw, self.__max_bw))
+                index, self.__uniform(self.__min_bw, self.__max_bw))
             self.__edges[e.get_id()] = e
             self.__direct_edge_id[i] = e.get_id()
             index += 1
@@ -204,7 +207,7 @@ class NetworkTopology:
             id = (id+1) % 2
 
             e = NetworkTopology.Edge(
-                index, random.uniform(self.__min_bw, self.__max_bw))
+                index, self.__uniform(self.__min_bw, self.__max_bw))
             self.__edges[e.get_id()] = e
             index += 1
 
@@ -215,7 +218,7 @@ class NetworkTopology:
 
         # edge tra i due switch di backbone
         e = NetworkTopology.Edge(
-            index, random.uniform(self.__min_bw, self.__max_bw))
+            index, self.__uniform(self.__min_bw, self.__max_bw))
         self.__edges[e.get_id()] = e
         index += 1
 
@@ -267,7 +270,7 @@ class NetworkTopology:
         index = 0
         for i in range(self.__n_nodes):
             e = NetworkTopology.Edge(
-                index, random.uniform(self.__min_bw, self.__max_bw))
+                index, self.__uniform(self.__min_bw, self.__max_bw))
             self.__edges[e.get_id()] = e
             self.__direct_edge_id[i] = e.get_id()
             index += 1
@@ -282,11 +285,11 @@ class NetworkTopology:
             prev_id = self.__n_nodes + self.__group_number - \
                 1 if i == 0 else self.__n_nodes + i-1
             e1 = NetworkTopology.Edge(
-                index, random.uniform(self.__min_bw, self.__max_bw))
+                index, self.__uniform(self.__min_bw, self.__max_bw))
             self.__edges[e1.get_id()] = e1
             index += 1
             e2 = NetworkTopology.Edge(
-                index, random.uniform(self.__min_bw, self.__max_bw))
+                index, self.__uniform(self.__min_bw, self.__max_bw))
             self.__edges[e2.get_id()] = e2
             index += 1
             self.__edge_id[self.__n_nodes+i][prev_id] = e1.get_id()
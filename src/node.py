@@ -11,10 +11,13 @@ from datetime import datetime, timedelta
 import copy
 import logging
 import math 
+import pickle
 import threading
 from threading import Event
 import math
 from Plebiscito.src.topology import topo as LogicalTopology
+from Plebiscito.src.rng import stream
+from Plebiscito.src.node_stats import NodeStats
 from FGD.src.utils import Quadrant
 
 
@@ -24,25 +27,109 @@ class InternalError(Exception):
     "Raised when the input value is less than 18"
     pass
 
+class NodeSpec:
+    """
+    Minimal description of a node, used to build the node inside the process hosting it
+    instead of shipping the whole node object to the process.
+
+    Args:
+        id (int): The id of the node.
+        gpu_type (GPUType): The GPU type of the node.
+        utility (Utility): The utility function used to bid.
+        alpha (float): Weight of the utility function.
+        decrement_factor (float): Decrement factor of the utility when the GPU types do not match.
+        tot_nodes (int): The total number of nodes.
+        topology: Either the list of neighbors of the node (static topology) or a handle to the shared logical topology.
+        network_topology: Handle to the shared network topology (only used with `use_net_topology`).
+        seed (int, optional): The root seed of the simulation (see `rng.stream`), used for the performance model of the node.
+        stats (bool, optional): If True, the node records the counters of its protocol activity (see `node_stats.NodeStats`).
+    """
+    
+    def __init__(self, id, gpu_type: GPUType, utility: Utility, alpha: float, decrement_factor: float, tot_nodes: int, topology, network_topology=None, enable_logging=False, progress_flag=False, use_net_topology=False, seed=None, stats=False):
+        self.id = id
+        self.gpu_type = gpu_type
+        self.utility = utility
+        self.alpha = alpha
+        self.decrement_factor = decrement_factor
+        self.tot_nodes = tot_nodes
+        self.topology = topology
+        self.network_topology = network_topology
+        self.enable_logging = enable_logging
+        self.progress_flag = progress_flag
+        self.use_net_topology = use_net_topology
+        self.seed = seed
+        self.stats = stats
+        
+    def build(self):
+        if isinstance(self.topology, list):
+            n = node(self.id, self.network_topology, self.gpu_type, self.utility, self.alpha, self.enable_logging, None, self.tot_nodes, self.progress_flag, use_net_topology=self.use_net_topology, decrement_factor=self.decrement_factor, seed=self.seed, stats=self.stats)
+            n.neighbors = self.topology
+        else:
+            n = node(self.id, self.network_topology, self.gpu_type, self.utility, self.alpha, self.enable_logging, self.topology, self.tot_nodes, self.progress_flag, use_net_topology=self.use_net_topology, decrement_factor=self.decrement_factor, seed=self.seed, stats=self.stats)
+        return n
+
 class node:
 
-    def __init__(self, id, network_topology: NetworkTopology, gpu_type: GPUType, utility: Utility, alpha: float, enable_logging: bool, logical_topology: LogicalTopology, tot_nodes: int, progress_flag: bool, use_net_topology=False, decrement_factor=0.00001):
+    def __init__(self, id, network_topology: NetworkTopology, gpu_type: GPUType, utility: Utility, alpha: float, enable_logging: bool, logical_topology: LogicalTopology, tot_nodes: int, progress_flag: bool, use_net_topology=False, decrement_factor=0.00001, seed=None, stats=False):
         self.id = id    # unique edge node id
         self.gpu_type = gpu_type
         self.utility = utility
         self.alpha = alpha
         self.enable_logging = enable_logging
         self.logical_topology = logical_topology
+        # static list of neighbors, set when the logical topology can't change during the simulation
+        self.neighbors = None
         self.tot_nodes = tot_nodes
         self.progress_flag = progress_flag
         self.decrement_factor = decrement_factor
         
         self.initial_cpu, self.initial_gpu = GPUSupport.get_compute_resources(gpu_type)
+        if seed is None:
+            self.performance = NodePerformance(self.initial_cpu, self.initial_gpu, self.id)
+        else:
+            self.performance = NodePerformance(self.initial_cpu, self.initial_gpu, rng=stream(seed, "node_performance", self.id))
+        
+        if use_net_topology:
+            self.network_topology = network_topology
+            self.initial_bw = network_topology.get_node_direct_link_bw(self.id)
+        else:
+            self.initial_bw = 100000000000
+           
+        self.use_net_topology = use_net_topology
+            
+        # ------------------
+        # use https://dl.acm.org/doi/pdf/10.1145/2851553.2851567 to define the CPU/power transfer function
+        # use https://dl.acm.org/doi/pdf/10.1145/1815961.1815998 to define the GPU/power transfer function
+        # ------------------
+        # initialize random values for the power consumption
+        
+        self.__layer_bid_lock = threading.Lock()
+        
+        # queue receiving the changes of the winner vectors (see consensus.ConsensusTracker), if tracked
+        self.consensus_reports = None
+        self.reports_sent = 0
+        # incremented whenever the node processes messages, so the simulator re-reads only the nodes that changed
+        self.state_version = 0
+        # protocol counters, reset with the state of the node (see init_state)
+        self.collect_stats = stats
+        
+        if self.initial_gpu != 0:
+            #print(f"Node {self.id} CPU/GPU ratio: {self.initial_cpu/self.initial_gpu}")
+            pass
+        else:
+            #print(f"Node {self.id} CPU/GPU ratio: <inf>")
+            pass
+        
+        self.init_state()
+        
+    def init_state(self):
+        """
+        Initializes the state of the node that changes during a simulation (available resources, bids, counters).
+        """
         self.updated_gpu = self.initial_gpu
         self.updated_cpu = self.initial_cpu
-        self.performance = NodePerformance(self.initial_cpu, self.initial_gpu, self.id)
         
-        if utility == Utility.FGD:
+        if self.utility == Utility.FGD:
             self.individual_gpu = []
             self.allocated_on = {}
             for _ in range(self.initial_gpu):
@@ -61,43 +148,37 @@ class node:
         self.cum_gpu_reserved = 0
         self.cum_bw_reserved = 0
         
-        if use_net_topology:
-            self.network_topology = network_topology
-            self.initial_bw = network_topology.get_node_direct_link_bw(self.id)
+        if self.use_net_topology:
             self.bw_with_nodes = {}
             self.bw_with_client = {}
         else:
-            self.initial_bw = 100000000000
             self.updated_bw = self.initial_bw
-           
-        self.use_net_topology = use_net_topology
-            
-        # ------------------
-        # use https://dl.acm.org/doi/pdf/10.1145/2851553.2851567 to define the CPU/power transfer function
-        # use https://dl.acm.org/doi/pdf/10.1145/1815961.1815998 to define the GPU/power transfer function
-        # ------------------
-        # initialize random values for the power consumption
         
         self.last_bid_timestamp = {}
         #self.last_bid_timestamp_lock = threading.Lock()
         
-        self.__layer_bid_lock = threading.Lock()
         self.__layer_bid = {}
         self.__layer_bid_events = {}
         
-        if self.initial_gpu != 0:
-            #print(f"Node {self.id} CPU/GPU ratio: {self.initial_cpu/self.initial_gpu}")
-            pass
-        else:
-            #print(f"Node {self.id} CPU/GPU ratio: <inf>")
-            pass
-        
         self.counter = {}
         
         self.user_requests = []
         self.item={}
         self.bids= {}
         self.layer_bid_already = {}
+        # last winner vector of each job sent to the consensus tracker
+        self.reported = {}
+        self.stats = NodeStats() if self.collect_stats else None
+        
+    def reset_state(self, utility: Utility, alpha: float, decrement_factor: float):
+        """
+        Brings the node back to its initial state, possibly with a new configuration of the bidding
+        process, so that the same node can be reused for a new simulation.
+        """
+        self.utility = utility
+        self.alpha = alpha
+        self.decrement_factor = decrement_factor
+        self.init_state()
 
     def get_avail_gpu(self):
         return self.updated_gpu
@@ -111,10 +192,51 @@ class node:
     def compute_curr_gpu_power_consumption(self):
         return self.power_function(self.initial_gpu - self.updated_gpu, "gpu")
         
-    def set_queues(self, q, use_queue):
-        self.q = q
+    def get_neighbors(self):
+        """
+        Returns the ids of the nodes that receive the messages forwarded by this node.
+        """
+        if self.neighbors is not None:
+            return self.neighbors
+        
+        # a single call (i.e., a single round trip if the topology is shared through a manager)
+        adjacency_matrix = self.logical_topology.to()
+        return [i for i in range(self.tot_nodes) if adjacency_matrix[i][self.id] and self.id != i]
+        
+    def set_transport(self, transport, use_queue, consensus_reports=None):
+        self.transport = transport
         self.empty_queue = use_queue
-        self.empty_queue[self.id].set()
+        self.consensus_reports = consensus_reports
+        
+    def report_winners(self, job_id):
+        """
+        Sends the winner vector of a job to the consensus tracker if it changed since the last report
+        (None if the node dropped its bid).
+        """
+        if self.consensus_reports is None:
+            return
+        
+        winners = tuple(self.bids[job_id]['auction_id']) if job_id in self.bids else None
+        if self.reported.get(job_id) == winners:
+            return
+        
+        if winners is None:
+            del self.reported[job_id]
+        else:
+            self.reported[job_id] = winners
+        self.consensus_reports.put((self.id, job_id, winners))
+        self.reports_sent += 1
+
+    def report_idle(self):
+        """
+        Tells the consensus tracker that the node processed all its messages: no report of the node follows
+        until it receives a new message (see `consensus.ConsensusTracker.quiescent`).
+        """
+        if self.consensus_reports is None:
+            return
+
+        self.consensus_reports.put((self.id, None, None))
+        self.reports_sent += 1
     
     def init_null(self):
         # print(self.item['duration'])
@@ -258,9 +380,12 @@ class node:
         }
         
         if first_msg:
-            for i in range(self.tot_nodes):
-                if self.logical_topology.to()[i][self.id] and self.id != i and i != self.item['edge_id']:
-                    self.q[i].put(msg)
+            sent = 0
+            for i in self.get_neighbors():
+                if i != self.item['edge_id']:
+                    self.transport.send(i, msg)
+                    sent += 1
+            self.record_forward(msg, sent)
             return
         
         if custom_dict == None and not resend_bid:
@@ -289,14 +414,27 @@ class node:
         if self.enable_logging:
             self.print_node_state('FORWARD', True)
             
-        for i in range(self.tot_nodes):
-            if self.logical_topology.to()[i][self.id] and self.id != i:
-                self.q[i].put(msg)
+        neighbors = self.get_neighbors()
+        for i in neighbors:
+            self.transport.send(i, msg)
+        self.record_forward(msg, len(neighbors))
         
         #self.last_sent_msg[self.item['job_id']] = msg
 
 
 
+    def record_forward(self, msg, sent):
+        """
+        Counts the messages sent to the neighbors and their size once serialized.
+        """
+        if self.stats is None or sent == 0:
+            return
+        size = len(pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL))
+        self.stats.counters["forwards"] += 1
+        self.stats.counters["messages_out"] += sent
+        self.stats.counters["bytes_out"] += sent * size
+        self.stats.observe("message_bytes", size)
+    
     def print_node_state(self, msg, bid=False, type='debug'):
         logger_method = getattr(logging, type)
         #print(str(self.item.get('auction_id')) if bid and self.item.get('auction_id') is not None else "\n")
@@ -329,7 +467,8 @@ class node:
         return index + 1
     
     # NOTE: inprove in future iterations
-    def compute_layer_score(self, cpu, gpu, bw):
+    # (the data exchanged by the layer, `bw`, is not used by the score yet, so the bidding loops don't compute it)
+    def compute_layer_score(self, cpu, gpu, bw=None):
         return gpu
     
     def _compute_fragmentation(self, workload_cpus, workload_gpus, node_gpus):
@@ -478,7 +617,7 @@ class node:
             
             # iterate on the identify the preferable layer to bid on
             for l in possible_layer:
-                score = self.compute_layer_score(self.item["NN_cpu"][l], self.item["NN_gpu"][l], self.item["NN_data_size"][l])
+                score = self.compute_layer_score(self.item["NN_cpu"][l], self.item["NN_gpu"][l])
                 if best_score == None or score > best_score:
                     best_score = score
                     best_placement = l
@@ -525,13 +664,13 @@ class node:
                     if left_bound >= 0 and self.layer_bid_already[self.item['job_id']][left_bound] == False \
                         and self.item['NN_gpu'][left_bound] <= self.updated_gpu - gpu_ \
                             and self.item['NN_cpu'][left_bound] <= self.updated_cpu - cpu_:
-                        left_score = self.compute_layer_score(self.item["NN_cpu"][left_bound], self.item["NN_gpu"][left_bound], self.item["NN_data_size"][left_bound])
+                        left_score = self.compute_layer_score(self.item["NN_cpu"][left_bound], self.item["NN_gpu"][left_bound])
                         
                     if right_bound < len(self.item["NN_cpu"]) and self.layer_bid_already[self.item['job_id']][right_bound] == False \
                         and self.item['NN_gpu'][right_bound] <= self.updated_gpu - gpu_ \
                             and self.item['NN_cpu'][right_bound] <= self.updated_cpu - cpu_:
                                 
-                        right_score = self.compute_layer_score(self.item["NN_cpu"][right_bound], self.item["NN_gpu"][right_bound], self.item["NN_data_size"][right_bound])
+                        right_score = self.compute_layer_score(self.item["NN_cpu"][right_bound], self.item["NN_gpu"][right_bound])
                     
                     target_layer = None
                     
@@ -624,31 +763,22 @@ class node:
     
     def update_bw(self, prev_bid, deallocate=False):
         bw = 0
-                
+        
+        # only the edges between a layer hosted by the node and a layer hosted elsewhere use the bandwidth 
         if prev_bid is not None:
-            for i, b_id in enumerate(prev_bid):
-                if b_id == self.id:
-                    for j in range(len(self.item["NN_data_size"][i])):
-                        if i == j:
-                            continue
-                        
-                        if self.item["NN_data_size"][i][j] != 0 and prev_bid[j] != self.id:
-                            bw += self.item["NN_data_size"][i][j]
+            for src, dst, size in self.item["NN_data_size"]:
+                if size != 0 and (prev_bid[src] == self.id) != (prev_bid[dst] == self.id):
+                    bw += size
                             
         if deallocate:
             self.updated_bw += bw
             return
         
         if self.item['job_id'] in self.bids:                
-            for i, b_id in enumerate(self.bids[self.item['job_id']]['auction_id']):
-                if b_id == self.id:
-                    for j in range(len(self.item["NN_data_size"][i])):
-                        if i == j:
-                            continue
-                        
-                        if self.item["NN_data_size"][i][j] != 0 and self.bids[self.item['job_id']]['auction_id'][j] != self.id:
-                            bw -= self.item["NN_data_size"][i][j]
-                
+            auction_id = self.bids[self.item['job_id']]['auction_id']
+            for src, dst, size in self.item["NN_data_size"]:
+                if size != 0 and (auction_id[src] == self.id) != (auction_id[dst] == self.id):
+                    bw -= size
             
         self.updated_bw += bw
     
@@ -1076,20 +1206,29 @@ class node:
                     self.bids[self.item['job_id']]['consensus_count']+=1
                     # pass        
             else:                
+                start = time.perf_counter_ns()
                 rebroadcast = self.deconfliction()
+                if self.stats is not None:
+                    self.stats.counters["deconflictions"] += 1
+                    self.stats.add_time("deconfliction", time.perf_counter_ns() - start)
                 
-                if self.utility == Utility.FGD:
-                    success = self.bid_FGD()
-                else:
-                    success = self.bid()
+                success = self.timed_bid()
                     
                 return success or rebroadcast
         else:
-            if self.utility == Utility.FGD:
-                self.bid_FGD()
-            else:
-                self.bid()
+            self.timed_bid()
             return True
+        
+    def timed_bid(self):
+        start = time.perf_counter_ns()
+        if self.utility == Utility.FGD:
+            success = self.bid_FGD()
+        else:
+            success = self.bid()
+        if self.stats is not None:
+            self.stats.counters["bids"] += 1
+            self.stats.add_time("bid", time.perf_counter_ns() - start)
+        return success
 
     def check_if_hosting_job(self):
         if self.item['job_id'] in self.bids and self.id in self.bids[self.item['job_id']]['auction_id']:
@@ -1099,34 +1238,129 @@ class node:
     def release_resources(self):
         cpu = 0
         gpu = 0
+        # the resources of the layers are taken from the bid (unallocate messages only carry the job id)
+        bid = self.bids[self.item['job_id']]
         
-        for i, id in enumerate(self.bids[self.item['job_id']]['auction_id']):
+        for i, id in enumerate(bid['auction_id']):
             if id == self.id:
-                cpu += self.item['NN_cpu'][i]
-                gpu += self.item['NN_gpu'][i]
+                cpu += bid['NN_cpu'][i]
+                gpu += bid['NN_gpu'][i]
                 
         self.updated_cpu += cpu
         self.updated_gpu += gpu
         
         if self.utility == Utility.FGD:
             for n, id in enumerate(self.allocated_on[self.item["job_id"]]):
-                self.individual_gpu[id] += self.item["NN_gpu"][n]
+                self.individual_gpu[id] += bid["NN_gpu"][n]
+
+    def publish_state(self, ret_val):
+        """
+        Saves the current state of the node in the `ret_val` dictionary shared with the simulator.
+        """
+        # a single update, i.e., a single round trip when ret_val is a manager proxy
+        state = {
+            "id": self.id,
+            "bids": copy.deepcopy(self.bids),
+            "counter": copy.deepcopy(self.counter),
+            "updated_cpu": self.updated_cpu,
+            "updated_gpu": self.updated_gpu,
+            "updated_bw": self.updated_bw,
+            "gpu_type": self.gpu_type.name,
+            "reports_sent": self.reports_sent,
+            "version": self.state_version,
+            # "cpu_consumption": self.performance.compute_current_power_consumption_cpu(self.initial_cpu-self.updated_cpu),
+        }
+        if self.stats is not None:
+            state["stats"] = self.stats.to_dict()
+        ret_val.update(state)
+
+    def process_messages(self, items, ret_val=None):
+        """
+        Processes a batch of messages received by the node and forwards the updated bids to the neighbors.
+        
+        Args:
+            items (list): The messages extracted from the node mailbox.
+            ret_val (dict, optional): If provided, the node state is published there after every deallocation.
+        """
+        first_msg = False
+        need_rebroadcast = False   
+        self.state_version += 1
+        if self.stats is not None:
+            self.stats.counters["messages_in"] += len(items)
+        
+        self.updated_cpu = round(self.updated_cpu, 3) 
+        self.updated_gpu = round(self.updated_gpu, 3)                  
+        
+        for it in items:
+            self.item = it
+            # control message sent by the simulator between two simulations 
+            if "reset_state" in self.item:
+                self.reset_state(**self.item["reset_state"])
+                if ret_val is not None:
+                    self.publish_state(ret_val)
+                continue
+            
+            # if the message is a "unallocate" message, the node must release the resources
+            # if the node is hosting the job
+            if "unallocate" in self.item:
+                if self.check_if_hosting_job():
+                    self.release_resources()
+                    self.job_hosted.append(self.item['job_id'])
+                
+                #p_bid = copy.deepcopy(self.bids[self.item['job_id']]["auction_id"])
+                
+                # if the bidding process didn't complete, reset the bid (it will be submitted later)
+                #if float('-inf') in self.bids[self.item['job_id']]['auction_id']:
+                del self.bids[self.item['job_id']]
+                del self.counter[self.item['job_id']]
+                self.report_winners(self.item['job_id'])
+                
+                #self.update_bw(prev_bid=p_bid, deallocate=True)
+                
+                if ret_val is not None:
+                    self.publish_state(ret_val)
+            else:   
+                # prev_bid = None
+                first_msg = False
+                
+                # if self.item['job_id'] in self.bids:
+                #     prev_bid = copy.deepcopy(self.bids[self.item['job_id']]["auction_id"])
+                
+                if self.item['job_id'] not in self.counter:
+                    self.init_null()
+                    first_msg = True
+                    self.counter[self.item['job_id']] = 0
+                self.counter[self.item['job_id']] += 1                               
+                    
+                if self.enable_logging:
+                    self.print_node_state('IF1 q:' + str(self.transport.qsize(self.id)))
+
+                success = self.update_bid()
+            
+                need_rebroadcast = need_rebroadcast or success
+
+                self.bids[self.item['job_id']]['start_time'] = 0                            
+                self.bids[self.item['job_id']]['count'] += 1
+                self.report_winners(self.item['job_id'])
+                
+                #self.update_bw(prev_bid)
+                
+        if need_rebroadcast:
+            if self.stats is not None:
+                self.stats.counters["rebroadcasts"] += 1
+            self.forward_to_neighbohors()
+        elif first_msg:
+            self.forward_to_neighbohors(first_msg=True)
 
     def work(self, end_processing, notify_start, progress_bid, ret_val):
+        self.transport.start(self.id)
         notify_start.set()
         if self.use_net_topology:
             timeout = 15
         else:
             timeout = 0.05
         
-        ret_val["id"] = self.id
-        ret_val["bids"] = copy.deepcopy(self.bids)
-        ret_val["counter"] = self.counter
-        ret_val["updated_cpu"] = self.updated_cpu
-        ret_val["updated_gpu"] = self.updated_gpu
-        ret_val["updated_bw"] = self.updated_bw
-        ret_val["gpu_type"] = self.gpu_type.name
-        # ret_val["cpu_consumption"] = self.performance.compute_current_power_consumption_cpu(self.initial_cpu-self.updated_cpu)
+        self.publish_state(ret_val)
 
         self.already_finished = True
         
@@ -1134,68 +1368,10 @@ class node:
             try: 
                 self.item = None
                 items = self.extract_all_job_msg(timeout)  
-                first_msg = False
-                need_rebroadcast = False   
-                
-                self.updated_cpu = round(self.updated_cpu, 3) 
-                self.updated_gpu = round(self.updated_gpu, 3)                  
                                    
                 self.empty_queue[self.id].clear() 
                 
-                for it in items:
-                    self.item = it
-                    # if the message is a "unallocate" message, the node must release the resources
-                    # if the node is hosting the job
-                    if "unallocate" in self.item:
-                        if self.check_if_hosting_job():
-                            self.release_resources()
-                            self.job_hosted.append(self.item['job_id'])
-                        
-                        #p_bid = copy.deepcopy(self.bids[self.item['job_id']]["auction_id"])
-                        
-                        # if the bidding process didn't complete, reset the bid (it will be submitted later)
-                        #if float('-inf') in self.bids[self.item['job_id']]['auction_id']:
-                        del self.bids[self.item['job_id']]
-                        del self.counter[self.item['job_id']]
-                        
-                        #self.update_bw(prev_bid=p_bid, deallocate=True)
-                            
-                        ret_val["id"] = self.id
-                        ret_val["bids"] = copy.deepcopy(self.bids)
-                        ret_val["counter"] = copy.deepcopy(self.counter)
-                        ret_val["updated_cpu"] = self.updated_cpu
-                        ret_val["updated_gpu"] = self.updated_gpu
-                        ret_val["updated_bw"] = self.updated_bw
-                        ret_val["gpu_type"] = self.gpu_type.name
-                    else:   
-                        # prev_bid = None
-                        first_msg = False
-                        
-                        # if self.item['job_id'] in self.bids:
-                        #     prev_bid = copy.deepcopy(self.bids[self.item['job_id']]["auction_id"])
-                        
-                        if self.item['job_id'] not in self.counter:
-                            self.init_null()
-                            first_msg = True
-                            self.counter[self.item['job_id']] = 0
-                        self.counter[self.item['job_id']] += 1                               
-                            
-                        if self.enable_logging:
-                            self.print_node_state('IF1 q:' + str(self.q[self.id].qsize()))
-
-                        success = self.update_bid()
-                    
-                        need_rebroadcast = need_rebroadcast or success
-
-                        self.bids[self.item['job_id']]['start_time'] = 0                            
-                        self.bids[self.item['job_id']]['count'] += 1
-                        
-                        #self.update_bw(prev_bid)
-                        
-                if need_rebroadcast:
-                    self.forward_to_neighbohors()
-                elif first_msg:
-                    self.forward_to_neighbohors(first_msg=True)
+                self.process_messages(items, ret_val)
                                         
             except Empty:
                 # the exception is raised if the timeout in the queue.get() expires.
@@ -1215,13 +1391,8 @@ class node:
                     
                     self.already_finished = True   
                     
-                    ret_val["id"] = self.id
-                    ret_val["bids"] = copy.deepcopy(self.bids)
-                    ret_val["counter"] = copy.deepcopy(self.counter)
-                    ret_val["updated_cpu"] = self.updated_cpu
-                    ret_val["updated_gpu"] = self.updated_gpu
-                    ret_val["updated_bw"] = self.updated_bw
-                    ret_val["gpu_type"] = self.gpu_type.name
+                    self.report_idle()
+                    self.publish_state(ret_val)
                         
                     # for j_key in self.resource_remind:
                     #     for id in self.resource_remind[j_key]["idx"]:
@@ -1246,7 +1417,7 @@ class node:
         _items = []
         while True:
             try:
-                it = self.q[self.id].get(timeout=timeout)
+                it = self.transport.receive(self.id, timeout=timeout)
                 self.already_finished = False
                 if first:
                     first = False
@@ -1261,8 +1432,12 @@ class node:
                     raise Empty
                         
                 for i in _items:
-                    self.q[self.id].put(i)               
+                    self.transport.send(self.id, i)               
                 break  
+        
+        if self.stats is not None:
+            # messages still waiting in the mailbox, including the extracted ones
+            self.stats.observe("mailbox_depth", self.transport.qsize(self.id) + len(items))
              
         return items           
 
@@ -2,7 +2,7 @@ import random
 import math
 
 class NodePerformance:
-    def __init__(self, num_cpu_cores, num_gpu_compute_units, seed=0):
+    def __init__(self, num_cpu_cores, num_gpu_compute_units, seed=0, rng=None):
         self.cpu_power_model = None
         self.gpu_power_model = None
         self.cpu_performance_model = None
@@ -12,17 +12,21 @@ class NodePerformance:
         self.cpu_core_physical = round(num_cpu_cores/2)
         self.gpu_core = round(num_gpu_compute_units)
         
-        random.seed(seed)
+        # local generator (same draws of random.seed(seed)), unless a numpy generator is provided
+        if rng is None:
+            randint = random.Random(seed).randint
+        else:
+            randint = lambda a, b: int(rng.integers(a, b, endpoint=True))
                   
-        self.idle_cpu_consumption = random.randint(20, 70)
-        self.idle_cpu_performance = random.randint(20, 70)
-        self.max_cpu_consumption = random.randint(4*self.cpu_core_physical+self.idle_cpu_consumption, 300) # we assume a max CPU TDP of 300W
-        self.max_cpu_performance = random.randint(7*self.cpu_core_physical+self.idle_cpu_performance, 14*self.cpu_core_physical+self.idle_cpu_performance) # we assume a max CPU performance of 1200 GFLOPS (see https://www.cpubenchmark.net/cpu_list.php) 
+        self.idle_cpu_consumption = randint(20, 70)
+        self.idle_cpu_performance = randint(20, 70)
+        self.max_cpu_consumption = randint(4*self.cpu_core_physical+self.idle_cpu_consumption, 300) # we assume a max CPU TDP of 300W
+        self.max_cpu_performance = randint(7*self.cpu_core_physical+self.idle_cpu_performance, 14*self.cpu_core_physical+self.idle_cpu_performance) # we assume a max CPU performance of 1200 GFLOPS (see https://www.cpubenchmark.net/cpu_list.php) 
         
-        self.idle_gpu_consumption = random.randint(20, 70)
-        self.idle_gpu_performance = random.randint(20, 70)
-        self.max_gpu_consumption = random.randint(3*self.gpu_core+self.idle_gpu_consumption, 200)
-        self.max_gpu_performance = random.randint(round(1.5*self.gpu_core)+self.idle_gpu_performance, 1200)
+        self.idle_gpu_consumption = randint(20, 70)
+        self.idle_gpu_performance = randint(20, 70)
+        self.max_gpu_consumption = randint(3*self.gpu_core+self.idle_gpu_consumption, 200)
+        self.max_gpu_performance = randint(round(1.5*self.gpu_core)+self.idle_gpu_performance, 1200)
         
         self.set_default_power_and_performance_models()
 
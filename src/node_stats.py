@@ -0,0 +1,91 @@
+"""
+Counters and histograms of the protocol activity of each node (messages, bytes, mailbox depth, bidding time)
+"""
+
+import json
+
+import numpy as np
+
+COUNTERS = ["messages_in", "messages_out", "bytes_out", "forwards", "deconflictions", "rebroadcasts", "bids"]
+
+# time spent by the node in each step of the auction (ns)
+TIMERS = ["bid", "deconfliction"]
+
+# distributions kept as histograms with power of two buckets: bucket k counts the values in [2^(k-1), 2^k)
+HISTOGRAMS = ["mailbox_depth", "message_bytes", "bid_ns", "deconfliction_ns"]
+HISTOGRAM_BUCKETS = 48
+
+
+class NodeStats:
+    """
+    Protocol counters of a node, updated by the node while it processes its messages. Only integers are
+    stored, so the state published to the simulator stays small (see `to_dict`).
+    """
+
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.time_ns = dict.fromkeys(TIMERS, 0)
+        self.histograms = {h: [0] * HISTOGRAM_BUCKETS for h in HISTOGRAMS}
+
+    def observe(self, histogram, value):
+        self.histograms[histogram][min(int(value).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def add_time(self, timer, ns):
+        self.time_ns[timer] += ns
+        self.observe(timer + "_ns", ns)
+
+    def to_dict(self):
+        return {
+            "counters": dict(self.counters),
+            "time_ns": dict(self.time_ns),
+            "histograms": {h: list(v) for h, v in self.histograms.items()},
+        }
+
+
+def histogram_quantile(histogram, q):
+    """
+    Returns the upper bound of the bucket holding the q-quantile of a histogram (None if it is empty).
+    """
+    cumulative = np.cumsum(histogram)
+    if len(cumulative) == 0 or cumulative[-1] == 0:
+        return None
+    k = int(np.searchsorted(cumulative, q * cumulative[-1], side="left"))
+    return 0 if k == 0 else 2 ** k - 1
+
+
+def aggregate_node_stats(stats, top=5):
+    """
+    Aggregates the stats published by the nodes (node id -> `NodeStats.to_dict()`): the totals, the
+    merged histograms, a row for each node and the ids of the busiest nodes for each counter.
+    """
+    ids = sorted(stats)
+    counters = np.array([[stats[i]["counters"][c] for c in COUNTERS] for i in ids], dtype=np.int64).reshape(len(ids), len(COUNTERS))
+    time_ns = np.array([[stats[i]["time_ns"][t] for t in TIMERS] for i in ids], dtype=np.int64).reshape(len(ids), len(TIMERS))
+    histograms = {h: np.array([stats[i]["histograms"][h] for i in ids], dtype=np.int64).reshape(len(ids), HISTOGRAM_BUCKETS) for h in HISTOGRAMS}
+
+    nodes = []
+    for k, i in enumerate(ids):
+        row = {"id": i}
+        row.update({c: int(counters[k, j]) for j, c in enumerate(COUNTERS)})
+        row.update({t + "_ns": int(time_ns[k, j]) for j, t in enumerate(TIMERS)})
+        for h in HISTOGRAMS:
+            row[h + "_p50"] = histogram_quantile(histograms[h][k], 0.5)
+            row[h + "_p99"] = histogram_quantile(histograms[h][k], 0.99)
+        nodes.append(row)
+
+    merged = {h: v.sum(axis=0) for h, v in histograms.items()}
+    return {
+        "n_nodes": len(ids),
+        "total": {**{c: int(v) for c, v in zip(COUNTERS, counters.sum(axis=0))}, **{t + "_ns": int(v) for t, v in zip(TIMERS, time_ns.sum(axis=0))}},
+        "histograms": {h: {"buckets": v.tolist(), "p50": histogram_quantile(v, 0.5), "p99": histogram_quantile(v, 0.99)} for h, v in merged.items()},
+        "hot_nodes": {c: [ids[k] for k in np.argsort(-counters[:, j], kind="stable")[:top]] for j, c in enumerate(COUNTERS)},
+        "nodes": nodes,
+    }
+
+
+def write_node_stats(stats, filename):
+    """
+    Writes the aggregated stats of the nodes (see `aggregate_node_stats`) to a JSON file.
+    """
+    with open(filename, "w") as f:
+        json.dump(aggregate_node_stats(stats), f, indent=2)
@@ -2,6 +2,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import os
 
+from Plebiscito.src.metrics import read_node_metrics
+
 def generate_plot_folder(dirname):
     # check if the plot directory exists, if not create it
     if not os.path.exists(dirname):
@@ -18,7 +20,7 @@ def plot_node_resource_usage_box(filename, res_type, n_nodes, dir_name):
         dir_name (str): The name of the directory to save the plot file in.
     """
     # plot node resource usage using data from filename
-    df = pd.read_csv(filename + ".csv")
+    df = read_node_metrics(filename)
     
     # select only the columns matching the pattern node_*_updated_gpu
     df2 = df.filter(regex=("node.*"+res_type))
@@ -55,7 +57,7 @@ def plot_node_resource_usage(filename, res_type, n_nodes, dir_name):
         dir_name (str): The name of the directory to save the plot file in.
     """
     # plot node resource usage using data from filename
-    df = pd.read_csv(filename + ".csv")
+    df = read_node_metrics(filename)
     
     # select only the columns matching the pattern node_*_updated_gpu
     df2 = df.filter(regex=("node.*"+res_type))
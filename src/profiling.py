@@ -0,0 +1,118 @@
+"""
+Profiling of the processes (and threads) of a simulation, merged into a single report
+"""
+
+import cProfile
+import glob
+import os
+import pstats
+import shutil
+
+# the stacks whose time is below this share of the total time are not expanded in the collapsed stacks
+MIN_STACK_SHARE = 1e-5
+MAX_STACK_DEPTH = 64
+
+
+def profile_directory(prefix):
+    return prefix + "_profile"
+
+
+def create_profile_directory(prefix):
+    directory = profile_directory(prefix)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    return directory
+
+
+def run_profiled(profile_file, target, *args, **kwargs):
+    """
+    Runs `target(*args, **kwargs)` under cProfile and writes its stats to `profile_file`. Used as the
+    target of the processes (or threads) hosting the nodes.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # only one profiler can be active in a process with some versions of Python (e.g., threads of the same process)
+        print(f"Profiler already active, {os.path.basename(profile_file)} is not profiled", flush=True)
+        return target(*args, **kwargs)
+
+    try:
+        return target(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        # built-in function
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats):
+    """
+    Returns the collapsed stacks ("root;caller;callee" -> time in us) of the profiled functions, the input
+    of flame graph tools. cProfile only records the caller/callee pairs, so the time of a function is split
+    among the stacks reaching it in proportion to the time of the calls from each caller.
+    """
+    entries = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = {}
+    min_time = stats.total_tt * MIN_STACK_SHARE
+
+    def visit(func, path, weight):
+        _, _, tt, ct, _ = entries[func]
+        path = path + [_label(func)]
+        self_time = tt * weight
+        if self_time >= min_time:
+            key = ";".join(path)
+            stacks[key] = stacks.get(key, 0) + self_time
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(func, []):
+            callee_time = entries[callee][3]
+            if callee_time <= 0 or _label(callee) in path:
+                continue
+            w = weight * edge_time / callee_time
+            if w * callee_time >= min_time:
+                visit(callee, path, w)
+
+    # the roots are the functions called by no profiled function
+    for func, (_, _, _, _, callers) in entries.items():
+        if not any(c in entries for c in callers):
+            visit(func, [], 1.0)
+
+    return {k: int(round(v * 1e6)) for k, v in stacks.items() if round(v * 1e6) > 0}
+
+
+def merge_profiles(directory, prefix, n_functions=60):
+    """
+    Merges the stats of all the profiled processes in `directory`, writing the merged stats
+    (`<prefix>_profile.prof`), a report of the most expensive functions (`<prefix>_profile.txt`) and the
+    collapsed stacks for flame graphs (`<prefix>_profile.collapsed`). Returns the merged stats.
+    """
+    files = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if len(files) == 0:
+        return None
+
+    stats = pstats.Stats(*files)
+    stats.dump_stats(prefix + "_profile.prof")
+
+    with open(prefix + "_profile.txt", "w") as f:
+        f.write(f"Merged profile of {len(files)} processes: {', '.join(os.path.basename(p) for p in files)}\n\n")
+        report = pstats.Stats(*files, stream=f)
+        report.sort_stats("cumulative").print_stats(n_functions)
+        report.sort_stats("tottime").print_stats(n_functions)
+
+    with open(prefix + "_profile.collapsed", "w") as f:
+        for stack, us in sorted(collapsed_stacks(stats).items()):
+            f.write(f"{stack} {us}\n")
+
+    return stats
@@ -0,0 +1,154 @@
+"""
+Cache of the results of the simulations, addressed by the hash of the configuration of the simulator
+"""
+
+from enum import Enum
+import hashlib
+import inspect
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from Plebiscito.src.metrics import metrics_directory
+from Plebiscito.src.simulator import Simulator_Plebiscito, output_prefix
+
+# bump the version to invalidate the cached results (e.g., when the behavior of the simulator changes)
+CACHE_VERSION = 2
+
+# files written by a simulation (suffixes of the output prefix), besides the timeline of the nodes
+OUTPUT_SUFFIXES = ["_allocations.csv", "_jobs_report.csv", "_summary.json"]
+
+# CSV export of the timeline of the nodes, written only with `metrics_csv`
+METRICS_CSV_SUFFIX = ".csv"
+
+# arguments that don't affect the results of a simulation
+IGNORED_ARGUMENTS = ["self", "filename", "debug_level", "enable_logging", "transport", "ring_capacity", "track_consensus", "timing", "node_stats", "profile"]
+
+
+def simulator_arguments(args):
+    """
+    Returns all the arguments of `Simulator_Plebiscito` for a simulation, including the default values
+    of the arguments that are not in `args`.
+    """
+    bound = inspect.signature(Simulator_Plebiscito.__init__).bind_partial(**args)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def simulation_output_prefix(args):
+    """
+    Returns the prefix of the files written by a simulation with the given arguments.
+    """
+    args = simulator_arguments(args)
+    return output_prefix(args["filename"], args["utility"], args["scheduling_algorithm"], args["decrement_factor"], args["split"], args["enable_post_allocation"])
+
+
+def output_suffixes(metrics_csv=True):
+    """
+    Returns the suffixes of the files written by a simulation (the timeline directory excluded).
+    """
+    return OUTPUT_SUFFIXES + [METRICS_CSV_SUFFIX] if metrics_csv else list(OUTPUT_SUFFIXES)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _canonical(value):
+    if isinstance(value, pd.DataFrame):
+        # content of the dataset (values, index and columns)
+        h = hashlib.sha256()
+        h.update(json.dumps([str(c) for c in value.columns]).encode())
+        h.update(pd.util.hash_pandas_object(value.astype(str), index=True).values.tobytes())
+        return "dataframe:" + h.hexdigest()
+    if isinstance(value, Enum):
+        return type(value).__name__ + "." + value.name
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+class ResultCache:
+    """
+    Stores the output files of the simulations in `directory`, one subdirectory for each configuration.
+
+    Args:
+        directory (str, optional): The directory of the cache.
+        trace_file (str, optional): The trace used to build the datasets. Its digest is part of every key,
+            so the results are invalidated when the trace changes.
+    """
+
+    def __init__(self, directory=".plebiscito_cache", trace_file=None):
+        self.directory = directory
+        self.trace_digest = file_digest(trace_file) if trace_file is not None else None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, args):
+        """
+        Returns the key of a simulation, i.e., the hash of its arguments (see `Simulator_Plebiscito`).
+        """
+        args = simulator_arguments(args)
+        # same infrastructure (and nodes receiving the jobs) as the ones drawn with the seed of the simulation
+        for seed in ("infrastructure_seed", "dispatch_seed"):
+            if args[seed] is None:
+                args[seed] = args["seed"]
+        description = {k: _canonical(v) for k, v in args.items() if k not in IGNORED_ARGUMENTS}
+        description["__version__"] = CACHE_VERSION
+        description["__trace__"] = self.trace_digest
+
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def contains(self, key, metrics_csv=True):
+        entry = os.path.join(self.directory, key)
+        return os.path.isdir(metrics_directory(os.path.join(entry, "result"))) and all(os.path.exists(os.path.join(entry, "result" + s)) for s in output_suffixes(metrics_csv))
+
+    def store(self, key, prefix, metrics_csv=True):
+        """
+        Copies the output files of a simulation (written with the given prefix), including the timeline of
+        the nodes (`<prefix>_metrics/`), in the cache. The CSV export of the timeline is required only if
+        the simulation wrote it (`metrics_csv`).
+        """
+        entry = os.path.join(self.directory, key)
+        tmp = entry + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        suffixes = output_suffixes(metrics_csv)
+        if not os.path.isdir(metrics_directory(prefix)) or not all(os.path.exists(prefix + s) for s in suffixes):
+            # incomplete simulation, nothing to cache
+            shutil.rmtree(tmp)
+            return False
+        for s in suffixes:
+            shutil.copyfile(prefix + s, os.path.join(tmp, "result" + s))
+        shutil.copytree(metrics_directory(prefix), metrics_directory(os.path.join(tmp, "result")))
+
+        # the entry becomes visible only when it is complete
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+        return True
+
+    def restore(self, key, prefix, metrics_csv=True):
+        """
+        Copies the cached output files of a simulation to the given prefix, replacing the timeline of the
+        nodes already there. Returns False if the key is not cached.
+        """
+        if not self.contains(key, metrics_csv):
+            return False
+
+        entry = os.path.join(self.directory, key)
+        for s in output_suffixes(metrics_csv):
+            shutil.copyfile(os.path.join(entry, "result" + s), prefix + s)
+        # the blocks of a previous simulation with the same prefix would be read along with the cached ones
+        shutil.rmtree(metrics_directory(prefix), ignore_errors=True)
+        shutil.copytree(metrics_directory(os.path.join(entry, "result")), metrics_directory(prefix))
+        return True
@@ -0,0 +1,25 @@
+"""
+Independent random streams of the components of the simulator
+"""
+
+import numpy as np
+
+# components drawing random values (the position is part of the key of their streams, only append new ones)
+COMPONENTS = ["gpu_types", "logical_topology", "network_topology", "node_performance", "dispatch", "job_profile", "retry"]
+
+
+def stream(seed, component, *keys) -> np.random.Generator:
+    """
+    Returns the generator of `component` derived from the root `seed`, optionally specialized with some
+    keys (e.g., the id of a node or of a job). It is the generator of the child of `np.random.SeedSequence(seed)`
+    reached with `spawn` following the path (component, *keys), computed directly from its spawn key:
+    any process gets the same stream without generating (or receiving) the other ones, and drawing from
+    a stream never changes the values of the others.
+
+    Args:
+        seed (int): The root seed of the simulation.
+        component (str): The component using the stream (one of `COMPONENTS`).
+        keys (int): The keys of the stream within the component.
+    """
+    spawn_key = (COMPONENTS.index(component),) + tuple(int(k) for k in keys)
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
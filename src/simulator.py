@@ -1,8 +1,12 @@
 import copy
+import cProfile
 import datetime
 from multiprocessing.managers import SyncManager
-from multiprocessing import Process, Event, Manager, JoinableQueue
+from multiprocessing import Process, Event, Manager, Queue
+import queue
+import threading
 import time
+import numpy as np
 import pandas as pd
 pd.set_option('display.max_rows', 500)
 import signal
@@ -14,12 +18,22 @@ from Plebiscito.src.network_topology import NetworkTopology
 from Plebiscito.src.topology import topo as LogicalTopology
 from Plebiscito.src.network_topology import  TopologyType
 from Plebiscito.src.utils import generate_gpu_types, GPUSupport
-from Plebiscito.src.node import node
-from Plebiscito.src.config import Utility, DebugLevel, SchedulingAlgorithm, ApplicationGraphType
+from Plebiscito.src.node import NodeSpec
+from Plebiscito.src.config import Utility, DebugLevel, SchedulingAlgorithm, ApplicationGraphType, TransportType, SamplingPolicy
+from Plebiscito.src.transport import create_transport, ShardedTransport, DEFAULT_RING_CAPACITY
+from Plebiscito.src.worker import run_node, run_worker
+from Plebiscito.src.job_source import as_job_source
+from Plebiscito.src.rng import stream
+from Plebiscito.src.consensus import ConsensusTracker
+from Plebiscito.src.metrics import MetricsSink
+from Plebiscito.src.aggregator import OnlineAggregator
+from Plebiscito.src.timing import PhaseTimer
+from Plebiscito.src.node_stats import write_node_stats
+from Plebiscito.src.profiling import run_profiled, create_profile_directory, merge_profiles
 import Plebiscito.src.jobs_handler as job
 import Plebiscito.src.utils as utils
 import Plebiscito.src.plot as plot
-from Plebiscito.src.jobs_handler import message_data
+from Plebiscito.src.jobs_handler import unallocate_data
 
 class MyManager(SyncManager): pass
 
@@ -27,6 +41,9 @@ main_pid = ""
 nodes_thread = []
 TRACE = 5    
 
+# time waited for the reports of the consensus tracker before checking again if the nodes are idle
+CONSENSUS_POLL_TIMEOUT = 0.005
+
 def sigterm_handler(signum, frame):
     """Handles the SIGTERM signal by performing cleanup actions and gracefully terminating all processes."""
     # Perform cleanup actions here
@@ -35,29 +52,39 @@ def sigterm_handler(signum, frame):
     if os.getpid() == main_pid:
         print("SIGINT received. Performing cleanup...")
         for t in nodes_thread:
-            t.terminate()
-            t.join()    
+            # nodes hosted in threads (TransportType.IN_PROCESS) cannot be terminated
+            if isinstance(t, Process):
+                t.terminate()
+                t.join()    
             
         print("All processes have been gracefully teminated.")
         sys.exit(0)  # Exit gracefully    
 
+def output_prefix(filename, utility, scheduling_algorithm, decrement_factor, split, enable_post_allocation):
+    """
+    Returns the prefix of the files written by a simulation with the given configuration.
+    """
+    prefix = filename + "_" + utility.name + "_" + scheduling_algorithm.name + "_" + str(decrement_factor)
+    if split:
+        prefix = prefix + "_split"
+    else:
+        prefix = prefix + "_nosplit"
+        
+    if enable_post_allocation:
+        prefix = prefix + "_rebid"
+    else:
+        prefix = prefix + "_norebid"
+    return prefix
+
 class Simulator_Plebiscito:
-    def __init__(self, filename: str, n_nodes: int, n_jobs: int, dataset = pd.DataFrame(), alpha = 1, utility = Utility.LGF, debug_level = DebugLevel.INFO, scheduling_algorithm = SchedulingAlgorithm.FIFO, decrement_factor = 1, split = True, app_type = ApplicationGraphType.LINEAR, enable_logging = False, use_net_topology = False, progress_flag = False, n_client = 0, node_bw = 0, failures = {}, logical_topology = "ring_graph", probability = 0, enable_post_allocation = False) -> None:   
+    def __init__(self, filename: str, n_nodes: int, n_jobs: int, dataset = pd.DataFrame(), alpha = 1, utility = Utility.LGF, debug_level = DebugLevel.INFO, scheduling_algorithm = SchedulingAlgorithm.FIFO, decrement_factor = 1, split = True, app_type = ApplicationGraphType.LINEAR, enable_logging = False, use_net_topology = False, progress_flag = False, n_client = 0, node_bw = 0, failures = {}, logical_topology = "ring_graph", probability = 0, enable_post_allocation = False, transport = TransportType.QUEUE, ring_capacity = DEFAULT_RING_CAPACITY, shard_nodes = False, n_workers = None, seed = None, infrastructure_seed = None, dispatch_seed = None, track_consensus = False, metrics_csv = True, sampling = SamplingPolicy.EVERY_TICK, sampling_interval = 1, timing = False, node_stats = False, profile = False) -> None:   
         if utility == Utility.FGD and split:
             print(f"FGD utility and split are not supported simultaneously. Exiting...")
             os._exit(-1)
+        if shard_nodes and transport == TransportType.IN_PROCESS:
+            # the mailboxes of the in-process transport are local to each worker process, so the messages would never reach the other workers
+            raise ValueError("The nodes can't be sharded among worker processes with the in-process transport")
         
-        self.filename = filename + "_" + utility.name + "_" + scheduling_algorithm.name + "_" + str(decrement_factor)
-        if split:
-            self.filename = self.filename + "_split"
-        else:
-            self.filename = self.filename + "_nosplit"
-            
-        if enable_post_allocation:
-            self.filename = self.filename + "_rebid"
-        else:
-            self.filename = self.filename + "_norebid"
-            
         self.n_nodes = n_nodes
         self.node_bw = node_bw
         self.n_jobs = n_jobs
@@ -69,36 +96,121 @@ class Simulator_Plebiscito:
         self.debug_level = debug_level
         self.counter = 0
         self.alpha = alpha
+        self.utility = utility
         self.scheduling_algorithm = scheduling_algorithm
         self.decrement_factor = decrement_factor
         self.split = split
         self.app_type = app_type
         self.failures = failures
         self.enable_post_allocation = enable_post_allocation
+        # with a seed, every hosting mode (serial, in-process or sharded nodes) draws the same random values, but tied bids
+        # are still resolved by the order in which the nodes process the messages, which depends on the hosting mode
+        self.seed = seed
+        # the infrastructure (GPU types, topologies and nodes) is built once, with its own seed if given (e.g., to draw
+        # new jobs on the same infrastructure), otherwise with the seed of the simulation
+        self.infrastructure_seed = infrastructure_seed if infrastructure_seed is not None else seed
+        # the nodes receiving the jobs are drawn with their own seed if given (e.g., to retry a run), otherwise with the seed of the simulation
+        self.dispatch_seed = dispatch_seed
+        self.transport_type = transport
+        self.ring_capacity = ring_capacity
+        self.transport = None
+        self.shard_nodes = shard_nodes
+        # by default, one worker for each core (when the nodes are sharded)
+        self.n_workers = min(n_workers or os.cpu_count() or 1, n_nodes)
+        # set by start() when the node processes are running
+        self.pool_started = False
+        # the nodes report the changes of their winner vectors to a consensus tracker (see consensus.ConsensusTracker)
+        self.track_consensus = track_consensus
+        self.consensus = None
+        self.consensus_reports = None
+        # resources of the nodes at each time instant, created by run() (exported to <prefix>.csv if metrics_csv)
+        self.metrics = None
+        self.metrics_csv = metrics_csv
+        # time instants at which the resources are saved (see metrics.MetricsSink)
+        self.sampling = sampling
+        self.sampling_interval = sampling_interval
+        # running statistics of the nodes and of the jobs, created by run() (written to <prefix>_summary.json)
+        self.aggregator = None
+        # time spent in each phase of the time instants of run() (written to <prefix>_phases.csv/json if timing)
+        self.timer = PhaseTimer()
+        self.timing = timing
+        # the nodes record the counters of their protocol activity (written to <prefix>_node_stats.json)
+        self.node_stats = node_stats
+        # each process (or thread) hosting the nodes runs under cProfile, from start() to stop() (see profiling.merge_profiles)
+        self.profile = profile
+        self.profiler = None
+        
+        self.set_filename(filename)
         
         self.job_count = {}
         
         # create a suitable network topology for multiprocessing 
+        # the managers are started only if the topologies must be shared with the nodes 
         MyManager.register('NetworkTopology', NetworkTopology)
         MyManager.register('LogicalTopology', LogicalTopology)
-        self.physycal_network_manager = MyManager()
-        self.physycal_network_manager.start()
-        self.logical_network_manager = MyManager()
-        self.logical_network_manager.start()
+        self.physycal_network_manager = None
+        self.logical_network_manager = None
+        self.network_t = None
         
         #Build Topolgy
-        self.t = self.logical_network_manager.LogicalTopology(func_name=logical_topology, max_bandwidth=node_bw, min_bandwidth=node_bw/2,num_clients=n_client, num_edges=n_nodes, probability=probability)
-        self.network_t = self.physycal_network_manager.NetworkTopology(n_nodes, node_bw, node_bw, group_number=4, seed=4, topology_type=TopologyType.FAT_TREE)
+        if use_net_topology:
+            self.physycal_network_manager = MyManager()
+            self.physycal_network_manager.start()
+            self.network_t = self.physycal_network_manager.NetworkTopology(n_nodes, node_bw, node_bw, group_number=4, seed=4, topology_type=TopologyType.FAT_TREE, rng=self.stream("network_topology"))
+        
+        if failures:
+            # nodes are detached during the simulation, the nodes must see the changes
+            self.logical_network_manager = MyManager()
+            self.logical_network_manager.start()
+            self.t = self.logical_network_manager.LogicalTopology(func_name=logical_topology, max_bandwidth=node_bw, min_bandwidth=node_bw/2,num_clients=n_client, num_edges=n_nodes, probability=probability, rng=self.stream("logical_topology"))
+        else:
+            self.t = LogicalTopology(func_name=logical_topology, max_bandwidth=node_bw, min_bandwidth=node_bw/2,num_clients=n_client, num_edges=n_nodes, probability=probability, rng=self.stream("logical_topology"))
+        
+        self.gpu_types = generate_gpu_types(n_nodes, rng=self.stream("gpu_types"))
+        self.node_specs = self.build_node_specs()
         
+        # local copies of the nodes, updated with the results published by the nodes
         self.nodes = []
-        self.gpu_types = generate_gpu_types(n_nodes)
-
         for i in range(n_nodes):
-            self.nodes.append(node(i, self.network_t, self.gpu_types[i], utility, alpha, enable_logging, self.t, n_nodes, progress_flag, use_net_topology=use_net_topology, decrement_factor=decrement_factor))
+            self.nodes.append(self.build_node(i))
             
         # Set up the environment
         self.setup_environment()
         
+    def set_filename(self, filename):
+        self.base_filename = filename
+        self.filename = output_prefix(filename, self.utility, self.scheduling_algorithm, self.decrement_factor, self.split, self.enable_post_allocation)
+        
+    def build_node_specs(self):
+        """
+        Builds the specs used to create the nodes inside the processes hosting them. If the logical
+        topology can't change during the simulation, each spec carries the static list of neighbors
+        of the node, otherwise the handle to the shared topology.
+        """
+        specs = []
+        if self.logical_network_manager is None:
+            adjacency_matrix = np.asarray(self.t.to())[:self.n_nodes]
+        
+        for i in range(self.n_nodes):
+            if self.logical_network_manager is None:
+                topology = [j for j in np.flatnonzero(adjacency_matrix[:, i]).tolist() if j != i]
+            else:
+                topology = self.t
+            specs.append(NodeSpec(i, self.gpu_types[i], self.utility, self.alpha, self.decrement_factor, self.n_nodes, topology, network_topology=self.network_t, enable_logging=self.enable_logging, progress_flag=self.progress_flag, use_net_topology=self.use_net_topology, seed=self.infrastructure_seed, stats=self.node_stats))
+        return specs
+        
+    def stream(self, component):
+        """
+        Returns the random stream of a component of the infrastructure, or None (i.e., the legacy
+        fixed seeds) if the simulation has no seed.
+        """
+        if self.infrastructure_seed is None:
+            return None
+        return stream(self.infrastructure_seed, component)
+        
+    def build_node(self, i):
+        return self.node_specs[i].build()
+        
     def get_nodes(self):
         return self.nodes
     
@@ -123,7 +235,7 @@ class Simulator_Plebiscito:
         logging.debug('Edges number: ' + str(self.n_nodes))
         logging.debug('Requests number: ' + str(self.n_jobs))
         
-    def setup_nodes(self, terminate_processing_events, start_events, use_queue, manager, return_val, queues, progress_bid_events):
+    def setup_nodes(self, terminate_processing_events, start_events, use_queue, manager, return_val, progress_bid_events):
         """
         Sets up the nodes for processing. Generates threads for each node and starts them.
         
@@ -133,41 +245,132 @@ class Simulator_Plebiscito:
         use_queue (list): A list of events to indicate if a queue is being used by a node.
         manager (multiprocessing.Manager): A multiprocessing manager object.
         return_val (list): A list of return values for each node.
-        queues (list): A list of queues for each node.
         progress_bid_events (list): A list of events to indicate progress of bid processing for each node.
         """
         global nodes_thread
         
+        if self.shard_nodes:
+            self.setup_workers(terminate_processing_events, start_events, use_queue, manager, return_val, progress_bid_events)
+            return
+        
+        self.transport = create_transport(self.transport_type, self.n_nodes, ring_capacity=self.ring_capacity)
+        in_process = self.transport_type == TransportType.IN_PROCESS
+        
         for i in range(self.n_nodes):
-            q = JoinableQueue()
             e = Event() 
-            
-            queues.append(q)
             use_queue.append(e)
             
             e.set()
 
         #Generate threads for each node
         for i in range(self.n_nodes):
+            e = Event() 
+            e2 = Event()
+            e3 = Event()
+            return_dict = {} if in_process else manager.dict()
+            
+            # the node is built by the process (or thread) hosting it
+            args = (self.node_specs[i], self.transport, use_queue, e, e2, e3, return_dict, self.consensus_reports)
+            target = run_node
+            if self.profile:
+                target, args = run_profiled, (os.path.join(self.profile_dir, "node_%d.prof" % i), run_node) + args
+            if in_process:
+                p = threading.Thread(target=target, args=args, daemon=True)
+            else:
+                p = Process(target=target, args=args)
+            nodes_thread.append(p)
+            return_val.append(return_dict)
+            terminate_processing_events.append(e)
+            start_events.append(e2)
+            e3.clear()
+            progress_bid_events.append(e3)
+            
+            p.start()
+            
+        for e in start_events:
+            e.wait()
+    
+    def setup_workers(self, terminate_processing_events, start_events, use_queue, manager, return_val, progress_bid_events):
+        """
+        Sets up the workers hosting the nodes when the nodes are sharded (M:N hosting). Each worker hosts
+        a contiguous block of nodes and the messages between nodes of different workers go through the
+        selected transport. The lists of events are filled with one event for each worker, while `return_val`
+        receives one shared dictionary for each worker, holding the state of its nodes.
+        """
+        global nodes_thread
+        
+        inner = create_transport(self.transport_type, self.n_workers, ring_capacity=self.ring_capacity)
+        self.transport = ShardedTransport(inner, self.n_nodes, self.n_workers)
+        
+        for w in range(self.n_workers):
+            e = Event()
+            use_queue.append(e)
+            
+            e.set()
+            
+        for w in range(self.n_workers):
             e = Event() 
             e2 = Event()
             e3 = Event()
             return_dict = manager.dict()
             
-            self.nodes[i].set_queues(queues, use_queue)
+            shard = [self.node_specs[i] for i in self.transport.hosted_by(w)]
             
-            p = Process(target=self.nodes[i].work, args=(e, e2, e3, return_dict))
+            args = (w, shard, self.transport, e, e2, e3, use_queue, return_dict)
+            if self.profile:
+                p = Process(target=run_profiled, args=(os.path.join(self.profile_dir, "worker_%d.prof" % w), run_worker) + args, kwargs={"consensus_reports": self.consensus_reports})
+            else:
+                p = Process(target=run_worker, args=args, kwargs={"consensus_reports": self.consensus_reports})
             nodes_thread.append(p)
             return_val.append(return_dict)
             terminate_processing_events.append(e)
             start_events.append(e2)
-            e3.clear()
             progress_bid_events.append(e3)
             
             p.start()
             
         for e in start_events:
             e.wait()
+            
+    def read_node_results(self, return_val):
+        """
+        Returns a snapshot of the state published by each node whose state version changed since the
+        last read. Only the versions are read for the other nodes.
+        """
+        results = []
+        for v in return_val:
+            if self.shard_nodes:
+                versions = v["versions"]
+                changed = [i for i in versions if self.node_versions.get(i) != versions[i]]
+                if len(changed) == len(versions):
+                    # a single round trip for the whole shard
+                    snapshot = v.copy()
+                    results.extend(snapshot[i] for i in changed)
+                else:
+                    results.extend(v[i] for i in changed)
+            elif self.node_versions.get(v["id"]) != v["version"]:
+                results.append(v.copy())
+                
+        for snapshot in results:
+            self.node_versions[snapshot["id"]] = snapshot["version"]
+        return results
+        
+    def refresh_node_results(self, return_val):
+        """
+        Updates the local copies of the nodes with the state published by the nodes that changed since
+        the last refresh (see `read_node_results`).
+        """
+        for v in self.read_node_results(return_val):
+            nodeId = v["id"]
+            self.node_results[nodeId] = v
+            self.nodes[nodeId].updated_cpu = v["updated_cpu"]
+            self.nodes[nodeId].updated_gpu = v["updated_gpu"]
+            self.nodes[nodeId].updated_bw = v["updated_bw"]
+            self.nodes[nodeId].gpu_type = v["gpu_type"]
+            
+        if self.consensus is not None:
+            # apply all the changes of the winner vectors sent by the nodes before publishing their state
+            self.consensus.drain(self.consensus_reports, {i: v["reports_sent"] for i, v in self.node_results.items()})
     
     def collect_node_results(self, return_val, jobs: pd.DataFrame, exec_time, time_instant, save_on_file):
         """
@@ -183,23 +386,43 @@ class Simulator_Plebiscito:
         - float representing the utility value calculated based on the updated data structures
         """
         
+        start = self.timer.start()
+        winners = None
         if time_instant != 0:
+            if len(jobs) == 0 and not save_on_file:
+                # nothing to compute, the nodes that changed are read by the next collection
+                self.timer.stop("collection", start)
+                return [], []
+            
+            self.refresh_node_results(return_val)
+            results = list(self.node_results.values())
+            
+            # winners of the layers of each job according to each node (see utils.winner_matrix)
+            winners = {}
             for _, j in jobs.iterrows():
                 self.job_count[j["job_id"]] = 0
-                for v in return_val: 
+                for v in results: 
                     nodeId = v["id"]
                 
                     self.nodes[nodeId].bids[j["job_id"]] = v["bids"][j["job_id"]]                        
                     self.job_count[j["job_id"]] += v["counter"][j["job_id"]]
-
-            for v in return_val: 
-                nodeId = v["id"]
-                self.nodes[nodeId].updated_cpu = v["updated_cpu"]
-                self.nodes[nodeId].updated_gpu = v["updated_gpu"]
-                self.nodes[nodeId].updated_bw = v["updated_bw"]
-                self.nodes[nodeId].gpu_type = v["gpu_type"]
+                    
+                if self.consensus is not None:
+                    winners[j["job_id"]] = self.consensus.winner_matrix(j["job_id"])
+                else:
+                    winners[j["job_id"]] = (np.array([v["bids"][j["job_id"]]["auction_id"] for v in results], dtype=np.float64), [v["id"] for v in results])
+        
+        ret = utils.calculate_utility(self.nodes, self.n_nodes, self.counter, exec_time, self.n_jobs, jobs, self.alpha, time_instant, self.use_net_topology, self.filename, self.network_t, self.gpu_types, save_on_file, winners=winners, metrics=self.metrics)
         
-        return utils.calculate_utility(self.nodes, self.n_nodes, self.counter, exec_time, self.n_jobs, jobs, self.alpha, time_instant, self.use_net_topology, self.filename, self.network_t, self.gpu_types, save_on_file)
+        if save_on_file and self.metrics is not None:
+            t = self.timer.start()
+            self.metrics.record(time_instant, self.nodes)
+            # every time instant is aggregated, regardless of the sampling of the metrics
+            self.aggregator.observe_nodes(self.nodes)
+            self.timer.stop("metrics", t)
+        
+        self.timer.stop("collection", start)
+        return ret
     
     def terminate_node_processing(self, events):
         global nodes_thread
@@ -210,12 +433,127 @@ class Simulator_Plebiscito:
         # Block until all tasks are done.
         for nt in nodes_thread:
             nt.join()
+        nodes_thread.clear()
             
+        self.transport.close()
+        
+    def start(self):
+        """
+        Starts the processes hosting the nodes. The processes are kept alive across the calls to `run`
+        until `stop` is called, so that several simulations can be executed on the same infrastructure
+        (see `reset`) without paying the startup cost of the nodes every time.
+        """
+        self.terminate_processing_events = []
+        self.start_events = []
+        self.progress_bid_events = []
+        self.use_queue = []
+        self.manager = Manager()
+        self.return_val = []
+        # last state read from each node and its version (see read_node_results)
+        self.node_results = {}
+        self.node_versions = {}
+        if self.track_consensus:
+            self.consensus = ConsensusTracker(self.n_nodes)
+            self.consensus_reports = queue.Queue() if self.transport_type == TransportType.IN_PROCESS else Queue()
+        if self.profile:
+            # the profiles are written with the prefix of the first simulation executed by the pool
+            self.profile_prefix = self.filename
+            self.profile_dir = create_profile_directory(self.profile_prefix)
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.setup_nodes(self.terminate_processing_events, self.start_events, self.use_queue, self.manager, self.return_val, self.progress_bid_events)
+        self.pool_started = True
+        
+    def stop(self):
+        """
+        Terminates the processes hosting the nodes started by `start`.
+        """
+        self.terminate_node_processing(self.terminate_processing_events)
+        self.manager.shutdown()
+        self.pool_started = False
+        
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(self.profile_dir, "simulator.prof"))
+            self.profiler = None
+            merge_profiles(self.profile_dir, self.profile_prefix)
+        
+    def reset(self, filename=None, dataset=None, n_jobs=None, alpha=None, utility=None, scheduling_algorithm=None, decrement_factor=None, split=None, app_type=None, enable_post_allocation=None, seed=None):
+        """
+        Prepares the simulator for a new simulation on the same infrastructure (nodes, GPU types and topology).
+        The arguments left to None keep their current value, except the seed (None for a simulation without
+        seed). If the node processes are running, the nodes release all their resources and forget their bids,
+        otherwise the new configuration is used by the processes started by the next `run`. The seed only
+        changes the random streams of the jobs (see `rng.stream`), the infrastructure keeps the one it was built with.
+        """
+        if self.failures:
+            raise ValueError("Simulations with failures can't be reset (the logical topology is modified by the failures)")
+        
+        if dataset is not None:
+            self.dataset = dataset
+        if n_jobs is not None:
+            self.n_jobs = n_jobs
+        if alpha is not None:
+            self.alpha = alpha
+        if utility is not None:
+            self.utility = utility
+        if scheduling_algorithm is not None:
+            self.scheduling_algorithm = scheduling_algorithm
+        if decrement_factor is not None:
+            self.decrement_factor = decrement_factor
+        if split is not None:
+            self.split = split
+        if app_type is not None:
+            self.app_type = app_type
+        if enable_post_allocation is not None:
+            self.enable_post_allocation = enable_post_allocation
+        self.seed = seed
+            
+        if self.utility == Utility.FGD and self.split:
+            raise ValueError("FGD utility and split are not supported simultaneously")
+            
+        self.set_filename(filename if filename is not None else self.base_filename)
+        self.counter = 0
+        self.job_count = {}
+        
+        for spec in self.node_specs:
+            spec.utility = self.utility
+            spec.alpha = self.alpha
+            spec.decrement_factor = self.decrement_factor
+        
+        self.nodes = []
+        for i in range(self.n_nodes):
+            self.nodes.append(self.build_node(i))
+            
+        if self.pool_started:
+            self.transport.broadcast({
+                "job_id": None,
+                "reset_state": {
+                    "utility": self.utility,
+                    "alpha": self.alpha,
+                    "decrement_factor": self.decrement_factor,
+                },
+            })
+            
+            for e in self.progress_bid_events:
+                e.wait()
+                e.clear()
+
+            if self.consensus is not None:
+                # the reports sent before the reset refer to the previous simulation
+                results = self.read_node_results(self.return_val)
+                self.consensus.drain(self.consensus_reports, {v["id"]: v["reports_sent"] for v in results})
+                self.consensus.clear()
+
+            # the local copies of the nodes have been rebuilt, the next collection reads all the nodes
+            self.node_results = {}
+            self.node_versions = {}
+
     def clear_screen(self):
         # Function to clear the terminal screen
         os.system('cls' if os.name == 'nt' else 'clear')
 
-    def print_simulation_values(self, time_instant, processed_jobs, queued_jobs: pd.DataFrame, running_jobs, batch_size):
+    def print_simulation_values(self, time_instant, processed_jobs, queued_jobs: pd.DataFrame, running_jobs, batch_size, total_jobs=None):
         print()
         print("Infrastructure info")
         print("Last refresh: " + str(datetime.datetime.now()))
@@ -230,7 +568,7 @@ class Simulator_Plebiscito:
         
         print()
         print("Performing simulation at time " + str(time_instant) + ".")
-        print(f"# Jobs assigned: \t\t{processed_jobs}/{len(self.dataset)}")
+        print(f"# Jobs assigned: \t\t{processed_jobs}/{total_jobs if total_jobs is not None else '?'}")
         print(f"# Jobs currently in queue: \t{len(queued_jobs)}")
         print(f"# Jobs currently running: \t{running_jobs}")
         print(f"# Current batch size: \t\t{batch_size}")
@@ -256,31 +594,69 @@ class Simulator_Plebiscito:
         print()
 
             
-    def print_simulation_progress(self, time_instant, job_processed, queued_jobs, running_jobs, batch_size):
+    def print_simulation_progress(self, time_instant, job_processed, queued_jobs, running_jobs, batch_size, total_jobs=None):
+        start = self.timer.start()
         self.clear_screen()
-        self.print_simulation_values(time_instant, job_processed, queued_jobs, running_jobs, batch_size) 
+        self.print_simulation_values(time_instant, job_processed, queued_jobs, running_jobs, batch_size, total_jobs) 
+        self.timer.stop("progress", start)
+        
+    def wait_nodes(self, progress_bid_events):
+        """
+        Waits until all the nodes processed the messages sent to them (see `progress_bid`).
+        """
+        start = self.timer.start()
+        for e in progress_bid_events:
+            e.wait()
+            e.clear()
+        self.timer.stop("quiescence", start)
         
-    def deallocate_jobs(self, progress_bid_events, queues, jobs_to_unallocate):
+    def wait_consensus(self, progress_bid_events, jobs):
+        """
+        Waits until the nodes are idle, like `wait_nodes`. If the reports of the nodes say that they are idle
+        (see `consensus.ConsensusTracker.quiescent`) and agree on the winners of all the layers of the jobs
+        (see `consensus.ConsensusTracker.allocation`), the winners are returned without reading the state of
+        the nodes. An agreement seen while the nodes are still processing their messages is not final (e.g., a
+        node may accept a forwarded bid before bidding itself), so it's never committed.
+
+        Returns:
+            dict: The winners of the layers of each job, or None if the nodes didn't agree.
+        """
+        start = self.timer.start()
+        allocations = None
+        while True:
+            if self.consensus.quiescent():
+                settled = {j: self.consensus.allocation(j) for j in jobs["job_id"]}
+                if all(a is not None for a in settled.values()):
+                    allocations = settled
+                    break
+            if all(e.is_set() for e in progress_bid_events):
+                break
+            self.consensus.poll(self.consensus_reports, CONSENSUS_POLL_TIMEOUT)
+        self.timer.stop("quiescence", start)
+        # the nodes set their event right after reporting that they are idle
+        self.wait_nodes(progress_bid_events)
+        return allocations
+
+    def commit_jobs(self, jobs, allocations):
+        """
+        Returns the jobs allocated to the winners agreed by the nodes (same format of the assigned jobs
+        returned by `utils.calculate_utility`), without reading the state of the nodes.
+        """
+        assigned_jobs = []
+        for _, j in jobs.iterrows():
+            allocation = list(allocations[j["job_id"]])
+            utils.set_job_allocation(j, allocation, [self.gpu_types[a].name for a in allocation], self.gpu_types)
+            assigned_jobs.append(j)
+        return assigned_jobs
+
+    def deallocate_jobs(self, progress_bid_events, jobs_to_unallocate):
         if len(jobs_to_unallocate) > 0:
-            for _, j in jobs_to_unallocate.iterrows():
-                data = message_data(
-                            j['job_id'],
-                            j['user'],
-                            j['num_gpu'],
-                            j['num_cpu'],
-                            j['duration'],
-                            j['bw'],
-                            j['gpu_type'],
-                            deallocate=True,
-                            split=self.split,
-                            app_type=self.app_type
-                        )
-                for q in queues:
-                    q.put(data)
-
-            for e in progress_bid_events:
-                e.wait()
-                e.clear()  
+            start = self.timer.start()
+            for job_id in jobs_to_unallocate['job_id']:
+                self.transport.broadcast(unallocate_data(job_id))
+            self.timer.stop("deallocation", start)
+
+            self.wait_nodes(progress_bid_events)
 
             return True
         return False     
@@ -337,25 +713,30 @@ class Simulator_Plebiscito:
         
     def detach_node(self, nodeid):
         self.t.detach_node(nodeid)
+        if self.consensus is not None:
+            self.consensus.detach(nodeid)
 
     def run(self):
-        # Set up nodes and related variables
-        global nodes_thread
-        terminate_processing_events = []
-        start_events = []
-        progress_bid_events = []
-        use_queue = []
-        manager = Manager()
-        return_val = []
-        queues = []
-        self.setup_nodes(terminate_processing_events, start_events, use_queue, manager, return_val, queues, progress_bid_events)
+        # Set up nodes and related variables (unless they have been started by the caller)
+        persistent = self.pool_started
+        if not persistent:
+            self.start()
+        progress_bid_events = self.progress_bid_events
+        return_val = self.return_val
 
         # Initialize job-related variables
+        # the jobs are pulled from the source as the simulated time advances
+        job_source = as_job_source(self.dataset)
         self.job_ids=[]
         jobs = pd.DataFrame()
         running_jobs = pd.DataFrame()
         processed_jobs = pd.DataFrame()
 
+        # only the changes of the resources of the nodes are saved (exported to CSV at the end, if enabled)
+        self.metrics = MetricsSink(self.filename, self.n_nodes, csv=self.metrics_csv, policy=self.sampling, interval=self.sampling_interval)
+        self.aggregator = OnlineAggregator(self.gpu_types)
+        self.timer = PhaseTimer()
+
         # Collect node results
         start_time = time.time()
         self.collect_node_results(return_val, pd.DataFrame(), time.time()-start_time, 0, save_on_file=True)
@@ -370,30 +751,33 @@ class Simulator_Plebiscito:
         prev_running_jobs = pd.DataFrame()
         curr_running_jobs = pd.DataFrame()
         jobs_report = pd.DataFrame()
-        job_allocation_time = []
-        job_post_process_time = []
         done = False
         
         while not done:
             start_time = time.time()
+            self.timer.tick(time_instant)
             
             # Extract completed jobs
+            phase = self.timer.start()
             if len(running_jobs) > 0:
                 running_jobs["current_duration"] = running_jobs["current_duration"] + running_jobs["speedup"]
                 prev_running_jobs = list(running_jobs["job_id"])
                 
             jobs_to_unallocate, running_jobs = job.extract_completed_jobs(running_jobs, time_instant)
+            self.aggregator.observe_completed_jobs(jobs_to_unallocate)
             # print(jobs_to_unallocate)
             
             jobs_report = pd.concat([jobs_report, jobs_to_unallocate])
+            self.timer.stop("completion", phase)
             
             # Deallocate completed jobs
-            self.deallocate_jobs(progress_bid_events, queues, jobs_to_unallocate)                
+            self.deallocate_jobs(progress_bid_events, jobs_to_unallocate)                
             self.collect_node_results(return_val, pd.DataFrame(), time.time()-start_time, time_instant, save_on_file=False)
             
             if len(running_jobs) > 0:
                 curr_running_jobs = list(running_jobs["job_id"])
             
+            phase = self.timer.start()
             id = -1
             if bool(self.failures):
                 for i in range(len(self.failures["time"])):
@@ -407,15 +791,17 @@ class Simulator_Plebiscito:
             #    plot.plot_all(self.n_nodes, self.filename, self.job_count, self.filename, job_allocation_time, job_post_process_time)
                     
             # Select jobs for the current time instant
-            new_jobs = job.select_jobs(self.dataset, time_instant)
+            new_jobs = job_source.pop_arrivals(time_instant)
             
             # Add new jobs to the job queue
             if len(jobs) > 0:
                 prev_job_list = list(jobs["job_id"])
                 
             jobs = pd.concat([jobs, new_jobs], sort=False)
+            self.timer.stop("arrivals", phase)
             
             # Schedule jobs
+            phase = self.timer.start()
             jobs = job.schedule_jobs(jobs, self.scheduling_algorithm)
             
             if len(jobs) > 0:
@@ -428,6 +814,7 @@ class Simulator_Plebiscito:
             #     n_jobs = 0
             
             jobs_to_submit = job.create_job_batch(jobs, n_jobs)
+            self.timer.stop("scheduling", phase)
             
             unassigned_jobs = pd.DataFrame()
             assigned_jobs = pd.DataFrame()
@@ -439,22 +826,22 @@ class Simulator_Plebiscito:
                     subset = jobs_to_submit.iloc[start_id:start_id+batch_size]
 
                     # if self.skip_deconfliction(subset) == False:
-                    t = time.time()
-                    self.dispatch_jobs(progress_bid_events, queues, subset) 
+                    allocations = self.dispatch_jobs(progress_bid_events, subset, commit_settled=True) 
                         
-                    job_allocation_time.append(time.time()-t)
                     logging.log(TRACE, 'All nodes completed the processing...')
                     exec_time = time.time() - start_time
                 
-                    t = time.time()
-                    # Collect node results
-                    a_jobs, u_jobs = self.collect_node_results(return_val, subset, exec_time, time_instant, save_on_file=False)
-                    job_post_process_time.append(time.time() - t)
+                    if allocations is not None:
+                        # the idle nodes agreed on the winners of the jobs, which are committed without reading the state of the nodes
+                        a_jobs, u_jobs = self.commit_jobs(subset, allocations), []
+                    else:
+                        # Collect node results
+                        a_jobs, u_jobs = self.collect_node_results(return_val, subset, exec_time, time_instant, save_on_file=False)
                     assigned_jobs = pd.concat([assigned_jobs, pd.DataFrame(a_jobs)])
                     unassigned_jobs = pd.concat([unassigned_jobs, pd.DataFrame(u_jobs)])
                 
                     # Deallocate unassigned jobs
-                    self.deallocate_jobs(progress_bid_events, queues, pd.DataFrame(u_jobs))
+                    self.deallocate_jobs(progress_bid_events, pd.DataFrame(u_jobs))
                     self.collect_node_results(return_val, pd.DataFrame(), time.time()-start_time, time_instant, save_on_file=False)
                     # else:
                     #     unassigned_jobs = pd.concat([unassigned_jobs, subset])
@@ -464,6 +851,7 @@ class Simulator_Plebiscito:
                     
             # Assign start time to assigned jobs
             assigned_jobs = job.assign_job_start_time(assigned_jobs, time_instant)
+            self.aggregator.observe_started_jobs(assigned_jobs)
             
             # Add unassigned jobs to the job queue
             jobs = pd.concat([jobs, unassigned_jobs], sort=False)  
@@ -484,9 +872,9 @@ class Simulator_Plebiscito:
                         start_id = 0
                         while start_id < len(jobs_to_reallocate):
                             subset = jobs_to_reallocate.iloc[start_id:start_id+batch_size]
-                            self.deallocate_jobs(progress_bid_events, queues, subset)
+                            self.deallocate_jobs(progress_bid_events, subset)
                             print(f"Job deallocated {float(subset['speedup'])}")
-                            self.dispatch_jobs(progress_bid_events, queues, subset, check_speedup=True, low_th=low_speedup_threshold, high_th=high_speedup_threshold) 
+                            self.dispatch_jobs(progress_bid_events, subset, check_speedup=True, low_th=low_speedup_threshold, high_th=high_speedup_threshold) 
                             
                             a_jobs, u_jobs = self.collect_node_results(return_val, subset, exec_time, time_instant, save_on_file=False)
                             assigned_jobs = pd.concat([assigned_jobs, pd.DataFrame(a_jobs)])
@@ -499,12 +887,13 @@ class Simulator_Plebiscito:
             
             self.collect_node_results(return_val, pd.DataFrame(), time.time()-start_time, time_instant, save_on_file=True)
             
-            self.print_simulation_progress(time_instant, len(processed_jobs), jobs, len(running_jobs), batch_size)
+            self.print_simulation_progress(time_instant, len(processed_jobs), jobs, len(running_jobs), batch_size, job_source.size())
             time_instant += 1
 
             # Check if all jobs have been processed
             # if len(processed_jobs) == len(self.dataset) and len(running_jobs) == 0 and len(jobs) == 0: # add to include also the final deallocation
-            if len(processed_jobs) == len(self.dataset) and len(jobs) == 0: # add to include also the final deallocation
+            # (all the jobs have been submitted and none of them is waiting in the queue)
+            if job_source.exhausted() and len(jobs) == 0: # add to include also the final deallocation
                 print('!!!last allocated', time_instant)
                 job.extract_allocated_jobs(processed_jobs, self.filename + "_allocations.csv")
 
@@ -515,12 +904,25 @@ class Simulator_Plebiscito:
             #     print(jobs)
         
         # Collect final node results
+        self.timer.tick(time_instant+1)
         self.collect_node_results(return_val, pd.DataFrame(), time.time()-start_time, time_instant+1, save_on_file=True)
         
-        self.print_simulation_progress(time_instant, len(processed_jobs), jobs, len(running_jobs), batch_size)
+        self.print_simulation_progress(time_instant, len(processed_jobs), jobs, len(running_jobs), batch_size, job_source.size())
+        self.timer.close_tick()
         
         # Terminate node processing
-        self.terminate_node_processing(terminate_processing_events)
+        if not persistent:
+            self.stop()
+
+        self.metrics.close()
+        self.metrics = None
+        self.aggregator.write(self.filename + "_summary.json")
+        self.aggregator = None
+        if self.timing:
+            self.timer.write(self.filename)
+        if self.node_stats:
+            # the stats published by the nodes with their state at the last collection
+            write_node_stats({i: v["stats"] for i, v in self.node_results.items()}, self.filename + "_node_stats.json")
 
         # Save processed jobs to CSV
         jobs_report.to_csv(self.filename + "_jobs_report.csv")
@@ -529,7 +931,7 @@ class Simulator_Plebiscito:
         if self.use_net_topology:
             self.network_t.dump_to_file(self.filename, self.alpha)
 
-    def rebid(self, progress_bid_events, return_val, queues, running_jobs, time_instant, batch_size, unassigned_jobs, assigned_jobs, exec_time):
+    def rebid(self, progress_bid_events, return_val, running_jobs, time_instant, batch_size, unassigned_jobs, assigned_jobs, exec_time):
         low_speedup_threshold = 1
         high_speedup_threshold = 1.2
                     
@@ -539,9 +941,9 @@ class Simulator_Plebiscito:
             start_id = 0
             while start_id < len(jobs_to_reallocate):
                 subset = jobs_to_reallocate.iloc[start_id:start_id+batch_size]
-                self.deallocate_jobs(progress_bid_events, queues, subset)
+                self.deallocate_jobs(progress_bid_events, subset)
                 print("Job deallocated")
-                self.dispatch_jobs(progress_bid_events, queues, subset, check_speedup=True, low_th=low_speedup_threshold, high_th=high_speedup_threshold) 
+                self.dispatch_jobs(progress_bid_events, subset, check_speedup=True, low_th=low_speedup_threshold, high_th=high_speedup_threshold) 
                 print("Job dispatched")
                 a_jobs, u_jobs = self.collect_node_results(return_val, subset, exec_time, time_instant, save_on_file=False)
                 assigned_jobs = pd.concat([assigned_jobs, pd.DataFrame(a_jobs)])
@@ -551,11 +953,20 @@ class Simulator_Plebiscito:
 
         #plot.plot_all(self.n_nodes, self.filename, self.job_count, "plot")
 
-    def dispatch_jobs(self, progress_bid_events, queues, subset, check_speedup=False, low_th=1, high_th=1.2):
-        job.dispatch_job(subset, queues, self.use_net_topology, self.split, check_speedup=check_speedup, low_th=low_th, high_th=high_th)
+    def dispatch_jobs(self, progress_bid_events, subset, check_speedup=False, low_th=1, high_th=1.2, commit_settled=False):
+        """
+        Dispatches the jobs to the nodes and waits until the nodes are idle. If `commit_settled` and the consensus is
+        tracked, it returns the winners of the jobs agreed by the idle nodes, if they agree (see `wait_consensus`).
+        """
+        commit_settled = commit_settled and self.consensus is not None and not self.use_net_topology
 
-        for e in progress_bid_events:
-            e.wait()
-            e.clear()
+        start = self.timer.start()
+        job.dispatch_job(subset, self.transport, self.use_net_topology, self.split, check_speedup=check_speedup, low_th=low_th, high_th=high_th, seed=self.seed, dispatch_seed=self.dispatch_seed)
+        self.timer.stop("dispatch", start)
+
+        if commit_settled:
+            return self.wait_consensus(progress_bid_events, subset)
+        self.wait_nodes(progress_bid_events)
+        return None
 
     
@@ -0,0 +1,297 @@
+"""
+Parameter sweeps, either executed on a single simulator (reusing the node processes across the runs)
+or as independent simulations running in parallel
+"""
+
+from enum import Enum
+import json
+import logging
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+import os
+import signal
+import sys
+import time
+
+from Plebiscito.src.simulator import Simulator_Plebiscito
+from Plebiscito.src.config import DebugLevel
+from Plebiscito.src.result_cache import simulator_arguments, simulation_output_prefix
+from Plebiscito.src.rng import stream
+
+# time given to a run to clean up after SIGINT before it is killed
+KILL_GRACE_PERIOD = 10
+
+
+# arguments of Simulator_Plebiscito that can change between two runs on the same simulator
+RESETTABLE_ARGUMENTS = ["dataset", "n_jobs", "alpha", "utility", "scheduling_algorithm", "decrement_factor", "split", "app_type", "enable_post_allocation", "seed"]
+
+
+def run_sweep(simulator_args, configurations, repetitions=1, dataset_factory=None, cache=None):
+    """
+    Runs a simulation for each configuration (and repetition) on the same infrastructure. The node
+    processes are started once and, between two runs, the nodes are reset to their initial state,
+    so the time of the sweep is spent on the auctions rather than on the startup of the simulations.
+
+    Args:
+        simulator_args (dict): The arguments of `Simulator_Plebiscito` shared by all the runs (they define the infrastructure).
+        configurations (list): For each configuration, a dictionary with the arguments of `Simulator_Plebiscito.reset`
+            (e.g., {"alpha": 0.5, "utility": Utility.LGF}). The other arguments (e.g., the number of nodes) define the
+            infrastructure, so they can't change between the runs.
+        repetitions (int, optional): Number of runs of each configuration.
+        dataset_factory (callable, optional): Called with the index of the repetition to get the dataset of the run.
+            If not provided, the dataset in the configuration (or in `simulator_args`) is used.
+        cache (ResultCache, optional): If provided, the runs already in the cache are not executed (their results
+            are copied from the cache) and the results of the executed runs are added to the cache.
+
+    Returns:
+        list: The prefix of the output files of each run.
+    """
+    for conf in configurations:
+        fixed = sorted(k for k in conf if k not in RESETTABLE_ARGUMENTS and k != "filename")
+        if len(fixed) > 0:
+            raise ValueError(f"The arguments {fixed} define the infrastructure of the sweep, they can't change between the runs")
+
+    # the infrastructure is built with the seed of simulator_args, the seed of each run only affects its jobs
+    shared = simulator_arguments(simulator_args)
+    infrastructure_seed = shared["infrastructure_seed"] if shared["infrastructure_seed"] is not None else shared["seed"]
+
+    simulator = None
+    filenames = []
+
+    try:
+        for conf in configurations:
+            for rep in range(repetitions):
+                args = dict(simulator_args)
+                args.update(conf)
+                if repetitions > 1:
+                    args["filename"] = args["filename"] + "_" + str(rep)
+                if dataset_factory is not None:
+                    args["dataset"] = dataset_factory(rep)
+                args["infrastructure_seed"] = infrastructure_seed
+
+                if cache is not None:
+                    key = cache.key(args)
+                    prefix = simulation_output_prefix(args)
+                    metrics_csv = simulator_arguments(args)["metrics_csv"]
+                    if cache.restore(key, prefix, metrics_csv):
+                        filenames.append(prefix)
+                        continue
+
+                # the simulator (and the nodes) are created only when the first run is executed
+                if simulator is None:
+                    simulator = Simulator_Plebiscito(**simulator_args)
+                    simulator.start()
+
+                # the arguments not in the configuration get the value of simulator_args (or the default one)
+                args = simulator_arguments(args)
+                simulator.reset(filename=args["filename"], **{k: args[k] for k in RESETTABLE_ARGUMENTS})
+                simulator.run()
+                filenames.append(simulator.filename)
+
+                if cache is not None:
+                    cache.store(key, simulator.filename, metrics_csv)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+    return filenames
+
+
+def _run_simulation(simulator_args, log_file, out_file, conn):
+    """
+    Entry point of the process executing a single run of a parallel sweep.
+    """
+    # the run (including the node processes) can be killed as a whole
+    os.setpgrp()
+
+    # the progress printed by the simulator goes to the output file of the run
+    fd = os.open(out_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(fd, sys.stdout.fileno())
+    os.dup2(fd, sys.stderr.fileno())
+    os.close(fd)
+
+    # each run has its own debug log (the simulator keeps the first configuration of the logging)
+    debug_level = simulator_args.get("debug_level", DebugLevel.INFO)
+    logging.basicConfig(filename=log_file, level=debug_level.value, format='%(message)s', filemode='w')
+
+    simulator = Simulator_Plebiscito(**simulator_args)
+    simulator.run()
+    conn.send(simulator.filename)
+    conn.close()
+
+
+def retry_seed(seed, attempt):
+    """
+    Returns the seed of the nodes receiving the jobs in a retry of a run with the given seed.
+    """
+    return int(stream(seed, "retry", attempt).integers(2 ** 63))
+
+
+def _describe(value):
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _stop_run(p):
+    """
+    Interrupts a run (the simulator terminates its nodes on SIGINT) and kills it if it doesn't exit in time.
+    """
+    try:
+        os.kill(p.pid, signal.SIGINT)
+    except ProcessLookupError:
+        pass
+
+    p.join(KILL_GRACE_PERIOD)
+
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    p.join()
+
+
+def run_parallel_sweep(simulator_args, configurations, repetitions=1, dataset_factory=None, n_processes=None, timeout=300, max_retries=3, manifest="sweep_manifest.json", cache=None):
+    """
+    Runs a simulation for each configuration (and repetition) in a separate process, executing up to
+    `n_processes` simulations at the same time. A run that doesn't complete within `timeout` seconds,
+    or that exits with an error, is retried with the jobs submitted to different nodes (see `retry_seed`),
+    on the same infrastructure. The outcome of every attempt is saved in the `manifest` file as soon as it is known.
+
+    The output of each run is written in `<filename>.out` and its debug log in `<filename>.log`
+    (`<filename>_FAIL<attempt>.*` for the failed attempts).
+
+    Args:
+        simulator_args (dict): The arguments of `Simulator_Plebiscito` shared by all the runs.
+        configurations (list): For each configuration, a dictionary with the arguments of `Simulator_Plebiscito`
+            that override `simulator_args`.
+        repetitions (int, optional): Number of runs of each configuration.
+        dataset_factory (callable, optional): Called with the index of the repetition to get the dataset of the run.
+        n_processes (int, optional): Maximum number of concurrent runs (by default, the number of cores).
+        timeout (float, optional): Maximum duration of a run in seconds.
+        max_retries (int, optional): Maximum number of retries of a run.
+        manifest (str, optional): Path of the JSON file describing the runs.
+        cache (ResultCache, optional): If provided, the runs already in the cache are not executed (their results
+            are copied from the cache) and the results of the successful runs are added to the cache.
+
+    Returns:
+        list: The description of each run (the content of the manifest).
+    """
+    if n_processes is None:
+        n_processes = os.cpu_count() or 1
+
+    runs = []
+    for conf in configurations:
+        for rep in range(repetitions):
+            args = dict(simulator_args)
+            args.update(conf)
+            if repetitions > 1:
+                args["filename"] = args["filename"] + "_" + str(rep)
+            if dataset_factory is not None:
+                args["dataset"] = dataset_factory(rep)
+
+            runs.append({
+                "args": args,
+                "entry": {
+                    "run": len(runs),
+                    "configuration": {k: _describe(v) for k, v in conf.items()},
+                    "repetition": rep,
+                    "status": "pending",
+                    "output": None,
+                    "attempts": [],
+                },
+            })
+
+    def save_manifest():
+        with open(manifest, "w") as f:
+            json.dump([r["entry"] for r in runs], f, indent=2)
+
+    def launch(run):
+        args = dict(run["args"])
+        attempt = len(run["entry"]["attempts"])
+        # the first attempt uses the seed of the configuration, the retries submit the same jobs to other nodes of
+        # the same infrastructure (with a seed derived from the one of the configuration, so it's never reused by another run)
+        if attempt > 0:
+            args["dispatch_seed"] = retry_seed(args.get("seed"), attempt)
+
+        parent_conn, child_conn = Pipe(duplex=False)
+        log_file = args["filename"] + ".log"
+        out_file = args["filename"] + ".out"
+        p = Process(target=_run_simulation, args=(args, log_file, out_file, child_conn))
+        p.start()
+        child_conn.close()
+
+        run["entry"]["attempts"].append({"seed": _describe(args.get("seed")), "dispatch_seed": _describe(args.get("dispatch_seed")), "status": "running", "exitcode": None, "elapsed": None})
+        return {"run": run, "process": p, "conn": parent_conn, "start": time.time(), "log_file": log_file, "out_file": out_file}
+
+    def complete(active, status):
+        run = active["run"]
+        attempt = run["entry"]["attempts"][-1]
+        attempt["status"] = status
+        attempt["exitcode"] = active["process"].exitcode
+        attempt["elapsed"] = time.time() - active["start"]
+
+        if status == "ok":
+            run["entry"]["status"] = "ok"
+            run["entry"]["output"] = active["conn"].recv()
+            # the results of a retry don't depend on the seed of the configuration
+            if cache is not None and len(run["entry"]["attempts"]) == 1:
+                cache.store(run["key"], run["entry"]["output"], simulator_arguments(run["args"])["metrics_csv"])
+        else:
+            n = len(run["entry"]["attempts"])
+            for f in (active["log_file"], active["out_file"]):
+                if os.path.exists(f):
+                    base, ext = os.path.splitext(f)
+                    os.replace(f, base + "_FAIL" + str(n) + ext)
+            if n > max_retries:
+                run["entry"]["status"] = "failed"
+            else:
+                pending.append(run)
+
+        active["conn"].close()
+        save_manifest()
+
+    pending = []
+    for run in runs:
+        if cache is not None:
+            run["key"] = cache.key(run["args"])
+            prefix = simulation_output_prefix(run["args"])
+            if cache.restore(run["key"], prefix, simulator_arguments(run["args"])["metrics_csv"]):
+                run["entry"]["status"] = "cached"
+                run["entry"]["output"] = prefix
+                continue
+        pending.append(run)
+
+    running = []
+    save_manifest()
+
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < n_processes:
+            running.append(launch(pending.pop(0)))
+
+        # wake up as soon as a run exits or the earliest deadline expires
+        next_deadline = min(a["start"] + timeout for a in running)
+        wait([a["process"].sentinel for a in running], timeout=max(0, next_deadline - time.time()))
+
+        for a in list(running):
+            if not a["process"].is_alive():
+                a["process"].join()
+                # the run is successful only if the simulator completed and returned its results
+                if a["process"].exitcode == 0 and a["conn"].poll():
+                    complete(a, "ok")
+                else:
+                    # the node processes of a run that crashed could be still alive
+                    try:
+                        os.killpg(a["process"].pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    complete(a, "failed")
+                running.remove(a)
+            elif time.time() - a["start"] > timeout:
+                _stop_run(a["process"])
+                complete(a, "timeout")
+                running.remove(a)
+
+    return [r["entry"] for r in runs]
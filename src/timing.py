@@ -0,0 +1,119 @@
+"""
+Timing of the phases of each time instant of the simulation loop
+"""
+
+import json
+import time
+
+import numpy as np
+
+# phases of a time instant, in the order of the columns of the timeline
+PHASES = ["completion", "deallocation", "arrivals", "scheduling", "dispatch", "quiescence", "collection", "metrics", "progress"]
+
+# number of time instants allocated when the arrays are full
+DEFAULT_CAPACITY = 1024
+
+
+class PhaseTimer:
+    """
+    Records the time spent in each phase of every time instant (`perf_counter_ns`) in preallocated arrays,
+    starting from time instant 0 when it is created.
+    A phase is measured between `start` and `stop`, excluding the time of the phases measured inside it
+    (e.g., the wait for the quiescence of the nodes within a dispatch), so the phases of a time instant
+    never overlap and their sum is at most the wall time of the time instant.
+
+    Args:
+        phases (list, optional): The names of the phases.
+        capacity (int, optional): The number of time instants allocated at once.
+    """
+
+    def __init__(self, phases=PHASES, capacity=DEFAULT_CAPACITY):
+        self.phases = list(phases)
+        self.index = {p: i for i, p in enumerate(self.phases)}
+        self.capacity = capacity
+        self.time_instant = np.zeros(capacity, dtype=np.int64)
+        self.wall = np.zeros(capacity, dtype=np.int64)
+        self.durations = np.zeros((capacity, len(self.phases)), dtype=np.int64)
+        self.row = 0
+        self.tick_start = time.perf_counter_ns()
+        # time of all the phases recorded so far (to exclude the nested ones)
+        self.recorded = 0
+
+    def tick(self, time_instant):
+        """
+        Starts a new time instant (the phases measured until the next call are assigned to it).
+        """
+        now = time.perf_counter_ns()
+        self.close_tick(now)
+        self.row += 1
+        if self.row == len(self.time_instant):
+            self.time_instant = np.concatenate([self.time_instant, np.zeros(self.capacity, dtype=np.int64)])
+            self.wall = np.concatenate([self.wall, np.zeros(self.capacity, dtype=np.int64)])
+            self.durations = np.concatenate([self.durations, np.zeros((self.capacity, len(self.phases)), dtype=np.int64)])
+        self.time_instant[self.row] = time_instant
+        self.tick_start = now
+
+    def close_tick(self, now=None):
+        """
+        Ends the current time instant, saving its wall time.
+        """
+        if self.tick_start is not None:
+            self.wall[self.row] = (now or time.perf_counter_ns()) - self.tick_start
+            self.tick_start = None
+
+    def start(self):
+        """
+        Returns the token of a measure started now, to be passed to `stop`.
+        """
+        return time.perf_counter_ns(), self.recorded
+
+    def stop(self, phase, start):
+        """
+        Adds the time elapsed since `start` (excluding the phases measured in the meanwhile) to a phase of
+        the current time instant.
+        """
+        t, recorded = start
+        elapsed = time.perf_counter_ns() - t - (self.recorded - recorded)
+        self.durations[self.row, self.index[phase]] += elapsed
+        self.recorded += elapsed
+
+    def timeline(self):
+        """
+        Returns the time instants, their wall time and the time of each phase (in ns), one row for each time instant.
+        """
+        n = self.row + 1
+        return self.time_instant[:n], self.wall[:n], self.durations[:n]
+
+    def summary(self):
+        """
+        Returns, for each phase, the total time (s), its share of the wall time, and the mean, median,
+        99th percentile and maximum time per time instant (us).
+        """
+        time_instant, wall, durations = self.timeline()
+        total_wall = int(wall.sum())
+        summary = {"time_instants": len(time_instant), "wall_s": total_wall / 1e9, "phases": {}}
+        columns = [(p, durations[:, i]) for i, p in enumerate(self.phases)] + [("other", wall - durations.sum(axis=1))]
+        for p, d in columns:
+            if len(d) == 0:
+                summary["phases"][p] = {"total_s": 0.0}
+                continue
+            summary["phases"][p] = {
+                "total_s": int(d.sum()) / 1e9,
+                "share": int(d.sum()) / total_wall if total_wall > 0 else 0.0,
+                "mean_us": float(d.mean()) / 1e3,
+                "p50_us": float(np.percentile(d, 50)) / 1e3,
+                "p99_us": float(np.percentile(d, 99)) / 1e3,
+                "max_us": int(d.max()) / 1e3,
+            }
+        return summary
+
+    def write(self, prefix):
+        """
+        Writes the timeline of the phases to `<prefix>_phases.csv` (ns) and their summary to `<prefix>_phases.json`.
+        """
+        self.close_tick()
+        time_instant, wall, durations = self.timeline()
+        data = np.column_stack([time_instant, wall, durations])
+        np.savetxt(prefix + "_phases.csv", data, fmt="%d", delimiter=",", header=",".join(["time_instant", "wall"] + self.phases), comments="")
+        with open(prefix + "_phases.json", "w") as f:
+            json.dump(self.summary(), f, indent=2)
@@ -5,7 +5,7 @@ Topology building module
 import numpy as np
 
 class topo:
-    def __init__(self, func_name, max_bandwidth, min_bandwidth, num_clients, num_edges, probability=0):
+    def __init__(self, func_name, max_bandwidth, min_bandwidth, num_clients, num_edges, probability=0, rng=None):
         self.n = num_edges #adjacency matrix
 
         self.to = getattr(self, func_name)
@@ -13,7 +13,8 @@ class topo:
         self.probability = probability
         # self.b = np.random.uniform(min_bandwidth, max_bandwidth, size=(num_clients, num_edges)) #bandwidth matrix
         
-        np.random.seed(0)
+        # local generator, same draws of np.random.seed(0) if not provided
+        self.rng = rng if rng is not None else np.random.RandomState(0)
         
         if func_name == "complete_graph":
             self.adjacency_matrix = self.compute_complete_graph()
@@ -107,7 +108,7 @@ class topo:
         adjacency_matrix = np.zeros((self.n, self.n))
         for i in range(self.n):
             for j in range(0, i):
-                value = np.random.choice([0, 1], p=[1-self.probability, self.probability])
+                value = self.rng.choice([0, 1], p=[1-self.probability, self.probability])
                 adjacency_matrix[i][j] = value
                 adjacency_matrix[j][i] = value
         return adjacency_matrix
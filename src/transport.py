@@ -0,0 +1,520 @@
+"""
+Message transports used to deliver the bidding messages to the node mailboxes
+"""
+
+from abc import ABC, abstractmethod
+from multiprocessing import JoinableQueue, Lock, Semaphore
+from multiprocessing import shared_memory
+from queue import Empty, Full, Queue
+from collections import deque
+import asyncio
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+
+from Plebiscito.src.config import TransportType
+
+# the ring header stores four monotonic counters (bytes written, bytes read,
+# records written, records read) and the number of producers waiting for free
+# space, each one on its own 8 bytes aligned slot
+_HEADER_SIZE = 64
+_TAIL = 0
+_HEAD = 8
+_WRITTEN = 16
+_READ = 24
+_WAITING = 32
+
+# maximum time a producer waits for a signal of the consumer before checking the free space again
+_SPACE_POLL_INTERVAL = 0.01
+_COUNTER = struct.Struct("Q")
+_LENGTH = struct.Struct("I")
+
+DEFAULT_RING_CAPACITY = 1 << 20 # 1 MiB per node mailbox
+
+
+class SharedMemoryRingBuffer:
+    """
+    Multi-producer/single-consumer byte ring buffer over `multiprocessing.shared_memory`.
+
+    The buffer exposes the subset of the `JoinableQueue` interface used by the nodes
+    (`put`, `get`, `qsize`, `empty`), so it can be used as a drop-in replacement for
+    the node mailboxes. Each message is stored as a 4 bytes length followed by the pickled
+    payload. Producers serialize on a short critical section to reserve the space, while
+    the single consumer (the node owning the mailbox) reads without taking any lock: the
+    `items` semaphore publishes complete records, and the consumer only advances the head
+    counter, which producers read to compute the free space. A stale head can only
+    underestimate the free space, so no record is ever overwritten before being read.
+    When the buffer is full, a producer waits for the consumer outside the critical section
+    (on the `space` semaphore), so the other producers are not blocked meanwhile.
+    """
+
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY, name=None):
+        self.capacity = capacity
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + capacity)
+        self._owner = True
+        self._lock = Lock()
+        self._items = Semaphore(0)
+        self._space = Semaphore(0)
+
+        self._shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+
+    def __getstate__(self):
+        return {
+            "name": self._shm.name,
+            "capacity": self.capacity,
+            "lock": self._lock,
+            "items": self._items,
+            "space": self._space
+        }
+
+    def __setstate__(self, state):
+        self.capacity = state["capacity"]
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._owner = False
+        self._lock = state["lock"]
+        self._items = state["items"]
+        self._space = state["space"]
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def _get_counter(self, offset):
+        return _COUNTER.unpack_from(self._shm.buf, offset)[0]
+
+    def _set_counter(self, offset, value):
+        # aligned 8 bytes stores, readers never observe a partially written counter
+        _COUNTER.pack_into(self._shm.buf, offset, value)
+
+    def _write(self, position, data):
+        start = position % self.capacity
+        end = start + len(data)
+        buf = self._shm.buf
+
+        if end <= self.capacity:
+            buf[_HEADER_SIZE + start:_HEADER_SIZE + end] = data
+        else:
+            split = self.capacity - start
+            buf[_HEADER_SIZE + start:_HEADER_SIZE + self.capacity] = data[:split]
+            buf[_HEADER_SIZE:_HEADER_SIZE + len(data) - split] = data[split:]
+
+    def _read(self, position, size):
+        start = position % self.capacity
+        end = start + size
+        buf = self._shm.buf
+
+        if end <= self.capacity:
+            return bytes(buf[_HEADER_SIZE + start:_HEADER_SIZE + end])
+
+        split = self.capacity - start
+        return bytes(buf[_HEADER_SIZE + start:_HEADER_SIZE + self.capacity]) + bytes(buf[_HEADER_SIZE:_HEADER_SIZE + size - split])
+
+    def _stop_waiting(self):
+        # called with the lock held
+        waiting = self._get_counter(_WAITING) - 1
+        self._set_counter(_WAITING, waiting)
+        if waiting == 0:
+            # the signals sent by the consumer after the last producer got its space would wake up the next waits at once
+            while self._space.acquire(False):
+                pass
+
+    def put(self, obj, block=True, timeout=None):
+        """
+        Appends a message to the ring buffer.
+
+        Args:
+            obj: The message to be sent (must be picklable).
+            block (bool, optional): Wait for free space if the buffer is full. Defaults to True.
+            timeout (float, optional): Maximum time to wait for free space. Defaults to None (forever).
+
+        Raises:
+            ValueError: If the message is larger than the whole buffer.
+            Full: If there is no space available within `timeout`.
+        """
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        record = _LENGTH.pack(len(payload)) + payload
+
+        if len(record) > self.capacity:
+            raise ValueError(f"Message of {len(record)} bytes exceeds the ring buffer capacity ({self.capacity} bytes)")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        waiting = False
+        try:
+            while True:
+                with self._lock:
+                    tail = self._get_counter(_TAIL)
+                    if self.capacity - (tail - self._get_counter(_HEAD)) >= len(record):
+                        self._write(tail, record)
+                        self._set_counter(_TAIL, tail + len(record))
+                        self._set_counter(_WRITTEN, self._get_counter(_WRITTEN) + 1)
+                        if waiting:
+                            self._stop_waiting()
+                            waiting = False
+                        break
+                    if not block or (deadline is not None and time.monotonic() >= deadline):
+                        raise Full
+                    if not waiting:
+                        # the consumer signals the space it frees while some producer is waiting
+                        self._set_counter(_WAITING, self._get_counter(_WAITING) + 1)
+                        waiting = True
+
+                # a signal may be missed if the consumer freed the space right before the producer started waiting,
+                # so the free space is checked again after a short time anyway
+                wait = _SPACE_POLL_INTERVAL if deadline is None else max(0, min(_SPACE_POLL_INTERVAL, deadline - time.monotonic()))
+                self._space.acquire(True, wait)
+        finally:
+            if waiting:
+                with self._lock:
+                    self._stop_waiting()
+
+        self._items.release()
+
+    def put_nowait(self, obj):
+        self.put(obj, block=False)
+
+    def get(self, block=True, timeout=None):
+        """
+        Pops the oldest message from the ring buffer. Must be called only by the consumer.
+
+        Args:
+            block (bool, optional): Wait for a message if the buffer is empty. Defaults to True.
+            timeout (float, optional): Maximum time to wait for a message. Defaults to None (forever).
+
+        Raises:
+            Empty: If no message is available within `timeout`.
+
+        Returns:
+            The unpickled message.
+        """
+        if not self._items.acquire(block, timeout):
+            raise Empty
+
+        head = self._get_counter(_HEAD)
+        size = _LENGTH.unpack(self._read(head, _LENGTH.size))[0]
+        payload = self._read(head + _LENGTH.size, size)
+
+        self._set_counter(_HEAD, head + _LENGTH.size + size)
+        self._set_counter(_READ, self._get_counter(_READ) + 1)
+        if self._get_counter(_WAITING) > 0:
+            self._space.release()
+
+        return pickle.loads(payload)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        return self._get_counter(_WRITTEN) - self._get_counter(_READ)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Releases the shared memory segment. Only the process that created the buffer unlinks it.
+        """
+        if self._owner:
+            self._shm.unlink()
+            self._owner = False
+
+
+class Transport(ABC):
+    """
+    Base class of the transports used by the nodes to talk to their peers.
+
+    A transport owns one mailbox for each node. `send` can be called from any process
+    (nodes and simulator), while `receive` must be called only by the process hosting
+    the node owning the mailbox. `start` is called inside such process before the node
+    starts consuming messages.
+    """
+
+    def __init__(self, n_nodes):
+        self.n_nodes = n_nodes
+
+    def start(self, node_id):
+        pass
+
+    @abstractmethod
+    def send(self, dst, msg):
+        pass
+
+    @abstractmethod
+    def receive(self, node_id, timeout=None):
+        """
+        Returns the oldest message in the mailbox of `node_id`.
+
+        Raises:
+            Empty: If no message is received within `timeout`.
+        """
+
+    @abstractmethod
+    def qsize(self, node_id):
+        pass
+
+    def broadcast(self, msg):
+        for i in range(self.n_nodes):
+            self.send(i, msg)
+
+    def close(self):
+        pass
+
+
+class InProcessTransport(Transport):
+    """
+    Mailboxes shared by nodes running as threads of the same process.
+    """
+
+    def __init__(self, n_nodes):
+        super().__init__(n_nodes)
+        self.queues = [Queue() for _ in range(n_nodes)]
+
+    def send(self, dst, msg):
+        self.queues[dst].put(msg)
+
+    def receive(self, node_id, timeout=None):
+        return self.queues[node_id].get(timeout=timeout)
+
+    def qsize(self, node_id):
+        return self.queues[node_id].qsize()
+
+
+class QueueTransport(InProcessTransport):
+    """
+    One `multiprocessing.JoinableQueue` for each node (pipe + feeder thread, pickled messages).
+    """
+
+    def __init__(self, n_nodes):
+        Transport.__init__(self, n_nodes)
+        self.queues = [JoinableQueue() for _ in range(n_nodes)]
+
+
+class SharedMemoryTransport(InProcessTransport):
+    """
+    One `SharedMemoryRingBuffer` for each node.
+    """
+
+    def __init__(self, n_nodes, ring_capacity=DEFAULT_RING_CAPACITY):
+        Transport.__init__(self, n_nodes)
+        self.queues = [SharedMemoryRingBuffer(ring_capacity) for _ in range(n_nodes)]
+
+    def close(self):
+        for q in self.queues:
+            q.close()
+            q.unlink()
+
+
+class TcpTransport(Transport):
+    """
+    Length-prefixed pickled frames over localhost TCP sockets.
+
+    The listening sockets are bound when the transport is created, so the addresses are known
+    to every process before the nodes are spawned and the messages sent before a node starts
+    are kept in the socket backlog. `start` runs an asyncio server in a background thread of the
+    node process, which moves the received frames into a local inbox. Senders keep one
+    connection open for each destination.
+    """
+
+    def __init__(self, n_nodes, host="127.0.0.1"):
+        super().__init__(n_nodes)
+        self.host = host
+        self._listeners = []
+        self.addresses = []
+
+        for _ in range(n_nodes):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((host, 0))
+            s.listen(n_nodes + 1)
+            self._listeners.append(s)
+            self.addresses.append(s.getsockname())
+
+        self._inbox = {}
+        self._connections = {}
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_inbox"] = {}
+        state["_connections"] = {}
+        state["_pid"] = None
+        return state
+
+    def start(self, node_id):
+        inbox = Queue()
+        self._inbox[node_id] = inbox
+        listener = self._listeners[node_id]
+        ready = threading.Event()
+
+        async def handle(reader, writer):
+            try:
+                while True:
+                    header = await reader.readexactly(_LENGTH.size)
+                    payload = await reader.readexactly(_LENGTH.unpack(header)[0])
+                    inbox.put(pickle.loads(payload))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        async def serve():
+            server = await asyncio.start_server(handle, sock=listener)
+            ready.set()
+            async with server:
+                await server.serve_forever()
+
+        threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+        ready.wait()
+
+    def _connection(self, dst):
+        # connections are not shared with the forked processes
+        if self._pid != os.getpid():
+            self._connections = {}
+            self._pid = os.getpid()
+
+        conn = self._connections.get(dst)
+        if conn is None:
+            conn = socket.create_connection(self.addresses[dst])
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connections[dst] = conn
+        return conn
+
+    def send(self, dst, msg):
+        payload = pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+        self._connection(dst).sendall(_LENGTH.pack(len(payload)) + payload)
+
+    def receive(self, node_id, timeout=None):
+        return self._inbox[node_id].get(timeout=timeout)
+
+    def qsize(self, node_id):
+        return self._inbox[node_id].qsize()
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections = {}
+
+        for s in self._listeners:
+            s.close()
+
+
+class ShardedTransport(Transport):
+    """
+    Transport of the nodes hosted by a pool of workers, each one hosting a shard of nodes.
+
+    The messages between nodes hosted by the same worker are appended to the local mailbox of the
+    destination (no serialization), while the messages to nodes hosted by other workers go through
+    the `inner` transport, which holds one mailbox for each worker. The nodes are assigned to the
+    workers in contiguous blocks, so neighbors in ring/linear topologies are mostly local.
+    """
+
+    def __init__(self, inner: Transport, n_nodes, n_workers):
+        super().__init__(n_nodes)
+        self.inner = inner
+        self.n_workers = n_workers
+        self.owner = [i * n_workers // n_nodes for i in range(n_nodes)]
+        self._local = {}
+        self._pending = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_local"] = {}
+        state["_pending"] = 0
+        return state
+
+    def hosted_by(self, worker_id):
+        return [i for i in range(self.n_nodes) if self.owner[i] == worker_id]
+
+    def start(self, worker_id):
+        self._local = {i: deque() for i in self.hosted_by(worker_id)}
+        self._pending = 0
+        self.inner.start(worker_id)
+
+    def send(self, dst, msg):
+        mailbox = self._local.get(dst)
+        if mailbox is not None:
+            mailbox.append(msg)
+            self._pending += 1
+        else:
+            self.inner.send(self.owner[dst], (dst, msg))
+
+    def broadcast(self, msg):
+        # one message for each worker, delivered to all the nodes it hosts
+        for w in range(self.n_workers):
+            self.inner.send(w, (None, msg))
+
+    def __deliver(self, dst, msg):
+        if dst is None:
+            for mailbox in self._local.values():
+                mailbox.append(msg)
+            self._pending += len(self._local)
+        else:
+            self._local[dst].append(msg)
+            self._pending += 1
+
+    def poll(self, worker_id, timeout, max_messages=1024):
+        """
+        Moves the messages received by the worker into the local mailboxes of the hosted nodes.
+        Blocks up to `timeout` only if there are no local messages to process.
+
+        Returns:
+            bool: True if at least one message is waiting in the local mailboxes.
+        """
+        try:
+            dst, msg = self.inner.receive(worker_id, timeout=0 if self._pending > 0 else timeout)
+            self.__deliver(dst, msg)
+            for _ in range(max_messages - 1):
+                dst, msg = self.inner.receive(worker_id, timeout=0)
+                self.__deliver(dst, msg)
+        except Empty:
+            pass
+
+        return self._pending > 0
+
+    def pop(self, node_id):
+        mailbox = self._local[node_id]
+        if len(mailbox) == 0:
+            return None
+        self._pending -= 1
+        return mailbox.popleft()
+
+    def receive(self, node_id, timeout=None):
+        msg = self.pop(node_id)
+        if msg is None:
+            raise Empty
+        return msg
+
+    def qsize(self, node_id):
+        mailbox = self._local.get(node_id)
+        return 0 if mailbox is None else len(mailbox)
+
+    def close(self):
+        self.inner.close()
+
+
+def create_transport(transport_type: TransportType, n_nodes, ring_capacity=DEFAULT_RING_CAPACITY):
+    """
+    Creates the transport used by the nodes to exchange the bidding messages.
+
+    Args:
+        transport_type (TransportType): The transport used to deliver the messages.
+        n_nodes (int): The number of nodes.
+        ring_capacity (int, optional): Size in bytes of each shared memory ring buffer.
+
+    Returns:
+        Transport: The transport holding one mailbox for each node.
+    """
+    if transport_type == TransportType.IN_PROCESS:
+        return InProcessTransport(n_nodes)
+    elif transport_type == TransportType.SHARED_MEMORY:
+        return SharedMemoryTransport(n_nodes, ring_capacity)
+    elif transport_type == TransportType.TCP:
+        return TcpTransport(n_nodes)
+    else:
+        return QueueTransport(n_nodes)
@@ -14,14 +14,15 @@ from Plebiscito.src.config import *
 
 import math
 
-def generate_gpu_types(n_nodes):
+def generate_gpu_types(n_nodes, rng=None):
     occurrencies = [0.3, 0.17, 0.47, 0.06]
     GPU_types = ["T4", "MISC", "P100", "V100"]
-    np.random.seed(1)
+    if rng is None:
+        # local generator, same draws of np.random.seed(1)
+        rng = np.random.RandomState(1)
     
     gpu_types = []
-    for _ in range(n_nodes):
-        t_id = np.random.choice(np.arange(0, 4), p=occurrencies)
+    for t_id in rng.choice(np.arange(0, 4), size=n_nodes, p=occurrencies):
         gpu_types.append(GPUSupport.get_gpu_type(GPU_types[t_id]))
         
     return gpu_types
@@ -88,7 +89,33 @@ def allocation_to_gpu_type(allocation, gpu_types):
             ret.append(gpu_types[a].name)
         return ret
 
-def calculate_utility(nodes, num_edges, msg_count, simulation_time, n_req, jobs, alpha, time_instant, use_net_topology, filename, net_topology, gpu_types, save_on_file):
+def set_job_allocation(job, allocation, GPUs, gpu_types):
+    """
+    Saves in the job the nodes allocated to its layers, their GPU types and the speedup of the job (the
+    lowest one of the GPU types in `GPUs`).
+    """
+    job["final_node_allocation"] = allocation
+    job["final_gpu_allocation"] = allocation_to_gpu_type(allocation, gpu_types=gpu_types)
+    
+    lower_speedup = 10000
+    for g in set(GPUs):
+        s = GPUSupport.compute_speedup(GPUSupport.get_gpu_type(g), GPUSupport.get_gpu_type(job["gpu_type"]))
+        if lower_speedup > s:
+            lower_speedup = s
+    
+    job["speedup"] = lower_speedup
+
+def winner_matrix(nodes, job_id):
+    """
+    Returns the winners of the layers of a job as seen by the nodes holding a bid for it (one row for
+    each of these nodes, one column for each layer, -inf for the layers not assigned) and the ids of these nodes.
+    """
+    bidders = [i for i in range(len(nodes)) if job_id in nodes[i].bids]
+    if len(bidders) == 0:
+        return np.empty((0, 0)), bidders
+    return np.array([nodes[i].bids[job_id]['auction_id'] for i in bidders], dtype=np.float64), bidders
+
+def calculate_utility(nodes, num_edges, msg_count, simulation_time, n_req, jobs, alpha, time_instant, use_net_topology, filename, net_topology, gpu_types, save_on_file, winners=None, metrics=None):
     stats = {}
     stats['nodes'] = {}
     stats['tot_utility'] = 0
@@ -124,40 +151,29 @@ def calculate_utility(nodes, num_edges, msg_count, simulation_time, n_req, jobs,
         flag = True
         j = job['job_id']
         node_with_bid = None
-        n_layer = 0
         GPUs = []
         unmatch = False
         
-        for n in nodes:
-            if j in n.bids:
-                n_layer = len(n.bids[j]['auction_id'])
-                break
+        # winners of each layer (columns) according to each node holding a bid (rows)
+        if winners is not None and j in winners:
+            auction_ids, bidders = winners[j]
+        else:
+            auction_ids, bidders = winner_matrix(nodes, j)
         
-        # Check correctness of all bids
-        for k in range(n_layer):
-            unmatch = False
-            alloc = None
-            for i in range(0, num_edges):
-                if j not in nodes[i].bids:
-                    continue
-                if alloc == None:
-                    alloc = nodes[i].bids[j]['auction_id'][k]
-                    node_with_bid = i
-                else:
-                    if alloc != nodes[i].bids[j]['auction_id'][k]:
-                        unmatch = True
-                        break
-                    
-            if unmatch:
-                print('BROKEN BID id: ' + str(j))
-                for n in nodes:
-                    if j in n.bids:
-                        print(f"Node: {n.id}: {n.bids[j]['auction_id']}")
-                # something bad happened
-                break
+        # Check correctness of all bids: all the nodes must agree on the winner of each layer
+        if len(bidders) > 0:
+            node_with_bid = bidders[0]
+            unmatch = not (auction_ids == auction_ids[0]).all()
             
-            if alloc != float('-inf'):
-                GPUs.append(nodes[alloc].gpu_type)
+        if unmatch:
+            print('BROKEN BID id: ' + str(j))
+            for n in nodes:
+                if j in n.bids:
+                    print(f"Node: {n.id}: {n.bids[j]['auction_id']}")
+            # something bad happened
+        elif node_with_bid != None:
+            for alloc in auction_ids[0][np.isfinite(auction_ids[0])]:
+                GPUs.append(nodes[int(alloc)].gpu_type)
                 
         if node_with_bid != None and float('-inf') not in nodes[node_with_bid].bids[j]['auction_id'] and not unmatch:
             count_success += 1
@@ -167,16 +183,7 @@ def calculate_utility(nodes, num_edges, msg_count, simulation_time, n_req, jobs,
             flag = False 
 
         if flag:
-            job["final_node_allocation"] = nodes[node_with_bid].bids[j]['auction_id']
-            job["final_gpu_allocation"] = allocation_to_gpu_type(nodes[node_with_bid].bids[j]['auction_id'], gpu_types=gpu_types)
-            
-            lower_speedup = 10000
-            for g in set(GPUs):
-                s = GPUSupport.compute_speedup(GPUSupport.get_gpu_type(g), GPUSupport.get_gpu_type(job["gpu_type"]))
-                if lower_speedup > s:
-                    lower_speedup = s
-            
-            job["speedup"] = lower_speedup
+            set_job_allocation(job, nodes[node_with_bid].bids[j]['auction_id'], GPUs, gpu_types)
             
             assigned_jobs.append(job)
             assigned_jobs_id.append(j)
@@ -198,6 +205,10 @@ def calculate_utility(nodes, num_edges, msg_count, simulation_time, n_req, jobs,
     if use_net_topology:
         print()
         net_topology.check_network_consistency(valid_bids)
+        
+    if metrics is not None:
+        # the resources of the nodes are saved by the caller in the sink (see metrics.MetricsSink)
+        return assigned_jobs, unassigned_jobs
             
     #print(f"Count assigned {count_assigned} count unassigned {count_unassigned}")    
     #field_names.append('count_assigned')
@@ -0,0 +1,101 @@
+"""
+Entry points of the processes hosting the nodes
+"""
+
+from Plebiscito.src.transport import Transport, ShardedTransport
+
+
+def run_node(spec, transport: Transport, use_queue, end_processing, notify_start, progress_bid, ret_val, consensus_reports=None):
+    """
+    Builds a node from its spec inside the hosting process (or thread) and runs it.
+
+    Args:
+        spec (NodeSpec): The description of the node.
+        transport (Transport): The transport used to exchange the messages.
+        use_queue (list): One event for each node, set while the node mailbox is empty.
+        end_processing (Event): Set by the simulator to stop the node.
+        notify_start (Event): Set by the node once it's ready to receive messages.
+        progress_bid (Event): Set by the node when the bidding process has completed.
+        ret_val (dict): Shared dictionary where the node state is saved.
+        consensus_reports (Queue, optional): Queue receiving the changes of the winner vectors of the node.
+    """
+    n = spec.build()
+    n.set_transport(transport, use_queue, consensus_reports)
+    n.work(end_processing, notify_start, progress_bid, ret_val)
+
+
+def run_worker(worker_id, specs, transport: ShardedTransport, end_processing, notify_start, progress_bid, idle_events, ret_val, timeout=0.05, consensus_reports=None):
+    """
+    Runs the mailboxes of a shard of nodes cooperatively in a single process.
+
+    In every round each hosted node processes at most one message, the same granularity used
+    by `node.work`. The worker is idle when none of its nodes has pending messages and nothing
+    arrives from the other workers within `timeout`; when all the workers are idle the state of
+    the hosted nodes is published in `ret_val` and `progress_bid` is set.
+
+    Args:
+        worker_id (int): The id of the worker.
+        specs (list): The specs of the nodes hosted by the worker (the nodes are built by the worker).
+        transport (ShardedTransport): The transport shared by all the workers.
+        end_processing (Event): Set by the simulator to stop the worker.
+        notify_start (Event): Set by the worker once it's ready to receive messages.
+        progress_bid (Event): Set by the worker when the bidding process has completed.
+        idle_events (list): One event for each worker, set while the worker is idle.
+        ret_val (dict): Shared dictionary where the state of each hosted node is saved (by node id), with the state versions of the nodes (key "versions").
+        timeout (float, optional): Time to wait for messages before considering the worker idle.
+        consensus_reports (Queue, optional): Queue receiving the changes of the winner vectors of the hosted nodes.
+    """
+    transport.start(worker_id)
+    nodes = [spec.build() for spec in specs]
+    for n in nodes:
+        n.set_transport(transport, idle_events, consensus_reports)
+
+    states = {n.id: {} for n in nodes}
+
+    def publish():
+        for n in nodes:
+            n.report_idle()
+            n.publish_state(states[n.id])
+        # a single round trip for the whole shard, with the versions read by the simulator to skip the nodes that didn't change
+        ret_val.update({"versions": {n.id: n.state_version for n in nodes}, **states})
+
+    publish()
+    notify_start.set()
+
+    already_finished = True
+
+    while True:
+        if transport.poll(worker_id, timeout):
+            idle_events[worker_id].clear()
+            already_finished = False
+
+            for n in nodes:
+                msg = transport.pop(n.id)
+                if msg is not None:
+                    if n.stats is not None:
+                        # messages still waiting in the mailbox, including the extracted one
+                        n.stats.observe("mailbox_depth", transport.qsize(n.id) + 1)
+                    n.item = None
+                    n.process_messages([msg])
+            continue
+
+        idle_events[worker_id].set()
+
+        all_finished = True
+        for e in idle_events:
+            if not e.is_set():
+                all_finished = False
+                break
+
+        if all_finished and not already_finished:
+            already_finished = True
+            publish()
+
+            # notify the main process that the bidding process has completed
+            progress_bid.set()
+
+        if end_processing.is_set():
+            for n in nodes:
+                if int(n.updated_cpu) > int(n.initial_cpu):
+                    print(f"Node {n.id} -- Mannaggia updated={n.updated_cpu} initial={n.initial_cpu}", flush=True)
+            break
@@ -0,0 +1,234 @@
+"""
+Synthetic workloads, generated with vectorized sampling (no trace file needed)
+"""
+
+import numpy as np
+import pandas as pd
+
+from Plebiscito.src.dataset_builder import GPU_TYPE_LIMITS, read_trace
+
+
+class PoissonArrivals:
+    """
+    Jobs submitted with a constant rate (mean number of jobs for each time instant).
+    """
+
+    def __init__(self, rate=1.0):
+        if rate <= 0:
+            raise ValueError("The arrival rate must be positive")
+        self.rate = rate
+
+    def iter_rates(self, rng: np.random.Generator, block_size):
+        while True:
+            yield np.full(block_size, self.rate, dtype=np.float64)
+
+
+class MMPPArrivals:
+    """
+    Bursty arrivals generated by a Markov-modulated Poisson process. The process stays in each state
+    for a geometric number of time instants (with mean `mean_sojourn[state]`), submitting jobs with
+    rate `rates[state]`, and then moves to one of the other states (chosen uniformly).
+    """
+
+    def __init__(self, rates=(0.5, 5.0), mean_sojourn=(100, 10)):
+        if len(rates) != len(mean_sojourn) or len(rates) < 2:
+            raise ValueError("MMPP needs at least two states, each with a rate and a mean sojourn time")
+        self.rates = np.asarray(rates, dtype=np.float64)
+        self.mean_sojourn = np.asarray(mean_sojourn, dtype=np.float64)
+
+    def iter_rates(self, rng: np.random.Generator, block_size):
+        k = len(self.rates)
+        state = 0
+        pending = np.empty(0, dtype=np.float64)
+        while True:
+            # visit enough states to cover (at least) a block
+            n_states = max(2, int(block_size / self.mean_sojourn.min()) + 1)
+            # the first state is the current one, each of the next ones differs from the previous one
+            states = np.concatenate(([state], (state + np.cumsum(rng.integers(1, k, size=n_states - 1))) % k))
+            sojourns = rng.geometric(1 / self.mean_sojourn[states])
+            state = (states[-1] + rng.integers(1, k)) % k
+
+            pending = np.concatenate([pending, np.repeat(self.rates[states], sojourns)])
+            while len(pending) >= block_size:
+                yield pending[:block_size]
+                pending = pending[block_size:]
+
+
+class DiurnalArrivals:
+    """
+    Arrivals following a daily pattern: rate * (1 + amplitude * sin(2 * pi * t / period + phase)).
+    """
+
+    def __init__(self, rate=1.0, amplitude=0.5, period=1440, phase=0.0):
+        if rate <= 0:
+            raise ValueError("The arrival rate must be positive")
+        if amplitude < 0 or amplitude > 1:
+            raise ValueError("The amplitude of the diurnal pattern must be in [0, 1]")
+        self.rate = rate
+        self.amplitude = amplitude
+        self.period = period
+        self.phase = phase
+
+    def iter_rates(self, rng: np.random.Generator, block_size):
+        start = 0
+        while True:
+            t = np.arange(start, start + block_size, dtype=np.float64)
+            yield self.rate * (1 + self.amplitude * np.sin(2 * np.pi * t / self.period + self.phase))
+            start += block_size
+
+
+class WorkloadModel:
+    """
+    Distributions of the jobs: the GPU type is drawn with probability `gpu_type_p`, then the resources
+    (num_gpu, num_cpu, bw) are drawn from the empirical shapes of that GPU type and the duration from
+    a log-normal distribution (clipped to [1, max_duration], like `dataset_builder`).
+
+    Args:
+        gpu_types (list): The GPU types (names) of the jobs.
+        gpu_type_p (list): The probability of each GPU type.
+        shapes (dict): For each GPU type, an array with one (num_gpu, num_cpu, bw) row for each shape.
+        shape_p (dict): For each GPU type, the probability of each shape.
+        duration_mu (float): Mean of the logarithm of the duration.
+        duration_sigma (float): Standard deviation of the logarithm of the duration.
+        max_duration (int, optional): Maximum duration of a job.
+    """
+
+    def __init__(self, gpu_types, gpu_type_p, shapes, shape_p, duration_mu, duration_sigma, max_duration=1000):
+        self.gpu_types = list(gpu_types)
+        self.gpu_type_p = np.asarray(gpu_type_p, dtype=np.float64)
+        self.gpu_type_p = self.gpu_type_p / self.gpu_type_p.sum()
+        self.shapes = {t: np.asarray(shapes[t], dtype=np.float64) for t in self.gpu_types}
+        self.shape_p = {t: np.asarray(shape_p[t], dtype=np.float64) / np.sum(shape_p[t]) for t in self.gpu_types}
+        self.duration_mu = duration_mu
+        self.duration_sigma = duration_sigma
+        self.max_duration = max_duration
+
+    @classmethod
+    def default(cls):
+        """
+        Model used when no trace is available. The shapes respect the limits used to filter the PAI trace
+        (see `dataset_builder.GPU_TYPE_LIMITS`) and the GPU types follow the mix of the nodes.
+        """
+        gpu_types = ["T4", "MISC", "P100", "V100"]
+        gpu_type_p = [0.3, 0.17, 0.47, 0.06]
+        shapes = {}
+        shape_p = {}
+        for t in gpu_types:
+            max_gpu, max_cpu = GPU_TYPE_LIMITS[t]
+            gpus = [g for g in [0.25, 0.5, 1, 2, 4] if g < max_gpu]
+            cpus = [c for c in [2, 4, 8, 16, 32] if c < max_cpu]
+            shapes[t] = [(g, c, 0) for g in gpus for c in cpus]
+            # small jobs are more frequent
+            shape_p[t] = [1 / (i + 1) / (j + 1) for i in range(len(gpus)) for j in range(len(cpus))]
+        return cls(gpu_types, gpu_type_p, shapes, shape_p, duration_mu=np.log(200), duration_sigma=1.0)
+
+    @classmethod
+    def from_trace(cls, csv_file, max_duration=1000):
+        """
+        Fits the model to the jobs selected from a trace (see `dataset_builder.read_trace`).
+        """
+        columns = read_trace(csv_file)
+        gpu_type = np.asarray(columns["gpu_type"]).astype(str)
+        resources = np.stack([np.asarray(columns[k], dtype=np.float64) for k in ["num_gpu", "num_cpu", "bw"]], axis=1)
+        duration = np.asarray(columns["duration"], dtype=np.float64)
+
+        gpu_types, counts = np.unique(gpu_type, return_counts=True)
+        shapes = {}
+        shape_p = {}
+        for t in gpu_types:
+            shapes[t], shape_p[t] = np.unique(resources[gpu_type == t], axis=0, return_counts=True)
+
+        log_duration = np.log(np.maximum(duration, 1))
+        return cls(gpu_types.tolist(), counts, shapes, shape_p, duration_mu=log_duration.mean(), duration_sigma=log_duration.std(), max_duration=max_duration)
+
+    def sample(self, rng: np.random.Generator, n):
+        """
+        Draws `n` jobs. Returns a dictionary with the gpu_type, num_gpu, num_cpu, bw and duration arrays.
+        """
+        type_id = rng.choice(len(self.gpu_types), size=n, p=self.gpu_type_p)
+        resources = np.empty((n, 3), dtype=np.float64)
+        for i, t in enumerate(self.gpu_types):
+            mask = type_id == i
+            shape_id = rng.choice(len(self.shapes[t]), size=int(mask.sum()), p=self.shape_p[t])
+            resources[mask] = self.shapes[t][shape_id]
+
+        duration = np.clip(np.rint(rng.lognormal(self.duration_mu, self.duration_sigma, size=n)), 1, self.max_duration).astype(np.int64)
+
+        return {
+            "gpu_type": np.asarray(self.gpu_types, dtype=object)[type_id],
+            "num_gpu": resources[:, 0],
+            "num_cpu": resources[:, 1],
+            "bw": resources[:, 2],
+            "duration": duration,
+        }
+
+
+def iter_workload(n_jobs=None, arrivals=None, model=None, seed=0, n_users=100, batch_size=100000):
+    """
+    Generates a synthetic workload in batches of (at most) `batch_size` jobs ordered by submit time,
+    suitable for `job_source.IteratorJobSource`. The same seed always generates the same workload.
+
+    Args:
+        n_jobs (int, optional): The number of jobs (unbounded if None).
+        arrivals (optional): The arrival process (PoissonArrivals, MMPPArrivals or DiurnalArrivals). One job for each time instant by default.
+        model (WorkloadModel, optional): The distributions of the jobs (`WorkloadModel.default()` if not provided).
+        seed (int, optional): The seed of the generator.
+        n_users (int, optional): The number of users submitting the jobs.
+        batch_size (int, optional): The maximum number of jobs of each batch.
+    """
+    rng = np.random.default_rng(seed)
+    if arrivals is None:
+        arrivals = PoissonArrivals(1.0)
+    if model is None:
+        model = WorkloadModel.default()
+
+    generated = 0
+    time_instant = 1
+    for rates in arrivals.iter_rates(rng, batch_size):
+        counts = rng.poisson(rates)
+        # the simulation starts at time instant 1
+        submit_time = np.repeat(np.arange(time_instant, time_instant + len(rates)), counts)
+        time_instant += len(rates)
+
+        if n_jobs is not None:
+            submit_time = submit_time[:n_jobs - generated]
+
+        for start in range(0, len(submit_time), batch_size):
+            s = submit_time[start:start + batch_size]
+            n = len(s)
+            jobs = model.sample(rng, n)
+            job_id = np.arange(generated, generated + n)
+            generated += n
+
+            yield pd.DataFrame({
+                "job_id": job_id,
+                "user": rng.integers(0, n_users, size=n),
+                "num_gpu": jobs["num_gpu"],
+                "num_cpu": jobs["num_cpu"],
+                "duration": jobs["duration"],
+                "bw": jobs["bw"],
+                "gpu_type": jobs["gpu_type"],
+                "submit_time": s,
+                "final_node_allocation": [[] for _ in range(n)],
+                "final_gpu_allocation": [[] for _ in range(n)],
+                "exec_time": -1,
+                "deadline": s + jobs["duration"] * (1 + 0.1 * rng.random(n)), # 10% deadline slack
+                "current_duration": 0,
+                "speedup": 1,
+            })
+
+        if n_jobs is not None and generated >= n_jobs:
+            return
+
+
+def generate_workload(n_jobs, arrivals=None, model=None, seed=0, n_users=100):
+    """
+    Generates a synthetic workload of `n_jobs` jobs (see `iter_workload`).
+
+    Returns:
+        pandas.DataFrame: The jobs, ordered by submit time.
+    """
+    batches = list(iter_workload(n_jobs, arrivals=arrivals, model=model, seed=seed, n_users=n_users))
+    if len(batches) == 0:
+        return pd.DataFrame()
+    return pd.concat(batches, ignore_index=True)
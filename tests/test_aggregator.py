@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Plebiscito.src.aggregator import ALL, DDSketch, OnlineAggregator, Statistic
+from Plebiscito.src.config import GPUType
+
+
+def exact_quantile(values, q):
+    # the sketch returns the value of rank floor(q * (n - 1))
+    return np.quantile(values, q, method="lower")
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+def test_quantiles_are_within_the_relative_accuracy(relative_accuracy):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.lognormal(3, 2, 20000), -rng.exponential(5, 5000), np.zeros(1000)])
+    sketch = DDSketch(relative_accuracy)
+    sketch.add(values)
+    assert sketch.count == len(values)
+    assert sketch.zero_count == 1000
+
+    for q in np.linspace(0, 1, 41):
+        exact = exact_quantile(values, q)
+        assert sketch.quantile(q) == pytest.approx(exact, rel=relative_accuracy, abs=0)
+
+
+def test_merged_sketch_matches_the_one_of_all_the_values():
+    rng = np.random.default_rng(1)
+    values = rng.pareto(1.5, 10000) - 1
+    merged, first, second = DDSketch(), DDSketch(), DDSketch()
+    merged.add(values)
+    first.add(values[:3000])
+    for v in values[3000:3010]:
+        second.add(v)
+    second.add(values[3010:])
+    first.merge(second)
+
+    assert first.count == merged.count
+    assert first.positive == merged.positive and first.negative == merged.negative
+    for q in [0, 0.25, 0.5, 0.99, 1]:
+        assert first.quantile(q) == merged.quantile(q)
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_summary_is_exact_and_within_the_range():
+    statistic = Statistic()
+    assert statistic.summary() == {"count": 0}
+    statistic.add([])
+    statistic.add([3.0, 3.0, 3.0])
+    summary = statistic.summary()
+    assert summary["count"] == 3 and summary["mean"] == 3 and summary["min"] == 3 and summary["max"] == 3
+    # the bucket of 3 is estimated above or below 3, but the quantiles are clipped to the exact range
+    assert summary["p50"] == summary["p99"] == 3
+
+
+def test_aggregator_groups_by_gpu_type():
+    aggregator = OnlineAggregator([GPUType.T4, GPUType.V100, GPUType.T4])
+    nodes = [SimpleNamespace(initial_gpu=4, updated_gpu=g, initial_cpu=8, updated_cpu=8) for g in (2, 0, 4)]
+    aggregator.observe_nodes(nodes)
+    aggregator.observe_started_jobs(pd.DataFrame({"gpu_type": [GPUType.T4, GPUType.V100], "submit_time": [0, 1], "exec_time": [2, 5]}))
+
+    summary = aggregator.summary()
+    assert summary["time_instants"] == 1
+    assert summary["nodes"]["T4"]["gpu_utilization"]["mean"] == 0.25
+    assert summary["nodes"]["V100"]["gpu_utilization"]["mean"] == 1
+    # no free GPU of type V100, two of the six free T4 GPUs are on a partially used node
+    assert "gpu_fragmentation" not in summary["nodes"]["V100"]
+    assert summary["nodes"][ALL]["gpu_fragmentation"]["mean"] == pytest.approx(2 / 6)
+    assert summary["jobs"][ALL]["queueing_delay"]["max"] == 4
+    assert summary["jobs"][str(GPUType.T4)]["queueing_delay"]["count"] == 1
@@ -0,0 +1,80 @@
+from queue import Queue
+
+from Plebiscito.src.consensus import ConsensusTracker
+
+
+def test_agreement_is_committed_only_when_the_nodes_are_idle():
+    tracker = ConsensusTracker(3)
+    reports = Queue()
+    # node 2 accepts the bid of node 0 forwarded by node 1 before bidding for the job itself
+    for node_id in range(3):
+        reports.put((node_id, 7, (0.0,)))
+    for node_id in range(2):
+        reports.put((node_id, None, None))
+    tracker.poll(reports, 0)
+    assert tracker.allocation(7) == (0.0,)
+    assert not tracker.quiescent()
+
+    reports.put((2, 7, (2.0,)))
+    reports.put((2, None, None))
+    tracker.poll(reports, 0)
+    assert tracker.quiescent()
+    assert tracker.allocation(7) is None
+
+
+def test_majority_follows_the_changes_of_the_vectors():
+    tracker = ConsensusTracker(4)
+    assert tracker.majority(1) == (None, 0)
+    for node_id, winners in [(0, (0.0, 1.0)), (1, (0.0, 1.0)), (2, (2.0, 1.0))]:
+        tracker.update(node_id, 1, winners)
+    assert tracker.majority(1) == ((0.0, 1.0), 2)
+    assert not tracker.settled(1)
+
+    tracker.update(1, 1, (2.0, 1.0))
+    tracker.update(0, 1, None)
+    assert tracker.majority(1) == ((2.0, 1.0), 2)
+    assert tracker.counts[1] == {(2.0, 1.0): 2}
+
+    tracker.update(1, 1, None)
+    tracker.update(2, 1, None)
+    assert 1 not in tracker.vectors and 1 not in tracker.counts
+
+
+def test_job_is_settled_when_all_the_alive_nodes_agree():
+    tracker = ConsensusTracker(3)
+    tracker.update(0, 5, (0.0, float('-inf')))
+    tracker.update(1, 5, (0.0, float('-inf')))
+    assert not tracker.settled(5)
+
+    # the failed node no longer counts, but its vector is kept
+    tracker.detach(2)
+    tracker.detach(2)
+    assert tracker.settled(5)
+    # a layer without a winner cannot be committed
+    assert tracker.allocation(5) is None
+
+    tracker.update(0, 5, (0.0, 1.0))
+    tracker.update(1, 5, (0.0, 1.0))
+    tracker.update(2, 5, (2.0, 2.0))
+    assert tracker.allocation(5) == (0.0, 1.0)
+    assert tracker.counts[5] == {(0.0, 1.0): 2}
+
+    matrix, bidders = tracker.winner_matrix(5)
+    assert bidders == [0, 1, 2]
+    assert matrix.tolist() == [[0.0, 1.0], [0.0, 1.0], [2.0, 2.0]]
+    assert tracker.winner_matrix(6)[1] == []
+
+
+def test_drain_waits_for_the_reports_the_nodes_sent():
+    tracker = ConsensusTracker(2)
+    reports = Queue()
+    reports.put((0, 3, (0.0,)))
+    reports.put((1, 3, (0.0,)))
+    reports.put((1, None, None))
+    reports.put((0, 4, (1.0,)))
+    tracker.drain(reports, {0: 1, 1: 2})
+    # the report queued after the expected ones is applied as well
+    assert reports.empty()
+    assert tracker.received == [2, 2]
+    assert tracker.allocation(3) == (0.0,)
+    assert not tracker.settled(4)
@@ -0,0 +1,27 @@
+import asyncio
+
+import numpy as np
+
+from Plebiscito.src.daemon import NodeDaemon
+
+
+def test_daemon_nodes_forward_to_static_neighbors(monkeypatch):
+    daemon = NodeDaemon(5, split=False)
+    adjacency_matrix = np.asarray(daemon.logical_topology.to())
+    for n in daemon.nodes:
+        assert n.neighbors == [j for j in range(5) if adjacency_matrix[j][n.id] and j != n.id]
+
+    # the auctions never read the topology
+    def fail():
+        raise AssertionError("topology read while forwarding")
+    monkeypatch.setattr(daemon.logical_topology, "to", fail)
+
+    async def run():
+        await daemon.start()
+        try:
+            return [await daemon.submit({"job_id": i, "user": 0, "num_gpu": 1, "num_cpu": 2, "duration": 10, "bw": 0, "gpu_type": "MISC"}) for i in range(3)]
+        finally:
+            await daemon.stop()
+
+    outcomes = asyncio.run(run())
+    assert all(o["allocated"] for o in outcomes)
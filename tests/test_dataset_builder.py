@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from Plebiscito.src.dataset_builder import build_trace_store, load_trace_store, read_trace, _trace_store_meta
+
+
+def write_trace(path, n_rows=50):
+    gpu_types = ["MISC", "P100", "T4", "V100", "CPU"]
+    pd.DataFrame({
+        "job_name": ["job%d" % i for i in range(n_rows)],
+        "user": ["%04d" % (i % 7) for i in range(n_rows)],
+        "gpu_type": [gpu_types[i % 5] for i in range(n_rows)],
+        "num_cpu": [str(2 + i % 50) for i in range(n_rows)],
+        "num_gpu": ["" if i % 11 == 0 else str(0.5 * (i % 4)) for i in range(n_rows)],
+        "submit_time": [str(10 * i) for i in range(n_rows)],
+        "duration": [str(100 * (i % 13)) for i in range(n_rows)],
+        "write_count": [str(i % 9) for i in range(n_rows)],
+        # floats, with some values that aren't numbers
+        "wait_time": ["" if i % 5 == 0 else str(i * 1.5) for i in range(n_rows)],
+        "status": ["Terminated"] * n_rows,
+    }).to_csv(path, index=False)
+
+
+def test_trace_store_matches_the_trace(tmp_path):
+    trace = str(tmp_path / "trace.csv")
+    write_trace(trace)
+    assert _trace_store_meta(trace) is None
+
+    build_trace_store(trace)
+    assert _trace_store_meta(trace) is not None
+    expected = read_trace(trace, chunksize=16)
+    assert len(expected["gpu_type"]) > 0
+    stored = load_trace_store(trace)
+    assert list(stored) == list(expected)
+    for k, v in expected.items():
+        assert stored[k].dtype == v.dtype
+        np.testing.assert_array_equal(stored[k], v)
+
+
+def test_trace_store_is_rebuilt_when_the_trace_changes(tmp_path):
+    trace = str(tmp_path / "trace.csv")
+    write_trace(trace)
+    build_trace_store(trace)
+
+    write_trace(trace, n_rows=80)
+    assert _trace_store_meta(trace) is None
+    np.testing.assert_array_equal(load_trace_store(trace)["submit_time"], read_trace(trace)["submit_time"])
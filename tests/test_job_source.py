@@ -0,0 +1,44 @@
+import pandas as pd
+
+from Plebiscito.src.job_source import DataFrameJobSource, IteratorJobSource, as_job_source
+
+
+def make_jobs(submit_times):
+    return pd.DataFrame({"job_id": range(len(submit_times)), "submit_time": submit_times})
+
+
+def test_arrivals_are_windows_of_the_sorted_jobs():
+    source = DataFrameJobSource(make_jobs([5, 1, 3, 3, 8, 1]))
+    assert source.size() == 6
+    assert source.pop_arrivals(0).empty
+
+    # the jobs with the same submit time keep the order of the dataset
+    assert source.pop_arrivals(1)["job_id"].tolist() == [1, 5]
+    assert source.pop_arrivals(1).empty
+    assert source.pop_arrivals(4)["job_id"].tolist() == [2, 3]
+    assert not source.exhausted()
+
+    # a time instant going back doesn't return the same jobs again
+    assert source.pop_arrivals(2).empty
+    assert source.pop_arrivals(100)["job_id"].tolist() == [0, 4]
+    assert source.exhausted()
+    assert source.pop_arrivals(200).empty
+
+
+def test_empty_dataset_is_exhausted():
+    source = as_job_source(make_jobs([]))
+    assert isinstance(source, DataFrameJobSource)
+    assert source.exhausted()
+    assert source.pop_arrivals(10).empty
+
+
+def test_iterator_source_splits_the_batches():
+    source = as_job_source(iter([make_jobs([0, 2]), make_jobs([]), make_jobs([2, 4, 6])]))
+    assert isinstance(source, IteratorJobSource)
+    assert source.size() is None
+    assert len(source.pop_arrivals(2)) == 3
+    assert source.pop_arrivals(3).empty
+    assert source.pop_arrivals(5)["submit_time"].tolist() == [4]
+    assert not source.exhausted()
+    assert source.pop_arrivals(6)["submit_time"].tolist() == [6]
+    assert source.exhausted()
@@ -0,0 +1,53 @@
+import numpy as np
+
+from Plebiscito.src.jobs_handler import EDGE_DTYPE, generate_application_graph, get_job_profile
+from Plebiscito.src.jobs_handler import ApplicationGraphType
+
+
+def dense_graph(layer_number, prob, bandwidth, rng):
+    # the former generator: one draw per pair of layers, below the diagonal
+    graph = np.zeros((layer_number, layer_number))
+    for i in range(layer_number):
+        for j in range(i):
+            if rng.choice([0, 1], p=[1 - prob, prob]):
+                graph[i][j] = bandwidth
+    return graph
+
+
+def test_linear_graph_chains_the_layers():
+    edges = generate_application_graph(5, ApplicationGraphType.LINEAR, 10)
+    assert edges.dtype == EDGE_DTYPE
+    assert edges['src'].tolist() == [1, 2, 3, 4]
+    assert edges['dst'].tolist() == [0, 1, 2, 3]
+    assert np.all(edges['bw'] == 10)
+
+
+def test_single_layer_has_no_edges():
+    for app_type in ApplicationGraphType:
+        assert len(generate_application_graph(1, app_type, 10)) == 0
+
+
+def test_random_graphs_match_the_dense_generator():
+    for app_type, prob in [(ApplicationGraphType.GRAPH20, 0.2),
+                           (ApplicationGraphType.GRAPH40, 0.4),
+                           (ApplicationGraphType.GRAPH60, 0.6)]:
+        for seed in range(20):
+            edges = generate_application_graph(6, app_type, 7, rng=np.random.RandomState(seed))
+            assert np.all(edges['src'] > edges['dst'])
+
+            graph = np.zeros((6, 6))
+            graph[edges['src'], edges['dst']] = edges['bw']
+            assert np.array_equal(graph, dense_graph(6, prob, 7, np.random.RandomState(seed)))
+
+
+def test_job_profile_is_reproducible():
+    get_job_profile.cache_clear()
+    first = get_job_profile(3, True, ApplicationGraphType.GRAPH40, seed=11)
+    get_job_profile.cache_clear()
+    second = get_job_profile(3, True, ApplicationGraphType.GRAPH40, seed=11)
+    for a, b in zip(first, second):
+        assert np.array_equal(a, b)
+
+    assert np.isclose(first[0].sum(), 1) and np.isclose(first[1].sum(), 1)
+    assert get_job_profile(3, True, ApplicationGraphType.GRAPH40, seed=11) is second
+    assert len(get_job_profile(3, False, ApplicationGraphType.GRAPH40, seed=11)[0]) == 1
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from Plebiscito.src.config import SamplingPolicy
+from Plebiscito.src.metrics import MetricsSink, Timeline, read_node_metrics
+
+# GPUs left on each of the 3 nodes at each time instant (the other resources never change)
+UPDATED_GPU = [
+    [8, 4, 2],
+    [8, 4, 2],
+    [6, 4, 2],
+    [6, 4, 2],
+    [6, 0, 2],
+    [8, 0, 2],
+    [8, 0, 2],
+    [8, 4, 2],
+]
+
+
+def make_nodes():
+    return [SimpleNamespace(initial_gpu=8, updated_gpu=8, initial_cpu=16, updated_cpu=16, initial_bw=100, updated_bw=100, gpu_type="T4" if i == 1 else "A100") for i in range(3)]
+
+
+def run_sink(prefix, **kwargs):
+    sink = MetricsSink(prefix, 3, **kwargs)
+    nodes = make_nodes()
+    for t, gpus in enumerate(UPDATED_GPU):
+        for n, g in zip(nodes, gpus):
+            n.updated_gpu = g
+        sink.record(10 * t, nodes)
+    sink.close()
+    return sink
+
+
+def used_gpu():
+    return 8 - np.array(UPDATED_GPU, dtype=np.float64)
+
+
+def test_only_the_changes_are_recorded(tmp_path):
+    prefix = str(tmp_path / "run")
+    sink = run_sink(prefix, block_size=4)
+    timeline = Timeline(prefix)
+    assert sink.n_blocks > 1
+
+    # every value at the first tick, then one event for each GPU allocation or release
+    assert len(timeline.value) == 3 * 7 + 4
+    assert timeline.tick[3 * 7:].tolist() == [2, 4, 5, 7]
+
+    time_instant, dense = timeline.dense()
+    assert time_instant.tolist() == [10 * t for t in range(len(UPDATED_GPU))]
+    assert np.array_equal(dense[:, :, 1], used_gpu())
+    assert np.all(dense[:, :, 0] == 8) and np.all(dense[:, :, 3] == 0)
+    assert timeline.gpu_type_names[dense[0, :, 6].astype(int)].tolist() == ["A100", "T4", "A100"]
+
+    # the state is carried across the chunks
+    chunks = list(timeline.iter_dense(ticks_per_chunk=3))
+    assert [len(t) for t, _ in chunks] == [3, 3, 2]
+    assert np.array_equal(np.concatenate([d for _, d in chunks]), dense)
+
+
+def test_csv_matches_the_timeline(tmp_path):
+    prefix = str(tmp_path / "run")
+    run_sink(prefix)
+    csv = pd.read_csv(prefix + ".csv")
+    wide = read_node_metrics(prefix)
+    assert list(csv.columns) == list(wide.columns)
+    assert csv["node_1_used_gpu"].tolist() == used_gpu()[:, 1].tolist()
+    pd.testing.assert_frame_equal(csv, wide, check_dtype=False)
+
+
+def test_every_k_keeps_the_peaks_between_samples(tmp_path):
+    prefix = str(tmp_path / "run")
+    run_sink(prefix, policy=SamplingPolicy.EVERY_K, interval=3, csv=False)
+    timeline = Timeline(prefix)
+    # ticks 0, 3 and 6, then the last one when the sink is closed
+    assert timeline.time_instant.tolist() == [0, 30, 60, 70]
+
+    time_instant, dense = timeline.dense()
+    assert np.array_equal(dense[:, :, 1], used_gpu()[[0, 3, 6, 7]])
+
+    windows = [[0], [1, 2, 3], [4, 5, 6], [7]]
+    _, peak = timeline.window("max")
+    _, mean = timeline.window("mean")
+    for s, ticks in enumerate(windows):
+        assert np.array_equal(peak[s, :, 0], used_gpu()[ticks].max(axis=0))
+        assert np.allclose(mean[s, :, 0], used_gpu()[ticks].mean(axis=0))
+    # the CPU and the bandwidth never change
+    assert np.all(peak[:, :, 1:] == 0)
+
+
+def test_on_change_and_adaptive_sampling(tmp_path):
+    prefix = str(tmp_path / "on_change")
+    run_sink(prefix, policy=SamplingPolicy.ON_CHANGE, csv=False)
+    assert Timeline(prefix).time_instant.tolist() == [0, 20, 40, 50, 70]
+
+    # the samples follow a change at every tick, then the gap doubles up to the interval
+    prefix = str(tmp_path / "adaptive")
+    sink = MetricsSink(prefix, 1, policy=SamplingPolicy.ADAPTIVE, interval=4, csv=False)
+    node = make_nodes()[0]
+    for t in range(16):
+        node.updated_gpu = 4 if 13 <= t < 15 else 8
+        sink.record(t, [node])
+    sink.close()
+    timeline = Timeline(prefix)
+    assert timeline.time_instant.tolist() == [0, 1, 3, 7, 11, 15]
+    # the allocation between the last two samples is kept by the window statistics
+    assert timeline.dense()[1][:, 0, 1].tolist() == [0] * 6
+    assert timeline.window("max")[1][:, 0, 0].tolist() == [0] * 5 + [4]
+    assert timeline.window("mean")[1][-1, 0, 0] == 2
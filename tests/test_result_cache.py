@@ -0,0 +1,50 @@
+import os
+
+from Plebiscito.src.metrics import metrics_directory
+from Plebiscito.src.result_cache import ResultCache, OUTPUT_SUFFIXES
+
+
+def write_outputs(prefix, blocks, csv=True):
+    for s in OUTPUT_SUFFIXES + ([".csv"] if csv else []):
+        with open(prefix + s, "w") as f:
+            f.write(os.path.basename(prefix) + s)
+    os.makedirs(metrics_directory(prefix), exist_ok=True)
+    for b in blocks:
+        with open(os.path.join(metrics_directory(prefix), b), "w") as f:
+            f.write(b)
+
+
+def test_restore_replaces_the_metrics_directory(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    prefix = str(tmp_path / "run")
+    write_outputs(prefix, ["events_00000.npz"])
+    assert cache.store("key", prefix)
+
+    # a previous simulation left more blocks with the same prefix
+    write_outputs(prefix, ["events_00000.npz", "events_00001.npz"])
+    assert cache.restore("key", prefix)
+    assert sorted(os.listdir(metrics_directory(prefix))) == ["events_00000.npz"]
+
+
+def test_metrics_csv_is_required_only_if_exported(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    prefix = str(tmp_path / "run")
+    write_outputs(prefix, ["events_00000.npz"], csv=False)
+    assert not cache.store("with_csv", prefix)
+    assert cache.store("without_csv", prefix, metrics_csv=False)
+    assert not cache.contains("without_csv")
+    assert cache.contains("without_csv", metrics_csv=False)
+
+    other = str(tmp_path / "other")
+    assert cache.restore("without_csv", other, metrics_csv=False)
+    assert not os.path.exists(other + ".csv")
+    assert os.listdir(metrics_directory(other)) == ["events_00000.npz"]
+
+
+def test_store_requires_the_metrics_directory(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    prefix = str(tmp_path / "run")
+    write_outputs(prefix, [])
+    os.rmdir(metrics_directory(prefix))
+    assert not cache.store("key", prefix)
+    assert not cache.contains("key")
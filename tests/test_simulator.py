@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from Plebiscito.src.config import TransportType, Utility, SchedulingAlgorithm
+from Plebiscito.src.simulator import Simulator_Plebiscito
+
+
+def make_dataset(n_jobs):
+    # jobs fitting a single node, one GPU type each
+    gpu_types = ["T4", "MISC", "P100", "V100"]
+    return pd.DataFrame([{
+        "job_id": i, "user": i % 3, "num_gpu": 0.5 + 0.5 * (i % 2), "num_cpu": 4 * (1 + i % 3), "duration": 2 + i % 4,
+        "bw": 0.0, "gpu_type": gpu_types[i % 4], "submit_time": 1 + i // 3, "final_node_allocation": [], "final_gpu_allocation": [],
+        "exec_time": -1, "deadline": 0, "current_duration": 0, "speedup": 1,
+    } for i in range(n_jobs)])
+
+
+def run_allocations(tmp_path, name, n_nodes=4, n_jobs=12, **kwargs):
+    # with seed 0, the 4 nodes have different GPU types: the bids of the nodes never tie, so the allocations
+    # don't depend on the order in which the nodes process the messages (which differs among the hosting modes)
+    simulator = Simulator_Plebiscito(filename=str(tmp_path / name), n_nodes=n_nodes, n_jobs=n_jobs, dataset=make_dataset(n_jobs), utility=Utility.LGF,
+                                     scheduling_algorithm=SchedulingAlgorithm.FIFO, decrement_factor=0.2, split=False, n_client=3, seed=0, **kwargs)
+    simulator.run()
+    return pd.read_csv(simulator.filename + "_allocations.csv")
+
+
+def test_sharded_nodes_reject_in_process_transport(tmp_path):
+    with pytest.raises(ValueError, match="in-process transport"):
+        Simulator_Plebiscito(filename=str(tmp_path / "run"), n_nodes=4, n_jobs=0, transport=TransportType.IN_PROCESS, shard_nodes=True, n_workers=2)
+
+
+def test_seeded_serial_and_sharded_runs_match(tmp_path):
+    serial = run_allocations(tmp_path, "serial")
+    sharded = run_allocations(tmp_path, "sharded", shard_nodes=True, n_workers=2)
+    pd.testing.assert_frame_equal(serial, sharded)
+
+
+def test_seeded_runs_with_tracked_consensus_match(tmp_path):
+    # the jobs committed at consensus must be the ones allocated when the nodes are idle
+    runs = [run_allocations(tmp_path, "tracked_" + str(i), n_jobs=24, track_consensus=True) for i in range(2)]
+    untracked = run_allocations(tmp_path, "untracked", n_jobs=24)
+    for allocations in runs:
+        pd.testing.assert_frame_equal(allocations, untracked)
@@ -0,0 +1,57 @@
+import pytest
+
+from test_simulator import make_dataset
+
+from Plebiscito.src.jobs_handler import dispatch_job
+from Plebiscito.src.result_cache import ResultCache
+from Plebiscito.src.simulator import Simulator_Plebiscito
+from Plebiscito.src.sweep import run_sweep, retry_seed
+
+
+def test_sweep_rejects_infrastructure_arguments(tmp_path):
+    with pytest.raises(ValueError, match="n_nodes"):
+        run_sweep({"filename": str(tmp_path / "run"), "n_nodes": 4, "n_jobs": 0}, [{"alpha": 0}, {"n_nodes": 8}])
+
+
+def test_key_depends_on_the_infrastructure_seed(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    args = {"filename": "run", "n_nodes": 4, "n_jobs": 10, "seed": 1}
+    assert cache.key(args) == cache.key({**args, "infrastructure_seed": 1})
+    assert cache.key(args) != cache.key({**args, "infrastructure_seed": 0})
+
+
+def test_reset_without_seed_drops_the_previous_one(tmp_path):
+    simulator = Simulator_Plebiscito(filename=str(tmp_path / "run"), n_nodes=4, n_jobs=0, seed=3)
+    simulator.reset(seed=None)
+    assert simulator.seed is None
+    assert simulator.infrastructure_seed == 3
+
+
+def test_retry_seeds_only_change_the_dispatch(tmp_path):
+    seeds = [retry_seed(0, attempt) for attempt in range(1, 4)]
+    assert len(set(seeds)) == 3
+    assert not set(seeds) & {0, 1, 2, 3}
+
+    args = {"filename": str(tmp_path / "run"), "n_nodes": 8, "n_jobs": 0, "seed": 0}
+    first = Simulator_Plebiscito(**args)
+    retry = Simulator_Plebiscito(**args, dispatch_seed=seeds[0])
+    assert [t.name for t in retry.gpu_types] == [t.name for t in first.gpu_types]
+
+    class Recorder:
+        n_nodes = 8
+
+        def __init__(self):
+            self.targets = []
+
+        def send(self, dst, msg):
+            self.targets.append((dst, msg["job_id"], list(msg["NN_gpu"])))
+
+    jobs = make_dataset(20)
+    targets = []
+    for dispatch_seed in (None, seeds[0]):
+        transport = Recorder()
+        dispatch_job(jobs, transport, split=False, seed=0, dispatch_seed=dispatch_seed)
+        targets.append(transport.targets)
+    # same jobs (and profiles), other nodes
+    assert [t[1:] for t in targets[0]] == [t[1:] for t in targets[1]]
+    assert [t[0] for t in targets[0]] != [t[0] for t in targets[1]]
@@ -0,0 +1,62 @@
+from multiprocessing import Process
+from queue import Full
+import threading
+import time
+
+import pytest
+
+from Plebiscito.src.transport import SharedMemoryRingBuffer
+
+
+def produce(ring, producer, n_messages):
+    for i in range(n_messages):
+        ring.put((producer, i, b"x" * 100))
+
+
+@pytest.fixture
+def ring():
+    # room for a few messages only, so the producers keep finding the buffer full
+    ring = SharedMemoryRingBuffer(capacity=1024)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_producers_sharing_a_full_buffer(ring):
+    n_producers, n_messages = 4, 300
+    producers = [Process(target=produce, args=(ring, p, n_messages)) for p in range(n_producers)]
+    for p in producers:
+        p.start()
+
+    received = [ring.get(timeout=10) for _ in range(n_producers * n_messages)]
+    for p in producers:
+        p.join(10)
+        assert p.exitcode == 0
+
+    assert ring.empty()
+    for producer in range(n_producers):
+        # the messages of each producer are received in order
+        assert [i for p, i, _ in received if p == producer] == list(range(n_messages))
+
+
+def test_producer_waiting_for_space_does_not_block_the_others(ring):
+    while True:
+        try:
+            ring.put_nowait(b"x" * 100)
+        except Full:
+            break
+    n_queued = ring.qsize()
+
+    waiting = threading.Thread(target=ring.put, args=(b"y" * 100,))
+    waiting.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    with pytest.raises(Full):
+        ring.put(b"z" * 100, timeout=0.2)
+    assert time.monotonic() - start < 1
+
+    ring.get()
+    waiting.join(5)
+    assert not waiting.is_alive()
+    assert [ring.get() for _ in range(n_queued)][-1] == b"y" * 100
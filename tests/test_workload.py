@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Plebiscito.src.dataset_builder import GPU_TYPE_LIMITS
+from Plebiscito.src.workload import DiurnalArrivals, MMPPArrivals, PoissonArrivals, WorkloadModel, generate_workload, iter_workload
+
+
+def test_mmpp_moves_to_another_state_after_each_sojourn():
+    # a sojourn of a single time instant in each state: the rate changes at every time instant
+    arrivals = MMPPArrivals(rates=(1.0, 2.0, 3.0), mean_sojourn=(1, 1, 1))
+    blocks = arrivals.iter_rates(np.random.default_rng(0), 64)
+    rates = np.concatenate([next(blocks) for _ in range(10)])
+    assert rates[0] == 1.0
+    assert (np.diff(rates) != 0).all()
+
+
+def test_mmpp_long_run_rate():
+    # two states: the process alternates between them, spending a time proportional to the mean sojourn in each
+    arrivals = MMPPArrivals(rates=(0.5, 5.0), mean_sojourn=(100, 10))
+    blocks = arrivals.iter_rates(np.random.default_rng(0), 1000)
+    rates = np.concatenate([next(blocks) for _ in range(300)])
+    assert set(np.unique(rates)) == {0.5, 5.0}
+    assert np.mean(rates) == pytest.approx((0.5 * 100 + 5.0 * 10) / 110, rel=0.05)
+
+
+def test_poisson_arrival_counts():
+    jobs = generate_workload(20000, arrivals=PoissonArrivals(2.0), seed=1)
+    assert len(jobs) == 20000
+    assert (jobs["job_id"] == np.arange(20000)).all()
+    assert jobs["submit_time"].is_monotonic_increasing
+    assert jobs["submit_time"].min() >= 1
+    assert len(jobs) / jobs["submit_time"].max() == pytest.approx(2.0, rel=0.03)
+
+
+def test_diurnal_rates_follow_the_period():
+    arrivals = DiurnalArrivals(rate=2.0, amplitude=0.5, period=100)
+    rates = next(arrivals.iter_rates(np.random.default_rng(0), 1000))
+    assert rates.mean() == pytest.approx(2.0)
+    assert rates.max() == pytest.approx(3.0, rel=1e-3)
+    assert rates.min() == pytest.approx(1.0, rel=1e-3)
+    np.testing.assert_allclose(rates[:100], rates[100:200])
+
+
+def test_workload_is_reproducible_and_batched():
+    batches = list(iter_workload(2500, seed=3, batch_size=1000))
+    assert all(0 < len(b) <= 1000 for b in batches)
+    jobs = pd.concat(batches, ignore_index=True)
+    assert len(jobs) == 2500
+    assert jobs["submit_time"].is_monotonic_increasing
+    pd.testing.assert_frame_equal(jobs, pd.concat(iter_workload(2500, seed=3, batch_size=1000), ignore_index=True))
+    assert not jobs.equals(pd.concat(iter_workload(2500, seed=4, batch_size=1000), ignore_index=True))
+
+
+def test_default_model_respects_the_trace_limits():
+    jobs = WorkloadModel.default().sample(np.random.default_rng(0), 10000)
+    for t, (max_gpu, max_cpu) in GPU_TYPE_LIMITS.items():
+        mask = jobs["gpu_type"] == t
+        assert mask.any()
+        assert (jobs["num_gpu"][mask] < max_gpu).all()
+        assert (jobs["num_cpu"][mask] < max_cpu).all()
+    assert (jobs["duration"] >= 1).all() and (jobs["duration"] <= 1000).all()